@@ -102,6 +102,43 @@ if DEBUG:
         },
     }
 
+# Cache configuration (menu snapshot and other read models)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    },
+}
+
+# For development without Redis, use in-memory cache
+if DEBUG:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Cart storage: 'cache' keeps carts in the cache and writes them to the database every
+# CART_FLUSH_INTERVAL seconds (0 disables the background flusher); 'database' writes every change.
+# 'cache' tracks unwritten carts in the cache as well, so every process must share one cache
+CART_STORE = config('CART_STORE', default='cache')
+CART_FLUSH_INTERVAL = config('CART_FLUSH_INTERVAL', default=5, cast=int)
+
+# Anonymous carts untouched for this many days are deleted by `manage.py reap_carts` (the
+# Procfile's reaper process), or in-process every CART_REAPER_INTERVAL seconds when that is
+# above 0; keep it at 0 with more than one web process, since SQLite has a single writer
+ANONYMOUS_CART_MAX_AGE_DAYS = config('ANONYMOUS_CART_MAX_AGE_DAYS', default=30, cast=int)
+CART_REAPER_INTERVAL = config('CART_REAPER_INTERVAL', default=0, cast=int)
+
+# Responses to requests sent with an Idempotency-Key header (checkout) are replayed to
+# retries with the same key for this many seconds
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=60 * 60 * 24, cast=int)
+
+# Emails and realtime notifications run on the task queue, worked by `manage.py run_tasks`
+# (the Procfile's worker process). TASK_QUEUE_WORKERS threads per web process work it too;
+# that is only on by default under DEBUG, since SQLite has a single writer
+TASK_QUEUE_WORKERS = config('TASK_QUEUE_WORKERS', default=2 if config('DEBUG', default=False, cast=bool) else 0, cast=int)
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -109,6 +146,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so concurrent writers queue for
+            # up to `timeout` seconds instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        'TEST': {
+            # A file rather than shared in-memory tables, so concurrency tests see real locking
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -1,14 +1,19 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse, path
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, FileResponse
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin
-from .models import Special, Foods, Category, Favorite, Order, OrderItem, Customer, Cart, CartItem, Contact, Reservation, CateringRequest, UserProfile, WaiterProfile
+from .models import Special, Foods, Category, Favorite, Order, OrderItem, Customer, Cart, CartItem, Contact, Reservation, CateringRequest, UserProfile, WaiterProfile, Task
 from django.core.exceptions import *
 from django.db.models.functions import TruncMonth
 from django.db.models import Sum
 from django.template.response import TemplateResponse
+from .menu_snapshot import invalidate_menu_snapshot
+from django.utils import timezone
+from .order_history import invalidate_order_counts
+from .order_tracking import refresh_order_tracking
+from .receipts import export_receipts
 
 # Enhanced Order Item Inline
 class OrderItemInline(admin.TabularInline):
@@ -56,6 +61,11 @@ class OrderAdmin(admin.ModelAdmin):
         return "Guest"
     customer_info.short_description = "Customer"
     
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Order pages render from the line snapshot, so edited items must be copied into it
+        form.instance.refresh_line_snapshot()
+    
     def order_type_display(self, obj):
         if obj.order_type == 'delivery':
             return format_html('<span style="color: #007cba;"><i class="fas fa-truck"></i> Delivery</span>')
@@ -66,30 +76,42 @@ class OrderAdmin(admin.ModelAdmin):
     order_type_display.short_description = "Order Type"
     order_type_display.allow_tags = True
     
-    actions = ['mark_completed', 'mark_cancelled', 'send_confirmation_emails', 'delete_selected_orders']
+    actions = ['mark_completed', 'mark_cancelled', 'send_confirmation_emails', 'export_selected_receipts', 'delete_selected_orders']
     
     def mark_completed(self, request, queryset):
-        count = queryset.update(status='completed')
+        # Read the orders first: a changelist filtered on status no longer matches them after update()
+        orders = list(queryset.values_list('id', 'user_id'))
+        order_ids = [order_id for order_id, _ in orders]
+        user_ids = [user_id for _, user_id in orders]
+        count = queryset.update(status='completed', updated_at=timezone.now())
+        invalidate_order_counts(*user_ids)
+        refresh_order_tracking(*order_ids)
         # Send emails for each order
-        for order in queryset:
+        for order in Order.objects.filter(id__in=order_ids):
             try:
                 from .views import send_order_status_email
                 send_order_status_email(order, 'completed')
             except:
                 pass
-        self.message_user(request, f'{count} orders marked as completed and emails sent.')
+        self.message_user(request, f'{count} orders marked as completed and emails queued.')
     mark_completed.short_description = "Mark selected orders as completed"
     
     def mark_cancelled(self, request, queryset):
-        count = queryset.update(status='cancelled')
+        # Read the orders first: a changelist filtered on status no longer matches them after update()
+        orders = list(queryset.values_list('id', 'user_id'))
+        order_ids = [order_id for order_id, _ in orders]
+        user_ids = [user_id for _, user_id in orders]
+        count = queryset.update(status='cancelled', updated_at=timezone.now())
+        invalidate_order_counts(*user_ids)
+        refresh_order_tracking(*order_ids)
         # Send emails for each order
-        for order in queryset:
+        for order in Order.objects.filter(id__in=order_ids):
             try:
                 from .views import send_order_status_email
                 send_order_status_email(order, 'cancelled')
             except:
                 pass
-        self.message_user(request, f'{count} orders cancelled and emails sent.')
+        self.message_user(request, f'{count} orders cancelled and emails queued.')
     mark_cancelled.short_description = "Cancel selected orders"
     
     def send_confirmation_emails(self, request, queryset):
@@ -99,9 +121,14 @@ class OrderAdmin(admin.ModelAdmin):
                 send_order_confirmation_email(order)
             except:
                 pass
-        self.message_user(request, f'Confirmation emails sent for {queryset.count()} orders.')
+        self.message_user(request, f'Confirmation emails queued for {queryset.count()} orders.')
     send_confirmation_emails.short_description = "Send confirmation emails"
     
+    def export_selected_receipts(self, request, queryset):
+        archive = export_receipts(queryset.select_related('customer').order_by('id'))
+        return FileResponse(archive, as_attachment=True, filename=f"receipts-{timezone.now():%Y%m%d-%H%M%S}.zip")
+    export_selected_receipts.short_description = "Export receipts (zip)"
+    
     def delete_selected_orders(self, request, queryset):
         count = queryset.count()
         queryset.delete()
@@ -139,6 +166,10 @@ class CartAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at', 'total_price', 'total_items')
     inlines = [CartItemInline]
 
+    def get_queryset(self, request):
+        # Totals for the whole page come from one query instead of two item loops per row
+        return super().get_queryset(request).with_totals()
+
 @admin.register(Special)
 class SpecialAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'price', 'discounted_price', 'active', 'date')
@@ -155,12 +186,21 @@ class SpecialAdmin(admin.ModelAdmin):
     delete_selected_specials.short_description = "Delete selected specials"
     
     def deactivate_specials(self, request, queryset):
+        # Read the ids first: a changelist filtered on 'active' no longer matches them after update()
+        special_ids = list(queryset.values_list('id', flat=True))
         count = queryset.update(active=False)
+        # update() bypasses post_save, so log each special for the menu snapshot
+        for special_id in special_ids:
+            invalidate_menu_snapshot('special', special_id)
         self.message_user(request, f'{count} specials deactivated.')
     deactivate_specials.short_description = "Deactivate selected specials"
     
     def activate_specials(self, request, queryset):
+        special_ids = list(queryset.values_list('id', flat=True))
         count = queryset.update(active=True)
+        # update() bypasses post_save, so log each special for the menu snapshot
+        for special_id in special_ids:
+            invalidate_menu_snapshot('special', special_id)
         self.message_user(request, f'{count} specials activated.')
     activate_specials.short_description = "Activate selected specials"
 
@@ -275,6 +315,20 @@ class CateringRequestAdmin(admin.ModelAdmin):
         self.message_user(request, f'{count} requests marked as unhandled.')
     mark_unhandled.short_description = "Mark selected as unhandled"
 
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'created_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'last_error')
+    readonly_fields = ('created_at', 'updated_at')
+    actions = ['requeue_tasks']
+
+    def requeue_tasks(self, request, queryset):
+        from .task_queue import task_queue
+        count = task_queue.requeue(queryset)
+        self.message_user(request, f'{count} dead-lettered tasks requeued.')
+    requeue_tasks.short_description = "Requeue selected dead-lettered tasks"
+
 @admin.register(WaiterProfile)
 class WaiterProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'employee_id', 'phone')
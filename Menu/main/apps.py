@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from . import signals
+        from django.core.signals import request_started
+        from .cart_reaper import start_periodic_reaper
+        request_started.connect(start_periodic_reaper)
+        from .task_queue import start_task_workers
+        request_started.connect(start_task_workers)
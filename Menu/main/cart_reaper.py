@@ -0,0 +1,170 @@
+"""
+Cart Reaper
+Deletes abandoned anonymous carts and expired sessions in small batches. Every batch is
+its own short transaction followed by a pause, so SQLite's write lock is never held for
+long and checkouts keep going while a large backlog is cleared.
+"""
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .cart_store import get_cart_store
+from .models import Cart, CartItem
+
+REAPER_BATCH_SIZE = 500
+REAPER_PAUSE = 0.05        # seconds between batches, letting other writers in
+DB_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+class CartReaper:
+    """Manages deleting stale carts and sessions"""
+
+    def __init__(self, batch_size=REAPER_BATCH_SIZE, pause=REAPER_PAUSE):
+        self.batch_size = batch_size
+        self.pause = pause
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    @property
+    def max_age(self):
+        return timedelta(days=getattr(settings, 'ANONYMOUS_CART_MAX_AGE_DAYS', 30))
+
+    def stale_carts(self, now=None):
+        """
+        Get anonymous carts nobody has touched within ANONYMOUS_CART_MAX_AGE_DAYS
+
+        Args:
+            now (datetime): Moment to measure from (defaults to now)
+
+        Returns:
+            QuerySet: Stale carts, oldest first
+        """
+        cutoff = (now or timezone.now()) - self.max_age
+        return Cart.objects.filter(user__isnull=True, updated_at__lt=cutoff).order_by('updated_at')
+
+    def expired_sessions(self, now=None):
+        """
+        Get expired database sessions
+
+        Args:
+            now (datetime): Moment to measure from (defaults to now)
+
+        Returns:
+            QuerySet: Expired sessions, or None when sessions are not stored in the database
+        """
+        if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+            return None
+        from django.contrib.sessions.models import Session
+        return Session.objects.filter(expire_date__lt=now or timezone.now())
+
+    def reap(self, dry_run=False):
+        """
+        Delete stale carts, their items and expired sessions batch by batch
+
+        Args:
+            dry_run (bool): Only count what would be deleted
+
+        Returns:
+            dict: Deleted carts, items, sessions, batches and elapsed seconds
+        """
+        started = time.monotonic()
+        now = timezone.now()
+        stats = {'carts': 0, 'items': 0, 'sessions': 0, 'batches': 0}
+        sessions = self.expired_sessions(now)
+
+        if dry_run:
+            stale = self.stale_carts(now)
+            stats['carts'] = stale.count()
+            stats['items'] = CartItem.objects.filter(cart__in=stale).count()
+            stats['sessions'] = sessions.count() if sessions is not None else 0
+        else:
+            # Carts changed only in the cart store's cache would look stale by their rows
+            get_cart_store().flush_all()
+            while True:
+                carts = list(self.stale_carts(now).values_list('id', 'session_key')[:self.batch_size])
+                if not carts:
+                    break
+                cart_ids = [cart_id for cart_id, _ in carts]
+                with transaction.atomic():
+                    stats['items'] += CartItem.objects.filter(cart_id__in=cart_ids).delete()[0]
+                    stats['carts'] += Cart.objects.filter(id__in=cart_ids).delete()[0]
+                # A cart store copy would otherwise write the cart back on its next flush
+                cache.delete_many([
+                    key
+                    for _, session_key in carts
+                    for key in (f'cart:session_key:{session_key}', f'cart:session_key:{session_key}:dirty')
+                ])
+                self._end_batch(stats)
+
+            while sessions is not None:
+                keys = list(sessions.values_list('session_key', flat=True)[:self.batch_size])
+                if not keys:
+                    break
+                with transaction.atomic():
+                    stats['sessions'] += sessions.model.objects.filter(session_key__in=keys).delete()[0]
+                self._end_batch(stats)
+
+        stats['seconds'] = round(time.monotonic() - started, 3)
+        return stats
+
+    def start(self, interval):
+        """
+        Run the reaper every `interval` seconds in a daemon thread (idempotent)
+
+        Args:
+            interval (int): Seconds between runs
+        """
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, args=(interval,), name='cart-reaper', daemon=True
+                )
+                self._thread.start()
+
+    def _end_batch(self, stats):
+        stats['batches'] += 1
+        time.sleep(self.pause)
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                stats = self.reap()
+                if stats['carts'] or stats['sessions']:
+                    print(f"Cart reaper: {stats}")
+            except Exception as e:
+                print(f"Error reaping carts: {e}")
+            finally:
+                close_old_connections()
+
+# Global instance
+cart_reaper = CartReaper()
+
+# Helper functions for easy use
+def reap_stale_carts(dry_run=False):
+    """
+    Helper function to delete abandoned anonymous carts and expired sessions
+
+    Args:
+        dry_run (bool): Only count what would be deleted
+    """
+    return cart_reaper.reap(dry_run=dry_run)
+
+def start_periodic_reaper(**kwargs):
+    """
+    Helper function to start the in-process reaper when settings.CART_REAPER_INTERVAL is set
+
+    Connected to request_started (see apps), so migrations and other management
+    commands never start it.
+    """
+    request_started.disconnect(start_periodic_reaper)
+    interval = getattr(settings, 'CART_REAPER_INTERVAL', 0)
+    if interval > 0:
+        cart_reaper.start(interval)
@@ -0,0 +1,817 @@
+"""
+Cart Store
+Keeps cart contents behind one small interface with two backends:
+
+- 'database' writes every change straight to Cart/CartItem.
+- 'cache' (the default) keeps hot carts in the cache and a background flusher writes
+  the changed carts to Cart/CartItem in batches, so clicks on the menu never wait on
+  SQLite's writer lock. Anything that needs the rows (checkout) flushes the cart first.
+  The carts waiting to be written are tracked in the cache too, so any process
+  (another web worker, the reaper) can flush them, and a restarted process leaves
+  them for the next flush. Every process must share the cache (Redis outside DEBUG).
+
+Select one with settings.CART_STORE.
+"""
+import atexit
+import hashlib
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Cart, CartItem, Foods, Special
+
+CART_KINDS = ('food', 'special')
+CART_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+CART_LOCK_TIMEOUT = 5
+CART_LOCK_POLL_INTERVAL = 0.01
+CART_FLUSH_BATCH_SIZE = 100
+CART_DIRTY_INDEX_KEY = 'cart_store:dirty'
+CART_DIRTY_INDEX_LOCK_KEY = 'cart_store:dirty:lock'
+CART_OPERATIONS = ('add', 'set', 'remove')
+MAX_CART_OPERATIONS = 50
+# Session data entry naming an anonymous cart; unlike the session key it survives login
+CART_SESSION_KEY = '_cart_key'
+CART_SYNC_BATCH_TTL = 60 * 60 * 24
+
+
+class CartBusyError(Exception):
+    """Raised when a cart stays locked by other writers for longer than CART_LOCK_TIMEOUT"""
+
+
+class CartOwner(namedtuple('CartOwner', ['field', 'value'])):
+    """Who a cart belongs to: ('user_id', 5) or ('session_key', 'abc...')"""
+
+    @property
+    def key(self):
+        return f'{self.field}:{self.value}'
+
+    @property
+    def lookup(self):
+        return {self.field: self.value}
+
+def line_key(kind, item_id):
+    """
+    Build the key a cart line is addressed by in forms and APIs
+
+    Args:
+        kind (str): 'food' or 'special'
+        item_id (int): Food or special id
+
+    Returns:
+        str: e.g. 'food-3'
+    """
+    return f'{kind}-{item_id}'
+
+def parse_line_key(value):
+    """
+    Parse a key built by line_key
+
+    Args:
+        value (str): e.g. 'special-7'
+
+    Returns:
+        tuple: (kind, item_id), or None if the value is not a line key
+    """
+    kind, _, item_id = str(value).partition('-')
+    if kind not in CART_KINDS or not item_id.isdigit():
+        return None
+    return kind, int(item_id)
+
+def cart_version(lines):
+    """
+    Fingerprint a cart's contents
+
+    The version is derived from the lines themselves, so both stores agree on it without
+    keeping a counter, and a client holding the same lines holds the same version.
+
+    Args:
+        lines (dict): Quantity keyed by (kind, item_id)
+
+    Returns:
+        str: Short hex digest
+    """
+    canonical = ','.join(f'{line_key(kind, item_id)}:{quantity}' for (kind, item_id), quantity in sorted(lines.items()))
+    return hashlib.sha1(canonical.encode()).hexdigest()[:12]
+
+def parse_cart_operations(raw):
+    """
+    Validate a batch of cart operations posted by the menu
+
+    Args:
+        raw (list): Dicts like {'op': 'add', 'type': 'food', 'id': 3, 'quantity': 1}
+
+    Returns:
+        list: (op, kind, item_id, quantity) tuples in the posted order
+
+    Raises:
+        ValueError: If any operation is malformed or names an item that does not exist
+    """
+    if not isinstance(raw, list) or not raw:
+        raise ValueError('operations must be a non-empty list')
+    if len(raw) > MAX_CART_OPERATIONS:
+        raise ValueError(f'At most {MAX_CART_OPERATIONS} operations per batch')
+
+    operations = []
+    for entry in raw:
+        if not isinstance(entry, dict):
+            raise ValueError('Each operation must be an object')
+        op, kind = entry.get('op'), entry.get('type')
+        if op not in CART_OPERATIONS or kind not in CART_KINDS:
+            raise ValueError(f'Invalid operation: {entry}')
+        try:
+            item_id = int(entry.get('id'))
+            quantity = int(entry.get('quantity', 1 if op == 'add' else 0))
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid operation: {entry}')
+        if op == 'add' and quantity < 1:
+            raise ValueError(f'Invalid quantity: {entry}')
+        operations.append((op, kind, item_id, quantity))
+
+    # Removing a line for an item that no longer exists is fine; adding one is not
+    for kind, model in (('food', Foods), ('special', Special)):
+        wanted = {item_id for op, k, item_id, _ in operations if k == kind and op != 'remove'}
+        missing = wanted - set(model.objects.filter(id__in=wanted).values_list('id', flat=True))
+        if missing:
+            raise ValueError(f'{kind.title()} item not found: {sorted(missing)[0]}')
+    return operations
+
+def apply_cart_operations(lines, operations):
+    """
+    Apply cart operations to a cart's lines in place
+
+    Args:
+        lines (dict): Quantity keyed by (kind, item_id)
+        operations (list): Output of parse_cart_operations
+    """
+    for op, kind, item_id, quantity in operations:
+        line = (kind, item_id)
+        if op == 'add':
+            quantity = lines.get(line, 0) + quantity
+        if op == 'remove' or quantity <= 0:
+            lines.pop(line, None)
+        else:
+            lines[line] = quantity
+
+def fold_cart_operations(operations):
+    """
+    Reduce a batch of cart operations to one change per line
+
+    Adds on a line nobody set or removed stay relative, so they can be applied as
+    increments without reading the cart first.
+
+    Args:
+        operations (list): Output of parse_cart_operations
+
+    Returns:
+        tuple: (increments, quantities to set, lines to remove), keyed by (kind, item_id)
+    """
+    increments, absolute = {}, {}
+    for op, kind, item_id, quantity in operations:
+        line = (kind, item_id)
+        if op == 'add' and line in absolute:
+            absolute[line] += quantity
+        elif op == 'add':
+            increments[line] = increments.get(line, 0) + quantity
+        else:
+            increments.pop(line, None)
+            absolute[line] = quantity if op == 'set' else 0
+    quantities = {line: quantity for line, quantity in absolute.items() if quantity > 0}
+    removals = [line for line, quantity in absolute.items() if quantity <= 0]
+    return increments, quantities, removals
+
+
+class DatabaseCartStore:
+    """Cart store writing every change to Cart/CartItem with single-statement upserts"""
+
+    name = 'database'
+
+    def get_lines(self, owner):
+        """
+        Get a cart's contents
+
+        Args:
+            owner (CartOwner): Cart owner
+
+        Returns:
+            dict: Quantity keyed by (kind, item_id)
+        """
+        rows = CartItem.objects.filter(**{f'cart__{owner.field}': owner.value})
+        lines = {}
+        for food_id, special_id, quantity in rows.values_list('food_id', 'special_id', 'quantity'):
+            if food_id:
+                lines[('food', food_id)] = quantity
+            elif special_id:
+                lines[('special', special_id)] = quantity
+        return lines
+
+    def add(self, owner, kind, item_id, quantity):
+        """Add to a line's quantity, creating the line if needed; returns the new quantity"""
+        with transaction.atomic():
+            cart = self._get_cart(owner)
+            upsert_cart_items(cart.id, {(kind, item_id): quantity}, increment=True)
+            touch_cart(cart.id)
+        return CartItem.objects.filter(cart=cart, **{f'{kind}_id': item_id}).values_list('quantity', flat=True).first()
+
+    def set_quantity(self, owner, kind, item_id, quantity):
+        """Set a line's quantity; zero or less removes the line"""
+        with transaction.atomic():
+            cart = self._get_cart(owner)
+            if quantity <= 0:
+                CartItem.objects.filter(cart=cart, **{f'{kind}_id': item_id}).delete()
+            else:
+                upsert_cart_items(cart.id, {(kind, item_id): quantity})
+            touch_cart(cart.id)
+        return max(quantity, 0)
+
+    def remove(self, owner, kind, item_id):
+        """Remove a line"""
+        self.set_quantity(owner, kind, item_id, 0)
+
+    def clear(self, owner):
+        """Remove every line"""
+        CartItem.objects.filter(**{f'cart__{owner.field}': owner.value}).delete()
+
+    def replace(self, owner, lines):
+        """Make a cart hold exactly the given lines"""
+        with transaction.atomic():
+            write_cart_lines(owner, lines)
+
+    def apply(self, owner, operations):
+        """Apply a batch of operations in one transaction; returns the resulting lines"""
+        increments, quantities, removals = fold_cart_operations(operations)
+        with transaction.atomic():
+            cart = self._get_cart(owner)
+            # At most two upserts per kind and one delete, however long the batch
+            upsert_cart_items(cart.id, increments, increment=True)
+            upsert_cart_items(cart.id, quantities)
+            if removals:
+                CartItem.objects.filter(cart=cart).filter(lines_filter(removals)).delete()
+            touch_cart(cart.id)
+        return self.get_lines(owner)
+
+    def merge(self, source, target):
+        """Move every line of one cart into another, adding up quantities"""
+        lines = self.get_lines(source)
+        with transaction.atomic():
+            if lines:
+                cart = self._get_cart(target)
+                upsert_cart_items(cart.id, lines, increment=True)
+                touch_cart(cart.id)
+            Cart.objects.filter(**source.lookup).delete()
+
+    def flush(self, owner=None):
+        """Nothing is pending; every change is already in the database"""
+
+    def flush_all(self):
+        """Nothing is pending; every change is already in the database"""
+
+    def _get_cart(self, owner):
+        # Carts are unique per owner, so a concurrent create makes get_or_create fetch the winner's
+        cart, created = Cart.objects.get_or_create(**owner.lookup)
+        return cart
+
+
+class CachedCartStore:
+    """
+    Cart store keeping carts in the cache with write-behind to Cart/CartItem
+
+    A cache miss reads the cart from the database. Every change marks the cart dirty in
+    the cache and adds it to a cache-held index of dirty carts; a daemon thread in each
+    web process writes the indexed carts every CART_FLUSH_INTERVAL seconds, in batches of
+    one transaction. Carts are written under their cart lock, so any process can flush
+    any cart and a change made meanwhile stays marked for the next flush.
+    """
+
+    name = 'cache'
+
+    def __init__(self, flush_interval=5):
+        self.flush_interval = flush_interval
+        self._database = DatabaseCartStore()
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+
+    def get_lines(self, owner):
+        """
+        Get a cart's contents, reading through to the database on a cache miss
+
+        Args:
+            owner (CartOwner): Cart owner
+
+        Returns:
+            dict: Quantity keyed by (kind, item_id)
+        """
+        lines = cache.get(self._key(owner))
+        if lines is None:
+            lines = self._database.get_lines(owner)
+            # add() so a concurrent writer's newer copy is never overwritten
+            if not cache.add(self._key(owner), lines, CART_CACHE_TIMEOUT):
+                lines = cache.get(self._key(owner), lines)
+        return dict(lines)
+
+    def add(self, owner, kind, item_id, quantity):
+        """Add to a line's quantity, creating the line if needed; returns the new quantity"""
+        def change(lines):
+            lines[(kind, item_id)] = lines.get((kind, item_id), 0) + quantity
+        return self._update(owner, change).get((kind, item_id), 0)
+
+    def set_quantity(self, owner, kind, item_id, quantity):
+        """Set a line's quantity; zero or less removes the line"""
+        def change(lines):
+            if quantity <= 0:
+                lines.pop((kind, item_id), None)
+            else:
+                lines[(kind, item_id)] = quantity
+        self._update(owner, change)
+        return max(quantity, 0)
+
+    def remove(self, owner, kind, item_id):
+        """Remove a line"""
+        self.set_quantity(owner, kind, item_id, 0)
+
+    def clear(self, owner):
+        """Remove every line"""
+        self._update(owner, lambda lines: lines.clear())
+
+    def replace(self, owner, lines):
+        """Make a cart hold exactly the given lines"""
+        def change(current):
+            current.clear()
+            current.update(lines)
+        self._update(owner, change)
+
+    def apply(self, owner, operations):
+        """Apply a batch of operations under one lock; returns the resulting lines"""
+        return self._update(owner, lambda lines: apply_cart_operations(lines, operations))
+
+    def merge(self, source, target):
+        """Move every line of one cart into another, adding up quantities"""
+        moved = self.get_lines(source)
+        if moved:
+            def change(lines):
+                for line, quantity in moved.items():
+                    lines[line] = lines.get(line, 0) + quantity
+            self._update(target, change)
+        # The source cart is finished with; drop it rather than flushing it empty
+        # (its index entry goes on the next flush)
+        cache.delete_many([self._key(source), self._dirty_key(source)])
+        Cart.objects.filter(**source.lookup).delete()
+
+    def flush(self, owner=None):
+        """
+        Write pending changes to Cart/CartItem
+
+        Args:
+            owner (CartOwner): Flush just this cart (e.g. before checkout), waiting for its lock;
+                one batch of the dirty carts not busy elsewhere if omitted
+
+        Returns:
+            int: Number of carts written
+        """
+        if owner is not None:
+            # Waits out a flush of this cart in another process, so its rows are current after
+            with self._locked(self._lock_key(owner)):
+                return self._write([owner])
+        return self._flush_batch(list(cache.get(CART_DIRTY_INDEX_KEY) or ())[:CART_FLUSH_BATCH_SIZE])
+
+    def flush_all(self):
+        """Write every pending change, batch by batch"""
+        owners = list(cache.get(CART_DIRTY_INDEX_KEY) or ())
+        written = 0
+        for start in range(0, len(owners), CART_FLUSH_BATCH_SIZE):
+            written += self._flush_batch(owners[start:start + CART_FLUSH_BATCH_SIZE])
+        return written
+
+    def _flush_batch(self, owners):
+        # Carts busy with a change are left for the next round
+        tokens = {}
+        try:
+            for owner in owners:
+                token = self._acquire(self._lock_key(owner), wait=False)
+                if token is not None:
+                    tokens[owner] = token
+            written = self._write(list(tokens))
+        finally:
+            for owner, token in tokens.items():
+                self._release(self._lock_key(owner), token)
+        self._prune_index(owners)
+        return written
+
+    def _write(self, owners):
+        # Call with the owners' cart locks held
+        markers = cache.get_many([self._dirty_key(owner) for owner in owners])
+        dirty = [owner for owner in owners if self._dirty_key(owner) in markers]
+        if not dirty:
+            return 0
+        # One write transaction per batch instead of one per click
+        with transaction.atomic():
+            for owner in dirty:
+                write_cart_lines(owner, self.get_lines(owner))
+        # Cleared only once written, and only if no change re-marked the cart meanwhile
+        # (one could if a slow write outlived the cart lock)
+        current = cache.get_many(list(markers))
+        cache.delete_many([key for key, marker in markers.items() if current.get(key) == marker])
+        return len(dirty)
+
+    def _update(self, owner, change):
+        with self._locked(self._lock_key(owner)):
+            lines = self.get_lines(owner)
+            change(lines)
+            cache.set(self._key(owner), lines, CART_CACHE_TIMEOUT)
+            # Under the cart lock, so a flush always sees the lines and the marker together
+            self._mark_dirty(owner)
+        self._start_flusher()
+        return lines
+
+    def _mark_dirty(self, owner):
+        dirty_key = self._dirty_key(owner)
+        already_dirty = cache.get(dirty_key) is not None
+        cache.set(dirty_key, uuid.uuid4().hex, CART_CACHE_TIMEOUT)
+        if not already_dirty:
+            self._update_index(lambda index: index.add(owner))
+
+    def _prune_index(self, owners):
+        def change(index):
+            # Read under the index lock: a cart re-marked after this re-adds itself
+            markers = cache.get_many([self._dirty_key(owner) for owner in owners])
+            index.difference_update(owner for owner in owners if self._dirty_key(owner) not in markers)
+        if owners:
+            self._update_index(change)
+
+    def _update_index(self, change):
+        with self._locked(CART_DIRTY_INDEX_LOCK_KEY):
+            index = cache.get(CART_DIRTY_INDEX_KEY) or set()
+            change(index)
+            cache.set(CART_DIRTY_INDEX_KEY, index, None)
+
+    @contextmanager
+    def _locked(self, lock_key):
+        # Serializes read-modify-write of a cache entry across processes (two tabs, fast taps)
+        token = self._acquire(lock_key)
+        try:
+            yield
+        finally:
+            self._release(lock_key, token)
+
+    def _acquire(self, lock_key, wait=True):
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + CART_LOCK_TIMEOUT
+        while not cache.add(lock_key, token, CART_LOCK_TIMEOUT):
+            if not wait:
+                return None
+            if time.monotonic() > deadline:
+                # Writing without the lock would silently drop another writer's change
+                raise CartBusyError('Cart is busy, please try again')
+            time.sleep(CART_LOCK_POLL_INTERVAL)
+        return token
+
+    def _release(self, lock_key, token):
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+    def _start_flusher(self):
+        with self._flusher_lock:
+            if self.flush_interval and (self._flusher is None or not self._flusher.is_alive()):
+                self._flusher = threading.Thread(target=self._run_flusher, name='cart-flusher', daemon=True)
+                self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush_all()
+            except Exception as e:
+                print(f"Error flushing carts: {e}")
+            finally:
+                close_old_connections()
+
+    def _key(self, owner):
+        return f'cart:{owner.key}'
+
+    def _dirty_key(self, owner):
+        return f'cart:{owner.key}:dirty'
+
+    def _lock_key(self, owner):
+        return f'cart:{owner.key}:lock'
+
+
+def write_cart_lines(owner, lines):
+    """
+    Make a cart's rows match the given lines (call inside a transaction)
+
+    Args:
+        owner (CartOwner): Cart owner
+        lines (dict): Quantity keyed by (kind, item_id)
+    """
+    if lines:
+        cart, created = Cart.objects.get_or_create(**owner.lookup)
+    else:
+        cart = Cart.objects.filter(**owner.lookup).first()
+        if cart is None:
+            return
+
+    # Upserts rather than diffing against a read, so two processes flushing the same cart can't collide
+    upsert_cart_items(cart.id, lines)
+    stale = CartItem.objects.filter(cart=cart)
+    if lines:
+        stale = stale.exclude(lines_filter(lines))
+    stale.delete()
+    touch_cart(cart.id)
+
+def upsert_cart_items(cart_id, lines, increment=False):
+    """
+    Insert cart lines, or update the ones that exist, without reading them first
+
+    Runs one INSERT ... ON CONFLICT DO UPDATE per item kind against the partial unique
+    indexes on CartItem. Databases without conflict targets fall back to an
+    F('quantity') update followed by an insert.
+
+    Args:
+        cart_id (int): Cart id
+        lines (dict): Quantity keyed by (kind, item_id)
+        increment (bool): Add the quantities to existing lines instead of replacing them
+    """
+    if not lines:
+        return
+    if not connection.features.supports_update_conflicts_with_target:
+        for (kind, item_id), quantity in lines.items():
+            _update_or_insert_cart_item(cart_id, kind, item_id, quantity, increment)
+        return
+
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    added_at = CartItem._meta.get_field('added_at').get_db_prep_value(timezone.now(), connection)
+    new_quantity = f'{table}.quantity + excluded.quantity' if increment else 'excluded.quantity'
+    for kind, other in (('food', 'special'), ('special', 'food')):
+        rows = [(item_id, quantity) for (row_kind, item_id), quantity in lines.items() if row_kind == kind]
+        if not rows:
+            continue
+        values = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+        params = [value for item_id, quantity in rows for value in (cart_id, item_id, quantity, added_at)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (cart_id, {kind}_id, quantity, added_at) VALUES {values} '
+                f'ON CONFLICT (cart_id, {kind}_id) WHERE {other}_id IS NULL '
+                f'DO UPDATE SET quantity = {new_quantity}',
+                params,
+            )
+
+def _update_or_insert_cart_item(cart_id, kind, item_id, quantity, increment):
+    rows = CartItem.objects.filter(cart_id=cart_id, **{f'{kind}_id': item_id})
+    new_quantity = F('quantity') + quantity if increment else quantity
+    if rows.update(quantity=new_quantity):
+        return
+    try:
+        with transaction.atomic():
+            CartItem.objects.create(cart_id=cart_id, quantity=quantity, **{f'{kind}_id': item_id})
+    except IntegrityError:
+        # Someone inserted the line in between; the update now finds it
+        rows.update(quantity=new_quantity)
+
+def lines_filter(lines):
+    """
+    Build a filter matching the CartItem rows of the given lines
+
+    Args:
+        lines (iterable): (kind, item_id) pairs
+
+    Returns:
+        Q: Filter for CartItem querysets
+    """
+    food_ids = [item_id for kind, item_id in lines if kind == 'food']
+    special_ids = [item_id for kind, item_id in lines if kind == 'special']
+    return Q(food_id__in=food_ids) | Q(special_id__in=special_ids)
+
+def touch_cart(cart_id):
+    """Bump a cart's updated_at without loading it"""
+    Cart.objects.filter(id=cart_id).update(updated_at=timezone.now())
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_cart_store():
+    """
+    Get the cart store selected by settings.CART_STORE
+
+    Returns:
+        CachedCartStore or DatabaseCartStore
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if getattr(settings, 'CART_STORE', 'cache') == 'database':
+                _store = DatabaseCartStore()
+            else:
+                _store = CachedCartStore(flush_interval=getattr(settings, 'CART_FLUSH_INTERVAL', 5))
+                # Write the last few seconds of changes now rather than on another process's next flush
+                atexit.register(_store.flush_all)
+        return _store
+
+# Helper functions for easy use
+def get_cart_owner(request, create=False):
+    """
+    Helper function to get the owner of the current visitor's cart
+
+    Args:
+        request (HttpRequest): Current request
+        create (bool): Start a session for an anonymous visitor who has none
+
+    Returns:
+        CartOwner, or None for an anonymous visitor without a session
+    """
+    if request.user.is_authenticated:
+        # A pre-login cart was merged once, at login (see merge_session_cart)
+        return CartOwner('user_id', request.user.id)
+
+    cart_key = request.session.get(CART_SESSION_KEY)
+    if cart_key is None:
+        if not request.session.session_key:
+            if not create:
+                return None
+            request.session.create()
+        cart_key = request.session.session_key
+        if create:
+            request.session[CART_SESSION_KEY] = cart_key
+    return CartOwner('session_key', cart_key)
+
+def merge_session_cart(request, user):
+    """
+    Helper function to move the cart a visitor built before logging in into their user cart
+
+    Called from the user_logged_in signal. login() has already cycled the session key by
+    then, so the cart is found through the key kept in the session data.
+
+    Args:
+        request (HttpRequest): Login request
+        user (User): User who logged in
+    """
+    cart_key = request.session.pop(CART_SESSION_KEY, None)
+    if cart_key:
+        get_cart_store().merge(CartOwner('session_key', cart_key), CartOwner('user_id', user.id))
+
+def get_cart_items(owner):
+    """
+    Helper function to load a cart's lines as (unsaved) CartItem objects for display
+
+    Args:
+        owner (CartOwner): Cart owner (None gives an empty list)
+
+    Returns:
+        list: CartItem objects with food/special attached
+    """
+    if owner is None:
+        return []
+    lines = get_cart_store().get_lines(owner)
+    foods = Foods.objects.in_bulk([item_id for kind, item_id in lines if kind == 'food'])
+    specials = Special.objects.in_bulk([item_id for kind, item_id in lines if kind == 'special'])
+    items = []
+    for (kind, item_id), quantity in lines.items():
+        item = CartItem(quantity=quantity)
+        if kind == 'food' and item_id in foods:
+            item.food = foods[item_id]
+        elif kind == 'special' and item_id in specials:
+            item.special = specials[item_id]
+        else:
+            continue  # the item was deleted from the catalog
+        items.append(item)
+    return items
+
+def get_cart_totals(items):
+    """
+    Helper function to count a cart's items and add up its price
+
+    Args:
+        items (list): CartItem objects from get_cart_items
+
+    Returns:
+        tuple: (total quantity, total price)
+    """
+    return sum(item.quantity for item in items), sum(item.total_price for item in items)
+
+def get_cart_snapshot(owner):
+    """
+    Helper function to describe a cart for the front end
+
+    Args:
+        owner (CartOwner): Cart owner
+
+    Returns:
+        dict: Version, lines with names and prices, item count and total
+    """
+    items = get_cart_items(owner)
+    count, total = get_cart_totals(items)
+    return {
+        'version': cart_version({
+            ('food', item.food_id) if item.food_id else ('special', item.special_id): item.quantity for item in items
+        }),
+        'lines': [
+            {
+                'key': item.line_key,
+                'type': 'food' if item.food_id else 'special',
+                'id': item.food_id or item.special_id,
+                'name': item.item_name,
+                'quantity': item.quantity,
+                'price': float(item.item_price),
+                'total': float(item.total_price),
+            }
+            for item in items
+        ],
+        'count': count,
+        'total': float(total),
+    }
+
+def get_cart_count(owner):
+    """
+    Helper function to count a cart's items without touching the catalog
+
+    Args:
+        owner (CartOwner): Cart owner (None gives 0)
+
+    Returns:
+        int: Total quantity
+    """
+    if owner is None:
+        return 0
+    return sum(get_cart_store().get_lines(owner).values())
+
+def find_cart_line(owner, value):
+    """
+    Helper function to resolve a posted cart line
+
+    Args:
+        owner (CartOwner): Cart owner
+        value (str): Line key, or the id of a CartItem row (older pages post those)
+
+    Returns:
+        tuple: (kind, item_id), or None if the cart has no such line
+    """
+    line = parse_line_key(value)
+    if line is None and str(value).isdigit():
+        flush_cart(owner)
+        row = CartItem.objects.filter(id=value, **{f'cart__{owner.field}': owner.value}).first()
+        line = (('food', row.food_id) if row.food_id else ('special', row.special_id)) if row else None
+    if line is None or line not in get_cart_store().get_lines(owner):
+        return None
+    return line
+
+def claim_cart_batch(owner, batch_id):
+    """
+    Helper function to make a client's sync batch apply at most once
+
+    Args:
+        owner (CartOwner): Cart owner
+        batch_id (str): Id the client sends the batch under (resends reuse it)
+
+    Returns:
+        bool: True the first time a batch is seen, False for a resend
+    """
+    return cache.add(f'cart_sync:{owner.key}:{batch_id}', 1, CART_SYNC_BATCH_TTL)
+
+def release_cart_batch(owner, batch_id):
+    """
+    Helper function to forget a sync batch that could not be applied, so the client's resend is
+
+    Args:
+        owner (CartOwner): Cart owner
+        batch_id (str): Id the client sent the batch under
+    """
+    cache.delete(f'cart_sync:{owner.key}:{batch_id}')
+
+def get_cart_owner_for(cart):
+    """
+    Helper function to get the owner of a Cart row
+
+    Args:
+        cart (Cart): Cart
+
+    Returns:
+        CartOwner
+    """
+    if cart.user_id:
+        return CartOwner('user_id', cart.user_id)
+    return CartOwner('session_key', cart.session_key)
+
+def clear_cart(owner):
+    """
+    Helper function to empty a cart everywhere, e.g. after checkout
+
+    Args:
+        owner (CartOwner): Cart owner
+    """
+    store = get_cart_store()
+    store.clear(owner)
+    store.flush(owner)
+
+def flush_cart(owner):
+    """
+    Helper function to make sure a cart's latest state is in Cart/CartItem
+
+    Args:
+        owner (CartOwner): Cart owner
+    """
+    get_cart_store().flush(owner)
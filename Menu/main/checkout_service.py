@@ -0,0 +1,142 @@
+"""
+Checkout Service
+Turns cart lines into an order. Every referenced food and special is fetched with one
+id__in query per kind, prices always come from the database rather than the client,
+and the order, its items and its total are written in a single transaction with one
+bulk insert, so placing an order costs the same few queries however long the cart is.
+The order row also gets its line snapshot, so order pages never have to read the items.
+"""
+from decimal import Decimal
+from django.db import transaction
+from .cart_store import parse_line_key
+from .models import Foods, Special, Order, OrderItem, order_line_snapshot
+
+
+class CheckoutError(Exception):
+    """Raised when a cart holds nothing that can be ordered"""
+
+
+class CheckoutService:
+    """Manages pricing cart lines and writing orders"""
+
+    def parse_client_cart(self, items):
+        """
+        Turn a client-side cart list into cart lines
+
+        Accepts line keys as the menus and cart APIs build them, e.g. {'id': 'special-3',
+        'quantity': 2} or 'food-5', and bare food ids. Malformed entries are skipped,
+        quantities fall back to 1, and any price sent along is ignored.
+
+        Args:
+            items (list): Cart entries with 'id' and 'quantity'
+
+        Returns:
+            dict: {(kind, item_id): quantity}
+        """
+        lines = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            value = str(item.get('id') or '').strip().lower()
+            line = parse_line_key(f'food-{value}' if value.isdigit() else value)
+            if line is None:
+                continue
+            kind, item_id = line
+            try:
+                quantity = int(item.get('quantity') or 1)
+            except (ValueError, TypeError):
+                quantity = 1
+            lines[(kind, item_id)] = lines.get((kind, item_id), 0) + max(quantity, 1)
+        return lines
+
+    def price_lines(self, lines):
+        """
+        Build unsaved order items for cart lines at current menu prices
+
+        Args:
+            lines (dict): {(kind, item_id): quantity}
+
+        Returns:
+            list: OrderItem instances without an order, for lines whose item still exists
+        """
+        ids = {'food': set(), 'special': set()}
+        for kind, item_id in lines:
+            ids[kind].add(item_id)
+        foods = Foods.objects.in_bulk(ids['food']) if ids['food'] else {}
+        specials = Special.objects.in_bulk(ids['special']) if ids['special'] else {}
+
+        order_items = []
+        for (kind, item_id), quantity in lines.items():
+            if quantity <= 0:
+                continue
+            if kind == 'food' and item_id in foods:
+                food = foods[item_id]
+                if food.price is not None:
+                    order_items.append(OrderItem(food=food, quantity=quantity, price=food.price))
+            elif kind == 'special' and item_id in specials:
+                special = specials[item_id]
+                price = special.discounted_price or special.price
+                if price is not None:
+                    order_items.append(OrderItem(special=special, quantity=quantity, price=price))
+        return order_items
+
+    def place_order(self, lines, **order_fields):
+        """
+        Create an order with its items and total in one transaction
+
+        Args:
+            lines (dict): {(kind, item_id): quantity}
+            **order_fields: Order fields (user, customer, notes, order_type...)
+
+        Returns:
+            Order: Saved order
+
+        Raises:
+            CheckoutError: If no line refers to an orderable item
+        """
+        order_items = self.price_lines(lines)
+        if not order_items:
+            raise CheckoutError('No valid items found in cart')
+
+        total = sum((item.price * item.quantity for item in order_items), Decimal('0'))
+        order_fields.setdefault('status', 'pending')
+        with transaction.atomic():
+            order = Order.objects.create(
+                total=total,
+                line_items=order_line_snapshot(order_items),
+                item_count=sum(item.quantity for item in order_items),
+                **order_fields
+            )
+            for item in order_items:
+                item.order = order
+            OrderItem.objects.bulk_create(order_items)
+        return order
+
+# Global instance
+checkout_service = CheckoutService()
+
+# Helper functions for easy use
+def place_order(lines, **order_fields):
+    """
+    Helper function to turn cart lines into a saved order
+
+    Args:
+        lines (dict): {(kind, item_id): quantity}
+        **order_fields: Order fields
+
+    Returns:
+        Order: Saved order
+    """
+    return checkout_service.place_order(lines, **order_fields)
+
+def parse_client_cart(items):
+    """
+    Helper function to read a client-side cart list into cart lines
+
+    Args:
+        items (list): Cart entries with 'id' and 'quantity'
+
+    Returns:
+        dict: {(kind, item_id): quantity}
+    """
+    return checkout_service.parse_client_cart(items)
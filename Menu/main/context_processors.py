@@ -1,42 +1,67 @@
 """
 Context processors for making cart and favorites data available in all templates
 """
-from .models import Cart, Favorite
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from .models import Favorite
+from .cart_store import get_cart_owner, get_cart_count
 
-def cart_context(request):
-    """Add cart information to template context"""
-    cart_count = 0
-    favorites_count = 0
-    
-    if hasattr(request, 'user') and request.user.is_authenticated:
-        # Get user's cart count
-        try:
-            cart = Cart.objects.get(user=request.user)
-            cart_count = cart.total_items
-        except Cart.DoesNotExist:
-            cart_count = 0
-            
-        # Get user's favorites count
-        favorites_count = Favorite.objects.filter(user=request.user).count()
-    else:
-        # Get session cart count
-        if request.session.session_key:
-            try:
-                cart = Cart.objects.get(session_key=request.session.session_key)
-                cart_count = cart.total_items
-            except Cart.DoesNotExist:
-                cart_count = 0
-    
-    # Add waiter role info
-    is_waiter = False
-    if hasattr(request, 'user') and request.user.is_authenticated:
+BADGE_CACHE_TIMEOUT = 60 * 60 * 24
+ANONYMOUS_BADGES = {'favorites_count': 0, 'is_waiter': False}
+
+def get_user_badges(user):
+    """
+    Get a user's favorites count and waiter flag, cached until a favorite or profile changes
+
+    Args:
+        user (User): Authenticated user
+
+    Returns:
+        dict: favorites_count and is_waiter
+    """
+    key = f'badges:user:{user.id}'
+    badges = cache.get(key)
+    if badges is None:
+        is_waiter = False
         try:
-            if hasattr(request.user, 'waiter_profile') and request.user.waiter_profile.user_type == 'waiter':
+            if hasattr(user, 'waiter_profile') and user.waiter_profile.user_type == 'waiter':
                 is_waiter = True
         except Exception:
             pass
+        badges = {
+            'favorites_count': Favorite.objects.filter(user=user).count(),
+            'is_waiter': is_waiter,
+        }
+        cache.set(key, badges, BADGE_CACHE_TIMEOUT)
+    return badges
+
+def invalidate_user_badges(user_id):
+    """
+    Forget a user's cached badges (see signals)
+
+    Args:
+        user_id (int): User id
+    """
+    cache.delete(f'badges:user:{user_id}')
+
+def cart_context(request):
+    """Add cart information to template context"""
+    # Every value is lazy, so a page that never shows the badges never works them out
+    def badge(name):
+        def load():
+            if hasattr(request, 'user') and request.user.is_authenticated:
+                return get_user_badges(request.user)[name]
+            return ANONYMOUS_BADGES[name]
+        return SimpleLazyObject(load)
+
+    def cart_count():
+        # The cart store answers from the cache, without touching Cart/CartItem
+        if not hasattr(request, 'user'):
+            return 0
+        return get_cart_count(get_cart_owner(request))
+
     return {
-        'cart_count': cart_count,
-        'favorites_count': favorites_count,
-        'is_waiter': is_waiter,
+        'cart_count': SimpleLazyObject(cart_count),
+        'favorites_count': badge('favorites_count'),
+        'is_waiter': badge('is_waiter'),
     }
@@ -0,0 +1,174 @@
+"""
+Idempotency Keys
+Lets clients retry order-creating requests safely. A request sent with an
+Idempotency-Key header runs once; its response is kept for IDEMPOTENCY_KEY_TTL
+seconds and replayed to any retry carrying the same key and body, and a duplicate
+that arrives while the first is still running waits for its response instead of
+placing a second order.
+"""
+import hashlib
+import json
+import time
+import uuid
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+LOCK_TIMEOUT = 30          # seconds the first request may take before a duplicate gives up on it
+LOCK_WAIT = 10.0           # seconds a concurrent duplicate waits for the first response
+LOCK_POLL_INTERVAL = 0.05
+
+
+class IdempotencyManager:
+    """Manages stored responses for idempotent requests"""
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24)
+
+    def fingerprint(self, request):
+        """
+        Get a hash identifying what a request asks for
+
+        Args:
+            request (HttpRequest): Incoming request
+
+        Returns:
+            str: sha256 of the method, path and body
+        """
+        digest = hashlib.sha256()
+        for part in (request.method.encode(), request.path.encode(), request.body):
+            digest.update(part)
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def run(self, request, key, view, *args, **kwargs):
+        """
+        Run a view once per key, replaying its stored response to later duplicates
+
+        Args:
+            request (HttpRequest): Incoming request
+            key (str): Client-chosen Idempotency-Key
+            view (callable): View to run the first time
+
+        Returns:
+            HttpResponse: The view's response, a replay of it, or a 409/422 error
+        """
+        cache_key = self._key(request, key)
+        fingerprint = self.fingerprint(request)
+
+        stored = cache.get(cache_key)
+        if stored is not None:
+            return self._replay(stored, fingerprint)
+
+        lock_key = f'{cache_key}:lock'
+        token = f'{fingerprint}:{uuid.uuid4().hex}'
+        if cache.add(lock_key, token, LOCK_TIMEOUT):
+            try:
+                response = view(request, *args, **kwargs)
+                self._store(cache_key, fingerprint, response)
+                return response
+            finally:
+                # After LOCK_TIMEOUT another request may hold the lock; leave theirs alone
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        # The first request with this key is still running; wait for its response
+        deadline = time.monotonic() + LOCK_WAIT
+        while True:
+            stored = cache.get(cache_key)
+            if stored is not None:
+                return self._replay(stored, fingerprint)
+            running = cache.get(lock_key)
+            if running is None:
+                # The first request failed without storing a response; this one gets a go
+                return self.run(request, key, view, *args, **kwargs)
+            if running.split(':')[0] != fingerprint:
+                return self._mismatch()
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(LOCK_POLL_INTERVAL)
+        return JsonResponse({
+            'success': False,
+            'message': 'A request with this Idempotency-Key is still being processed'
+        }, status=409)
+
+    def _store(self, cache_key, fingerprint, response):
+        # Only successes are stored; after any failure the client's retry gets another attempt
+        if not 200 <= response.status_code < 300 or getattr(response, 'streaming', False):
+            return
+        if hasattr(response, 'render') and not getattr(response, 'is_rendered', True):
+            response.render()
+        if self._reports_failure(response):
+            return
+        cache.set(cache_key, {
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'content': response.content,
+            'content_type': response.get('Content-Type'),
+        }, self.ttl)
+
+    def _reports_failure(self, response):
+        # Several views answer 200 with {'success': False} on errors
+        if 'json' not in (response.get('Content-Type') or ''):
+            return False
+        try:
+            return json.loads(response.content).get('success') is False
+        except (ValueError, AttributeError):
+            return False
+
+    def _replay(self, stored, fingerprint):
+        if stored['fingerprint'] != fingerprint:
+            return self._mismatch()
+        response = HttpResponse(stored['content'], status=stored['status'], content_type=stored['content_type'])
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    def _mismatch(self):
+        return JsonResponse({
+            'success': False,
+            'message': 'This Idempotency-Key was already used for a different request'
+        }, status=422)
+
+    def _key(self, request, key):
+        # Keys are only unique per client, so scope them to the user or session and the endpoint
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            scope = f'user:{user.pk}'
+        else:
+            session = getattr(request, 'session', None)
+            if session is not None and session.session_key:
+                scope = f'session:{session.session_key}'
+            else:
+                scope = f"addr:{request.META.get('REMOTE_ADDR', '')}"
+        digest = hashlib.sha256(f'{scope}:{request.path}:{key}'.encode()).hexdigest()
+        return f'idempotency:{digest}'
+
+# Global instance
+idempotency_manager = IdempotencyManager()
+
+# Helper functions for easy use
+def idempotent(view):
+    """
+    Decorator to honour an Idempotency-Key header on a view
+
+    Requests without the header run as before.
+
+    Args:
+        view (callable): View that creates something, e.g. an order
+
+    Returns:
+        callable: Wrapped view
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER, '').strip()
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse({'success': False, 'message': 'Idempotency-Key is too long'}, status=400)
+        return idempotency_manager.run(request, key, view, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,121 @@
+"""
+Image Derivative Pipeline
+Normalizes uploaded menu photos and produces fixed-width WebP and JPEG thumbnails
+so menu cards never ship multi-megabyte originals
+"""
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+MAX_ORIGINAL_DIMENSION = 1600
+THUMBNAIL_WIDTHS = (320, 640)
+DERIVATIVE_FORMATS = {
+    'webp': {'format': 'WEBP', 'mime': 'image/webp', 'options': {'quality': 80, 'method': 4}},
+    'jpeg': {'format': 'JPEG', 'mime': 'image/jpeg', 'options': {'quality': 82, 'optimize': True, 'progressive': True}},
+}
+DERIVATIVE_DIR = 'derivatives'
+DEFAULT_SIZES = '(max-width: 600px) 100vw, 320px'
+
+
+def derivative_name(image_name, width, extension):
+    """
+    Storage name of one derivative of an uploaded image
+
+    Args:
+        image_name (str): Storage name of the original, e.g. 'Foods/momo.jpg'
+        width (int): Derivative width in pixels
+        extension (str): 'webp' or 'jpeg'
+
+    Returns:
+        str: e.g. 'derivatives/Foods/momo.jpg_320.webp'
+    """
+    # Keep the original's extension, so momo.jpg and momo.png never share thumbnails
+    return f'{DERIVATIVE_DIR}/{image_name}_{width}.{extension}'
+
+def has_derivatives(image_name):
+    """Check whether an image has already been processed (the largest JPEG is written last)"""
+    return default_storage.exists(derivative_name(image_name, THUMBNAIL_WIDTHS[-1], 'jpeg'))
+
+def process_image(image_name, force=False):
+    """
+    Normalize an uploaded image in place and write its thumbnails
+
+    Args:
+        image_name (str): Storage name of the original
+        force (bool): Reprocess even if derivatives already exist
+
+    Returns:
+        list: Storage names written (empty if the image was already processed)
+    """
+    if not image_name or (not force and has_derivatives(image_name)):
+        return []
+
+    with default_storage.open(image_name, 'rb') as source:
+        image = Image.open(source)
+        image.load()
+    original_format = image.format or 'JPEG'
+
+    # Apply the EXIF rotation so phones' sideways photos display upright
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((MAX_ORIGINAL_DIMENSION, MAX_ORIGINAL_DIMENSION), Image.LANCZOS)
+
+    written = []
+    # Re-encoding without the info dict strips EXIF/GPS metadata
+    options = {'quality': 85, 'optimize': True} if original_format == 'JPEG' else {}
+    _replace(image_name, _encode(image, original_format, options))
+    written.append(image_name)
+
+    for width in THUMBNAIL_WIDTHS:
+        thumbnail = _resize_to_width(image, width)
+        # JPEG last: has_derivatives() keys off the largest JPEG
+        for extension in ('webp', 'jpeg'):
+            spec = DERIVATIVE_FORMATS[extension]
+            name = derivative_name(image_name, width, extension)
+            _replace(name, _encode(thumbnail, spec['format'], spec['options']))
+            written.append(name)
+    return written
+
+def build_srcset(image_name):
+    """
+    Build srcset strings for an image's derivatives
+
+    Args:
+        image_name (str): Storage name of the original
+
+    Returns:
+        dict: {'webp': srcset, 'jpeg': srcset, 'src': fallback url}, or {} if not processed yet
+    """
+    if not image_name or not has_derivatives(image_name):
+        return {}
+    srcset = {
+        extension: ', '.join(
+            f'{default_storage.url(derivative_name(image_name, width, extension))} {width}w'
+            for width in THUMBNAIL_WIDTHS
+        )
+        for extension in DERIVATIVE_FORMATS
+    }
+    srcset['src'] = default_storage.url(derivative_name(image_name, THUMBNAIL_WIDTHS[-1], 'jpeg'))
+    return srcset
+
+def _resize_to_width(image, width):
+    if image.width <= width:
+        return image.copy()
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+def _encode(image, image_format, options):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        # JPEG has no alpha channel; flatten onto white like the card background
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+def _replace(name, content):
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(content))
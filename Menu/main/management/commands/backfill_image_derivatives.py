@@ -0,0 +1,72 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from main.image_pipeline import process_image
+from main.menu_snapshot import invalidate_menu_snapshot
+from main.models import Foods, Special
+
+
+def _setup_worker():
+    # Spawned workers (Windows, macOS) start without Django configured
+    django.setup()
+
+def _process(image_name, force):
+    try:
+        return image_name, process_image(image_name, force=force), None
+    except (OSError, ValueError) as e:
+        return image_name, [], str(e)
+
+
+class Command(BaseCommand):
+    help = 'Normalize existing food and special images and generate their WebP/JPEG thumbnails'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Number of worker processes (default: one per CPU)',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Reprocess images that already have derivatives',
+        )
+
+    def handle(self, *args, **options):
+        # Several rows can share one upload, so process each file once
+        owners = {}
+        for food_id, name in Foods.objects.exclude(image='').values_list('id', 'image'):
+            owners.setdefault(name, []).append(('food', food_id))
+        for special_id, name in Special.objects.exclude(image='').values_list('id', 'image'):
+            owners.setdefault(name, []).append(('special', special_id))
+
+        if not owners:
+            self.stdout.write('No images to process.')
+            return
+
+        workers = max(1, options['workers'])
+        started = time.monotonic()
+        processed = skipped = failed = 0
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as executor:
+            futures = [executor.submit(_process, name, options['force']) for name in owners]
+            for future in as_completed(futures):
+                name, written, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                elif written:
+                    processed += 1
+                    # The snapshot carries srcsets, so the owning rows count as changed
+                    for kind, item_id in owners[name]:
+                        invalidate_menu_snapshot(kind, item_id)
+                else:
+                    skipped += 1
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} images ({skipped} already done, {failed} failed) '
+            f'with {workers} workers in {elapsed:.2f}s'
+        ))
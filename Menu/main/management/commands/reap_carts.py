@@ -0,0 +1,57 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.cart_reaper import CartReaper, REAPER_BATCH_SIZE, REAPER_PAUSE
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned anonymous carts and expired sessions in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=REAPER_BATCH_SIZE,
+            help=f'Rows deleted per transaction (default: {REAPER_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=REAPER_PAUSE,
+            help=f'Seconds to wait between batches so other writers get the lock (default: {REAPER_PAUSE})',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only count what would be deleted',
+        )
+        parser.add_argument(
+            '--every', type=int, default=0,
+            help='Keep running, reaping every this many seconds (e.g. as a Procfile process)',
+        )
+
+    def handle(self, *args, **options):
+        reaper = CartReaper(batch_size=max(1, options['batch_size']), pause=max(0, options['pause']))
+        if options['every'] > 0:
+            stop = threading.Event()
+            signal.signal(signal.SIGINT, lambda *_: stop.set())
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            while not stop.is_set():
+                self.reap(reaper, options['dry_run'])
+                close_old_connections()
+                stop.wait(options['every'])
+            return
+        self.reap(reaper, options['dry_run'])
+
+    def reap(self, reaper, dry_run):
+        stats = reaper.reap(dry_run=dry_run)
+
+        if dry_run:
+            self.stdout.write(
+                f"Would delete {stats['carts']} carts ({stats['items']} items) older than "
+                f"{reaper.max_age.days} days and {stats['sessions']} expired sessions"
+            )
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {stats['carts']} carts ({stats['items']} items) and {stats['sessions']} expired sessions "
+            f"in {stats['batches']} batches in {stats['seconds']:.2f}s"
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.search_index import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the menu search index from Foods, Special and Category'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        started = time.monotonic()
+        count = backend.rebuild()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} documents with the {backend.name} backend in {elapsed:.2f}s'
+        ))
+        if backend.name == 'inverted-index':
+            self.stdout.write(
+                'This index lives in each worker process and rebuilds itself there '
+                'after the next catalog change.'
+            )
@@ -0,0 +1,50 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from main.task_queue import task_queue
+
+
+class Command(BaseCommand):
+    help = 'Work the background task queue (order emails and realtime notifications)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Worker threads (default: 2)',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run every task that is due now, then exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            ran = 0
+            while True:
+                batch = task_queue.work()
+                if not batch:
+                    break
+                ran += batch
+            self.stdout.write(self.style.SUCCESS(f"Ran {ran} tasks; queue: {task_queue.stats()}"))
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+        workers = [
+            threading.Thread(target=task_queue.serve, args=(stop,), name=f'task-worker-{number}')
+            for number in range(max(1, options['workers']))
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Working the task queue with {len(workers)} workers (Ctrl+C to stop)")
+
+        while not stop.wait(60):
+            self.stdout.write(f"Queue: {task_queue.stats()}")
+        # A worker finishes the task it is running, then notices the stop flag
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS('Task workers stopped'))
@@ -0,0 +1,162 @@
+"""
+Menu Facets
+Faceted filtering of the menu snapshot by vegetarian, spicy, price band, rating and
+category. The id sets behind every facet value are built once with the snapshot, so
+filtering and counting is set arithmetic in memory instead of one query per facet.
+"""
+from decimal import Decimal
+
+PRICE_BANDS = (
+    # key, label, lower bound (inclusive), upper bound (exclusive)
+    ('under-200', 'Under Rs 200', None, Decimal('200')),
+    ('200-500', 'Rs 200 - 500', Decimal('200'), Decimal('500')),
+    ('500-1000', 'Rs 500 - 1000', Decimal('500'), Decimal('1000')),
+    ('1000-plus', 'Rs 1000 and above', Decimal('1000'), None),
+)
+RATING_THRESHOLDS = ('3', '4', '4.5')
+
+
+def build_facet_index(foods):
+    """
+    Build the id sets behind every facet value
+
+    Args:
+        foods (list): Food snapshot entries
+
+    Returns:
+        dict: Sets of food ids keyed by facet group (and value for multi-valued groups)
+    """
+    index = {
+        'all': set(),
+        'veg': set(),
+        'spicy': set(),
+        'price': {key: set() for key, _, _, _ in PRICE_BANDS},
+        'rating': {threshold: set() for threshold in RATING_THRESHOLDS},
+        'category': {},
+    }
+    for food in foods:
+        food_id = food['id']
+        index['all'].add(food_id)
+        if food['is_vegetarian']:
+            index['veg'].add(food_id)
+        if food['is_spicy']:
+            index['spicy'].add(food_id)
+        for key, _, lower, upper in PRICE_BANDS:
+            if (lower is None or food['price'] >= lower) and (upper is None or food['price'] < upper):
+                index['price'][key].add(food_id)
+                break
+        for threshold in RATING_THRESHOLDS:
+            if food['rating'] >= Decimal(threshold):
+                index['rating'][threshold].add(food_id)
+        index['category'].setdefault(food['category']['id'], set()).add(food_id)
+    return index
+
+def parse_facet_filters(params, categories):
+    """
+    Read the selected facets from query parameters, ignoring unknown values
+
+    Args:
+        params (QueryDict): request.GET (veg=1, spicy=1, price=<band>, rating=<min>, category=<name>)
+        categories (list): Category snapshot entries
+
+    Returns:
+        dict: Selected value keyed by facet group
+    """
+    filters = {}
+    if params.get('veg') == '1':
+        filters['veg'] = True
+    if params.get('spicy') == '1':
+        filters['spicy'] = True
+    if params.get('price') in {key for key, _, _, _ in PRICE_BANDS}:
+        filters['price'] = params['price']
+    if params.get('rating') in RATING_THRESHOLDS:
+        filters['rating'] = params['rating']
+    category = next((c for c in categories if c['name'] == params.get('category')), None)
+    if category:
+        filters['category'] = category['id']
+    return filters
+
+def filter_foods(snapshot, filters):
+    """
+    Filter the snapshot's foods without computing facet counts
+
+    Args:
+        snapshot (dict): Menu snapshot (with its 'facets' index)
+        filters (dict): Output of parse_facet_filters
+
+    Returns:
+        list: Matching food entries in menu order
+    """
+    if not filters:
+        return snapshot['foods']
+    index = snapshot['facets']
+    matched = index['all']
+    for group, value in filters.items():
+        matched = matched & _ids_for(index, group, value)
+    return [food for food in snapshot['foods'] if food['id'] in matched]
+
+def filter_menu(snapshot, filters):
+    """
+    Filter the snapshot's foods and count every facet value against the other selections
+
+    A value's count is the number of items it would show if picked while keeping the
+    other groups' selections, so switching price band or category never leads to an
+    empty page.
+
+    Args:
+        snapshot (dict): Menu snapshot (with its 'facets' index)
+        filters (dict): Output of parse_facet_filters
+
+    Returns:
+        tuple: (matching food entries in menu order, counts keyed like the facet index)
+    """
+    index = snapshot['facets']
+    selected = {group: _ids_for(index, group, value) for group, value in filters.items()}
+
+    def matching(excluded_group=None):
+        ids = index['all']
+        for group, ids_for_group in selected.items():
+            if group != excluded_group:
+                ids = ids & ids_for_group
+        return ids
+
+    base = {group: matching(group) for group in ('veg', 'spicy', 'price', 'rating', 'category')}
+    counts = {
+        'veg': len(base['veg'] & index['veg']),
+        'spicy': len(base['spicy'] & index['spicy']),
+        'price': {key: len(base['price'] & ids) for key, ids in index['price'].items()},
+        'rating': {threshold: len(base['rating'] & ids) for threshold, ids in index['rating'].items()},
+        'category': {category_id: len(base['category'] & ids) for category_id, ids in index['category'].items()},
+    }
+    return filter_foods(snapshot, filters), counts
+
+def describe_facets(counts, filters):
+    """
+    Turn facet counts into option lists for the menu template
+
+    Args:
+        counts (dict): Counts from filter_menu
+        filters (dict): Selected facets
+
+    Returns:
+        dict: Option lists for price and rating plus veg/spicy counts
+    """
+    return {
+        'veg': {'count': counts['veg'], 'selected': filters.get('veg', False)},
+        'spicy': {'count': counts['spicy'], 'selected': filters.get('spicy', False)},
+        'price': [
+            {'value': key, 'label': label, 'count': counts['price'][key], 'selected': filters.get('price') == key}
+            for key, label, _, _ in PRICE_BANDS
+        ],
+        'rating': [
+            {'value': threshold, 'label': f'{threshold}+ stars', 'count': counts['rating'][threshold],
+             'selected': filters.get('rating') == threshold}
+            for threshold in RATING_THRESHOLDS
+        ],
+        'category': counts['category'],
+    }
+
+def _ids_for(index, group, value):
+    if group in ('veg', 'spicy'):
+        return index[group]
+    return index[group].get(value, set())
@@ -0,0 +1,128 @@
+"""
+Menu Card Fragments
+Caches the rendered HTML of each menu card under its item's catalog version, so a menu
+page is assembled from one cache round trip. Nothing user specific goes into a card;
+favorites and cart quantities are sent next to them as a small JSON overlay.
+"""
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from .models import Favorite
+from .cart_store import get_cart_store, get_cart_owner
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+FRAGMENT_HITS_KEY = 'menu_card:hits'
+FRAGMENT_MISSES_KEY = 'menu_card:misses'
+# Cards are shared between visitors, so each request's token is swapped in afterwards
+CSRF_PLACEHOLDER = '__menu_card_csrf_token__'
+
+
+class MenuFragmentCache:
+    """Manages cached menu card HTML"""
+
+    def render_cards(self, request, entries, template_name, context_name='food'):
+        """
+        Render menu cards, reusing cached HTML for every unchanged item
+
+        Args:
+            request (HttpRequest): Current request (for the CSRF token)
+            entries (list): Snapshot entries carrying 'id' and 'version'
+            template_name (str): Card template
+            context_name (str): Name the card template uses for its entry
+
+        Returns:
+            SafeString: Concatenated card HTML in entry order
+        """
+        keys = [self._key(template_name, entry) for entry in entries]
+        cached = cache.get_many(keys)
+        rendered = {}
+        parts = []
+        for key, entry in zip(keys, entries):
+            html = cached.get(key)
+            if html is None:
+                html = render_to_string(template_name, {context_name: entry, 'csrf_token': CSRF_PLACEHOLDER})
+                rendered[key] = html
+            parts.append(html)
+        if rendered:
+            cache.set_many(rendered, FRAGMENT_TIMEOUT)
+        self._count(FRAGMENT_HITS_KEY, len(entries) - len(rendered))
+        self._count(FRAGMENT_MISSES_KEY, len(rendered))
+
+        html = ''.join(parts)
+        if CSRF_PLACEHOLDER in html:
+            html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+        return mark_safe(html)
+
+    def get_user_overlay(self, request):
+        """
+        Get the per-visitor state drawn over the shared cards
+
+        Args:
+            request (HttpRequest): Current request
+
+        Returns:
+            dict: Favorite food ids and cart quantities by item id
+        """
+        overlay = {'favorites': [], 'cart': {'foods': {}, 'specials': {}}}
+        if request.user.is_authenticated:
+            overlay['favorites'] = list(
+                Favorite.objects.filter(user=request.user).values_list('food_id', flat=True)
+            )
+        owner = get_cart_owner(request)
+        if owner is None:
+            return overlay
+
+        for (kind, item_id), quantity in get_cart_store().get_lines(owner).items():
+            overlay['cart'][f'{kind}s'][item_id] = quantity
+        return overlay
+
+    def get_stats(self):
+        """
+        Get the card cache hit rate
+
+        Returns:
+            dict: Hits, misses and hit rate (0-1)
+        """
+        hits = cache.get(FRAGMENT_HITS_KEY, 0)
+        misses = cache.get(FRAGMENT_MISSES_KEY, 0)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0,
+        }
+
+    def _key(self, template_name, entry):
+        return f"menu_card:{template_name}:{entry['id']}:{entry['version']}"
+
+    def _count(self, key, amount):
+        if not amount:
+            return
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            pass
+
+# Global instance
+menu_fragment_cache = MenuFragmentCache()
+
+# Helper functions for easy use
+def render_menu_cards(request, entries, template_name, context_name='food'):
+    """
+    Helper function to render menu cards from the fragment cache
+
+    Args:
+        request (HttpRequest): Current request
+        entries (list): Snapshot entries
+        template_name (str): Card template
+        context_name (str): Name the card template uses for its entry
+    """
+    return menu_fragment_cache.render_cards(request, entries, template_name, context_name)
+
+def get_menu_user_overlay(request):
+    """
+    Helper function to get a visitor's favorites and cart quantities
+    """
+    return menu_fragment_cache.get_user_overlay(request)
@@ -0,0 +1,60 @@
+"""
+Menu Pagination
+Keyset pagination of the menu snapshot's foods in (category, id) order. A chunk is
+located by bisecting on the last key the visitor has seen, so the hundredth chunk
+costs the same as the first.
+"""
+import bisect
+
+MENU_CHUNK_SIZE = 24
+
+
+def food_sort_key(food):
+    """Position of a food entry in menu order"""
+    return (food['category']['id'], food['id'])
+
+def encode_cursor(food):
+    """
+    Build the cursor pointing just past a food entry
+
+    Args:
+        food (dict): Last food entry of a chunk
+
+    Returns:
+        str: Cursor such as '3-120'
+    """
+    category_id, food_id = food_sort_key(food)
+    return f'{category_id}-{food_id}'
+
+def decode_cursor(value):
+    """
+    Parse a cursor produced by encode_cursor
+
+    Args:
+        value (str): Cursor such as '3-120'
+
+    Returns:
+        tuple: (category_id, food_id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    category_id, food_id = value.split('-')
+    return int(category_id), int(food_id)
+
+def paginate_foods(foods, after=None, limit=MENU_CHUNK_SIZE):
+    """
+    Get the chunk of foods following a cursor
+
+    Args:
+        foods (list): Food entries in menu order
+        after (tuple): Decoded cursor, or None for the first chunk
+        limit (int): Chunk size
+
+    Returns:
+        tuple: (food entries, cursor for the next chunk or None at the end)
+    """
+    start = bisect.bisect_right(foods, after, key=food_sort_key) if after else 0
+    chunk = foods[start:start + limit]
+    next_cursor = encode_cursor(chunk[-1]) if start + limit < len(foods) else None
+    return chunk, next_cursor
@@ -0,0 +1,271 @@
+"""
+Menu Snapshot Utilities
+Builds a denormalized, version-stamped copy of the catalog and keeps it in the cache
+so the menu pages can render without re-querying Foods, Special and Category.
+Today's specials are added per business day by the specials service.
+"""
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import Category, Foods, CatalogChange
+from .image_pipeline import build_srcset
+from .menu_facets import build_facet_index
+from .specials_service import specials_service
+
+SNAPSHOT_VERSION_KEY = 'menu_snapshot:version'
+SNAPSHOT_HITS_KEY = 'menu_snapshot:hits'
+SNAPSHOT_MISSES_KEY = 'menu_snapshot:misses'
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+class MenuSnapshotManager:
+    """Manages building, caching and invalidating the menu snapshot"""
+
+    def get_version(self):
+        """
+        Get the current catalog version
+
+        Returns:
+            int: Id of the latest CatalogChange (0 for an untouched catalog)
+        """
+        version = cache.get(SNAPSHOT_VERSION_KEY)
+        if version is None:
+            version = CatalogChange.objects.aggregate(latest=Max('id'))['latest'] or 0
+            cache.add(SNAPSHOT_VERSION_KEY, version, None)
+        return version
+
+    def record_change(self, kind, item_id, action='saved'):
+        """
+        Log a catalog change and move to the new version once it commits
+
+        Args:
+            kind (str): 'food', 'special' or 'category'
+            item_id (int): Id of the changed row
+            action (str): 'saved' or 'deleted'
+
+        Returns:
+            int: The new catalog version
+        """
+        change = CatalogChange.objects.create(kind=kind, item_id=item_id, action=action)
+        # Publishing before commit would let another request cache uncommitted data under the new version
+        transaction.on_commit(lambda: self._publish_version(change.id))
+        return change.id
+
+    def get_changes_since(self, version):
+        """
+        Get the rows touched since a catalog version
+
+        Args:
+            version (int): Catalog version the client already has
+
+        Returns:
+            dict: Sets of changed ids keyed by kind
+        """
+        changes = {'food': set(), 'special': set(), 'category': set()}
+        for kind, item_id in CatalogChange.objects.filter(id__gt=version).values_list('kind', 'item_id'):
+            changes[kind].add(item_id)
+        return changes
+
+    def get_snapshot(self, day=None):
+        """
+        Get the menu snapshot for a business day, building it on a cache miss
+
+        Args:
+            day (date): Business day for today's specials (defaults to today)
+
+        Returns:
+            dict: Snapshot with version, day, categories, foods, specials and facet index
+        """
+        day = day or specials_service.business_day()
+        version = self.get_version()
+        key = self._snapshot_key(version)
+
+        catalog = cache.get(key)
+        if catalog is not None:
+            self._count(SNAPSHOT_HITS_KEY)
+        else:
+            self._count(SNAPSHOT_MISSES_KEY)
+            catalog = self.build_snapshot(version)
+            cache.set(key, catalog, SNAPSHOT_TIMEOUT)
+
+        # The catalog does not change at midnight; only the specials do
+        return {
+            **catalog,
+            'day': day.isoformat(),
+            'specials': specials_service.get_specials(version, day),
+        }
+
+    def build_snapshot(self, version):
+        """
+        Build the day-independent part of a snapshot straight from the database
+
+        Args:
+            version (int): Catalog version to stamp on the snapshot
+
+        Returns:
+            dict: Snapshot with version, categories, foods and facet index
+        """
+        # Read before the rows: a change landing in between then gets a newer id than the
+        # content stamped with it, so per-item caches keyed on these versions never go stale
+        item_versions = self.get_item_versions()
+        categories = [
+            {'id': category.id, 'name': category.name}
+            for category in Category.objects.order_by('id')
+        ]
+        foods = [
+            serialize_food(food)
+            # Menu order, which the keyset pagination in menu_pagination relies on
+            for food in Foods.objects.select_related('category').order_by('category_id', 'id')
+        ]
+        for food in foods:
+            food['version'] = max(
+                item_versions['food'].get(food['id'], 0),
+                item_versions['category'].get(food['category']['id'], 0),
+            )
+        return {
+            'version': version,
+            'built_at': timezone.now().isoformat(),
+            'categories': categories,
+            'foods': foods,
+            'facets': build_facet_index(foods),
+        }
+
+    def get_item_versions(self):
+        """
+        Get the latest change to every food, special and category
+
+        Returns:
+            dict: Latest CatalogChange id keyed by kind, then item id
+        """
+        versions = {'food': {}, 'special': {}, 'category': {}}
+        latest = CatalogChange.objects.values('kind', 'item_id').annotate(version=Max('id')).order_by()
+        for row in latest:
+            versions[row['kind']][row['item_id']] = row['version']
+        return versions
+
+    def get_stats(self):
+        """
+        Get the current version and cache hit rate
+
+        Returns:
+            dict: Version, hits, misses and hit rate (0-1)
+        """
+        hits = cache.get(SNAPSHOT_HITS_KEY, 0)
+        misses = cache.get(SNAPSHOT_MISSES_KEY, 0)
+        lookups = hits + misses
+        return {
+            'version': self.get_version(),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0,
+        }
+
+    def _publish_version(self, version):
+        current = cache.get(SNAPSHOT_VERSION_KEY)
+        if current is None or current < version:
+            cache.set(SNAPSHOT_VERSION_KEY, version, None)
+
+    def _snapshot_key(self, version):
+        return f'menu_snapshot:{version}'
+
+    def _count(self, key):
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+# Global instance
+menu_snapshot_manager = MenuSnapshotManager()
+
+def serialize_food(food):
+    """
+    Flatten a Foods row into a snapshot entry
+
+    Args:
+        food (Foods): Food item with its category selected
+
+    Returns:
+        dict: Denormalized food entry
+    """
+    return {
+        'id': food.id,
+        'title': food.title,
+        'description': food.description or '',
+        'price': food.price,
+        'effective_price': food.price,
+        'image_url': food.image.url if food.image else '',
+        'image_srcset': build_srcset(food.image.name) if food.image else {},
+        'category': {'id': food.category_id, 'name': food.category.name},
+        'is_spicy': food.is_spicy,
+        'is_vegetarian': food.is_vegetarian,
+        'rating': food.rating,
+    }
+
+def serialize_special(special):
+    """
+    Flatten a Special row into a snapshot entry
+
+    Args:
+        special (Special): Special with its category selected
+
+    Returns:
+        dict: Denormalized special entry
+    """
+    return {
+        'id': special.id,
+        'name': special.name,
+        'description': special.description,
+        'price': special.price,
+        'discounted_price': special.discounted_price,
+        'effective_price': special.discounted_price or special.price,
+        'image_url': special.image.url if special.image else '',
+        'image_srcset': build_srcset(special.image.name) if special.image else {},
+        'category': {'id': special.category_id, 'name': special.category.name},
+        'is_vegetarian': special.is_vegetarian,
+        'date': special.date.isoformat(),
+    }
+
+def entry_to_json(entry):
+    """
+    Make a snapshot entry JSON friendly (prices and ratings as floats)
+
+    Args:
+        entry (dict): Food or special snapshot entry
+
+    Returns:
+        dict: Copy of the entry with Decimal values converted
+    """
+    return {
+        key: float(value) if isinstance(value, Decimal) else value
+        for key, value in entry.items()
+    }
+
+# Helper functions for easy use
+def get_menu_snapshot(day=None):
+    """
+    Helper function to get the cached menu snapshot
+
+    Args:
+        day (date): Optional business day (defaults to today)
+    """
+    return menu_snapshot_manager.get_snapshot(day)
+
+def invalidate_menu_snapshot(kind, item_id, action='saved'):
+    """
+    Helper function to invalidate the menu snapshot after a catalog change
+
+    Args:
+        kind (str): 'food', 'special' or 'category'
+        item_id (int): Id of the changed row
+        action (str): 'saved' or 'deleted'
+    """
+    return menu_snapshot_manager.record_change(kind, item_id, action)
+
+def get_menu_snapshot_stats():
+    """
+    Helper function to get the snapshot version and hit rate
+    """
+    return menu_snapshot_manager.get_stats()
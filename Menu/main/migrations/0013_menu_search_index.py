@@ -0,0 +1,61 @@
+from django.db import migrations
+
+
+SEARCH_TABLE = 'main_menu_search'
+SEARCH_VOCAB_TABLE = 'main_menu_search_vocab'
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 search table on SQLite builds that support it."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                f"kind UNINDEXED, item_id UNINDEXED, title, category, body, "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite compiled without FTS5: the in-process index is used instead
+            return
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_VOCAB_TABLE} "
+            f"USING fts5vocab({SEARCH_TABLE}, 'row')"
+        )
+
+        Foods = apps.get_model('main', 'Foods')
+        Special = apps.get_model('main', 'Special')
+        rows = [
+            ('food', food.id, food.title, food.category.name, food.description or '')
+            for food in Foods.objects.select_related('category')
+        ] + [
+            ('special', special.id, special.name, special.category.name, special.description or '')
+            for special in Special.objects.select_related('category')
+        ]
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (kind, item_id, title, category, body) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_VOCAB_TABLE}")
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_giftcardrequest_table_userprofile_waiterprofile_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_menu_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('food', 'Food'), ('special', 'Special'), ('category', 'Category')], max_length=20)),
+                ('item_id', models.PositiveBigIntegerField()),
+                ('action', models.CharField(choices=[('saved', 'Saved'), ('deleted', 'Deleted')], default='saved', max_length=20)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2 on 2026-10-18 17:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """Fold duplicate carts and cart lines together so the unique constraints can be added."""
+    Cart = apps.get_model('main', 'Cart')
+    CartItem = apps.get_model('main', 'CartItem')
+
+    for field in ('user_id', 'session_key'):
+        owners = (
+            Cart.objects.exclude(**{field: None}).values(field)
+            .annotate(carts=models.Count('id')).filter(carts__gt=1).values_list(field, flat=True)
+        )
+        for owner in list(owners):
+            keep, *duplicates = Cart.objects.filter(**{field: owner}).order_by('id')
+            CartItem.objects.filter(cart__in=duplicates).update(cart=keep)
+            Cart.objects.filter(id__in=[cart.id for cart in duplicates]).delete()
+
+    for kind, other in (('food', 'special'), ('special', 'food')):
+        lines = (
+            CartItem.objects.filter(**{f'{kind}__isnull': False, f'{other}__isnull': True})
+            .values('cart_id', f'{kind}_id').annotate(rows=models.Count('id')).filter(rows__gt=1)
+        )
+        for line in list(lines):
+            keep, *duplicates = CartItem.objects.filter(
+                cart_id=line['cart_id'], **{f'{kind}_id': line[f'{kind}_id'], f'{other}__isnull': True}
+            ).order_by('id')
+            keep.quantity += sum(item.quantity for item in duplicates)
+            keep.save(update_fields=['quantity'])
+            CartItem.objects.filter(id__in=[item.id for item in duplicates]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_catalogchange'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user',), name='unique_cart_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('session_key__isnull', False)), fields=('session_key',), name='unique_cart_per_session'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('special__isnull', True)), fields=('cart', 'food'), name='unique_cart_food'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('food__isnull', True)), fields=('cart', 'special'), name='unique_cart_special'),
+        ),
+    ]
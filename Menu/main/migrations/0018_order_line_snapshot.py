@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+def snapshot_lines(items):
+    # Frozen copy of main.models.order_line_snapshot
+    lines = []
+    for item in items:
+        if item.food_id:
+            name, kind = item.food.title, 'food'
+        elif item.special_id:
+            name, kind = item.special.name, 'special'
+        else:
+            name, kind = 'Item no longer on the menu', 'food'
+        price = item.price or 0
+        lines.append({
+            'name': name,
+            'kind': kind,
+            'quantity': item.quantity,
+            'price': str(price),
+            'total': str(price * item.quantity),
+        })
+    return lines
+
+
+def snapshot_existing_orders(apps, schema_editor):
+    """Write line_items/item_count for orders placed before they existed."""
+    Order = apps.get_model('main', 'Order')
+
+    orders = Order.objects.prefetch_related('items__food', 'items__special').order_by('id')
+    for order in orders.iterator(chunk_size=500):
+        order.line_items = snapshot_lines(order.items.all())
+        order.item_count = sum(line['quantity'] for line in order.line_items)
+        order.save(update_fields=['line_items', 'item_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_task_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='line_items',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(snapshot_existing_orders, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinLengthValidator, RegexValidator
@@ -56,6 +58,30 @@ class Foods(models.Model):
         return self.title
     
 
+class CatalogChange(models.Model):
+    """Append-only log of menu changes; the latest id is the catalog version"""
+    KIND_CHOICES = [
+        ('food', 'Food'),
+        ('special', 'Special'),
+        ('category', 'Category'),
+    ]
+
+    ACTION_CHOICES = [
+        ('saved', 'Saved'),
+        ('deleted', 'Deleted'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    item_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES, default='saved')
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"v{self.id}: {self.kind} #{self.item_id} {self.action}"
+
 class Order(models.Model):
     ORDER_TYPE_CHOICES = [
         ('delivery', 'Delivery'),
@@ -74,6 +100,7 @@ class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)  # for registered users
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # version for tracking ETags (see order_tracking)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     notes = models.TextField(blank=True, null=True)
@@ -85,9 +112,24 @@ class Order(models.Model):
     customer_name = models.CharField(max_length=100, blank=True, null=True)  # For guest orders
     customer_phone = models.CharField(max_length=15, blank=True, null=True)  # For contact
 
+    # Render-ready copy of the items, written at checkout (see order_line_snapshot), so
+    # order pages need no item queries and names survive a menu item being deleted
+    line_items = models.JSONField(default=list, blank=True, editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        # Order history pages walk a user's orders by (created_at, id), see order_history
+        indexes = [models.Index(fields=['user', 'created_at', 'id'], name='order_user_history_idx')]
+
     def __str__(self):
         return f"Order #{self.id} by {self.customer or self.user or 'Guest'}"
 
+    def refresh_line_snapshot(self):
+        """Rebuild line_items and item_count from the order's items, e.g. after editing them in the admin"""
+        self.line_items = order_line_snapshot(self.items.select_related('food', 'special'))
+        self.item_count = sum(line['quantity'] for line in self.line_items)
+        self.save(update_fields=['line_items', 'item_count', 'updated_at'])
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     food = models.ForeignKey(Foods, on_delete=models.SET_NULL, null=True, blank=True)
@@ -121,6 +163,26 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.food or self.special} (Order #{self.order.id})"
 
+def order_line_snapshot(order_items):
+    """Compact copy of order items for Order.line_items: name, kind, quantity, unit price and line total"""
+    lines = []
+    for item in order_items:
+        if item.food_id:
+            name, kind = item.food.title, 'food'
+        elif item.special_id:
+            name, kind = item.special.name, 'special'
+        else:
+            name, kind = 'Item no longer on the menu', 'food'
+        price = item.price or 0
+        lines.append({
+            'name': name,
+            'kind': kind,
+            'quantity': item.quantity,
+            'price': str(price),
+            'total': str(price * item.quantity),
+        })
+    return lines
+
 class Favorite(models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='favorites')
     food = models.ForeignKey('Foods', on_delete=models.CASCADE, related_name='favorited_by')
@@ -134,31 +196,63 @@ class Favorite(models.Model):
     def __str__(self):
         return f"{self.user} likes {self.food}"
 
+def cart_item_price(prefix=''):
+    """Effective unit price of a cart line as a SQL expression, matching CartItem.item_price"""
+    return Coalesce(
+        NullIf(F(f'{prefix}food__price'), Value(0)),
+        NullIf(F(f'{prefix}special__discounted_price'), Value(0)),
+        NullIf(F(f'{prefix}special__price'), Value(0)),
+        Value(0),
+        output_field=models.DecimalField(max_digits=8, decimal_places=2),
+    )
+
+def cart_total_aggregates(prefix=''):
+    """Aggregates giving a cart's item count and subtotal in one query"""
+    money = models.DecimalField(max_digits=12, decimal_places=2)
+    return {
+        'item_count': Coalesce(Sum(f'{prefix}quantity'), Value(0)),
+        'subtotal': Coalesce(
+            Sum(cart_item_price(prefix) * F(f'{prefix}quantity'), output_field=money), Value(0), output_field=money
+        ),
+    }
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate each cart's item_count and subtotal"""
+        return self.annotate(**cart_total_aggregates('items__'))
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     session_key = models.CharField(max_length=40, null=True, blank=True)  # For anonymous users
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # the reaper scans by age
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # One cart per owner, so concurrent get_or_create calls fetch the same cart
+            models.UniqueConstraint(fields=['user'], condition=models.Q(user__isnull=False), name='unique_cart_per_user'),
+            models.UniqueConstraint(fields=['session_key'], condition=models.Q(session_key__isnull=False), name='unique_cart_per_session'),
+        ]
 
     def __str__(self):
         return f"Cart for {self.user or self.session_key}"
 
+    def get_totals(self):
+        """(item count, subtotal) from with_totals() annotations, or one aggregate query"""
+        if 'subtotal' in self.__dict__:
+            return self.item_count, self.subtotal
+        totals = self.items.aggregate(**cart_total_aggregates())
+        return totals['item_count'], totals['subtotal']
+
     @property
     def total_price(self):
-        total = 0
-        for item in self.items.all():
-            item_total = item.total_price
-            if item_total is not None:
-                total += item_total
-        return total
+        return self.get_totals()[1]
 
     @property
     def total_items(self):
-        total = 0
-        for item in self.items.all():
-            if item.quantity is not None:
-                total += item.quantity
-        return total
+        return self.get_totals()[0]
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
@@ -201,11 +295,24 @@ class CartItem(models.Model):
             return self.special.image
         return None
 
+    @property
+    def line_key(self):
+        # Identifies the line independently of the row, which the cache cart store may not have written yet
+        if self.food_id:
+            return f'food-{self.food_id}'
+        return f'special-{self.special_id}'
+
     def __str__(self):
         return f"{self.quantity} x {self.item_name}"
 
     class Meta:
-        unique_together = ['cart', 'food', 'special']  # Prevent duplicate items
+        # Prevent duplicate items. Partial indexes because NULLs never collide in a unique
+        # index, which made unique_together on (cart, food, special) let duplicates through;
+        # they are also the conflict targets of the cart store's upserts.
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'food'], condition=models.Q(special__isnull=True), name='unique_cart_food'),
+            models.UniqueConstraint(fields=['cart', 'special'], condition=models.Q(food__isnull=True), name='unique_cart_special'),
+        ]
 
 class Contact(models.Model):
     """Model to store contact form submissions"""
@@ -358,277 +465,31 @@ class UserProfile(models.Model):
     employee_id = models.CharField(max_length=20, blank=True, null=True)
     
     def __str__(self):
-=======
-                elif self.special.price:
-                    self.price = self.special.price
-                else:
-                    self.price = 0
-            else:
-                self.price = 0
-        super().save(*args, **kwargs)
-
-    @property
-    def total_price(self):
-        """Calculate total price for this item (price * quantity)"""
-        if self.price is None:
-            return 0
-        return self.price * self.quantity
-
-    def __str__(self):
-        return f"{self.quantity} x {self.food or self.special} (Order #{self.order.id})"
-
-class Favorite(models.Model):
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='favorites')
-    food = models.ForeignKey('Foods', on_delete=models.CASCADE, related_name='favorited_by')
-    created_at = models.DateTimeField(auto_now_add=True)
-
-    class Meta:
-        unique_together = ('user', 'food')
-        verbose_name = 'Favorite'
-        verbose_name_plural = 'Favorites'
-
-    def __str__(self):
-        return f"{self.user} likes {self.food}"
-
-class Cart(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    session_key = models.CharField(max_length=40, null=True, blank=True)  # For anonymous users
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-
-    def __str__(self):
-        return f"Cart for {self.user or self.session_key}"
-
-    @property
-    def total_price(self):
-        """Calculate total price of all items in cart with null safety"""
-        total = 0
-        try:
-            items = self.items.select_related('food', 'special').all()
-            for item in items:
-                if item and hasattr(item, 'total_price'):
-                    try:
-                        item_total = item.total_price
-                        if item_total is not None:
-                            total += float(item_total)
-                    except (AttributeError, TypeError, ValueError):
-                        continue
-        except Exception:
-            pass
-        return total
-
-    @property
-    def total_items(self):
-        """Calculate total number of items in cart with null safety"""
-        total = 0
-        try:
-            items = self.items.all()
-            for item in items:
-                if item and hasattr(item, 'quantity'):
-                    try:
-                        quantity = item.quantity
-                        if quantity is not None:
-                            total += int(quantity)
-                    except (AttributeError, TypeError, ValueError):
-                        continue
-        except Exception:
-            pass
-        return total
-
-class CartItem(models.Model):
-    cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
-    food = models.ForeignKey(Foods, on_delete=models.CASCADE, null=True, blank=True)
-    special = models.ForeignKey(Special, on_delete=models.CASCADE, null=True, blank=True)
-    quantity = models.PositiveIntegerField(default=1)
-    added_at = models.DateTimeField(auto_now_add=True)
-
-    @property
-    def item_price(self):
-        try:
-            if self.food and hasattr(self.food, 'price'):
-                return self.food.price or 0
-            elif self.special and hasattr(self.special, 'price'):
-                return self.special.discounted_price or self.special.price or 0
-            return 0
-        except (AttributeError, TypeError):
-            return 0
-
-    @property
-    def total_price(self):
-        try:
-            return (self.item_price or 0) * (self.quantity or 0)
-        except (AttributeError, TypeError):
-            return 0
-
-    @property
-    def item_name(self):
-        try:
-            if self.food and hasattr(self.food, 'title'):
-                return self.food.title or 'Unknown Item'
-            elif self.special and hasattr(self.special, 'name'):
-                return self.special.name or 'Unknown Special'
-            return 'Unknown Item'
-        except (AttributeError, TypeError):
-            return 'Unknown Item'
-        return "Unknown Item"
-
-    @property
-    def item_image(self):
-        if self.food:
-            return self.food.image
-        elif self.special:
-            return self.special.image
-        return None
-
-    def __str__(self):
-        return f"{self.quantity} x {self.item_name}"
-
-    class Meta:
-        unique_together = ['cart', 'food', 'special']  # Prevent duplicate items
-
-class Contact(models.Model):
-    """Model to store contact form submissions"""
-    name = models.CharField(max_length=100)
-    email = models.EmailField()
-    phone = models.CharField(max_length=20)
-    message = models.TextField()
-    submitted_at = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
-    
-    class Meta:
-        ordering = ['-submitted_at']
-        verbose_name = "Contact Message"
-        verbose_name_plural = "Contact Messages"
-    
-    def __str__(self):
-        return f"Contact from {self.name} - {self.email}"
-
-class Reservation(models.Model):
-    name = models.CharField(max_length=100)
-    email = models.EmailField()
-    phone = models.CharField(max_length=20)
-    date = models.DateField()
-    time = models.TimeField()
-    guests = models.PositiveIntegerField(default=1)
-    message = models.TextField(blank=True, null=True)
-    submitted_at = models.DateTimeField(auto_now_add=True)
-    is_confirmed = models.BooleanField(default=False)
-
-    class Meta:
-        ordering = ['-submitted_at']
-        verbose_name = "Reservation"
-        verbose_name_plural = "Reservations"
-
-    def __str__(self):
-        return f"Reservation for {self.name} on {self.date} at {self.time}"
-
-class CateringRequest(models.Model):
-    name = models.CharField(max_length=100)
-    email = models.EmailField()
-    phone = models.CharField(max_length=20)
-    event_date = models.DateField()
-    event_type = models.CharField(max_length=100)
-    guests = models.PositiveIntegerField(default=1)
-    message = models.TextField(blank=True, null=True)
-    submitted_at = models.DateTimeField(auto_now_add=True)
-    is_handled = models.BooleanField(default=False)
-
-    class Meta:
-        ordering = ['-submitted_at']
-        verbose_name = "Catering Request"
-        verbose_name_plural = "Catering Requests"
-
-    def __str__(self):
-        return f"Catering for {self.name} on {self.event_date} ({self.event_type})"
-
-class GiftCardRequest(models.Model):
-    name = models.CharField(max_length=100)
-    email = models.EmailField()
-    phone = models.CharField(max_length=20)
-    amount = models.DecimalField(max_digits=8, decimal_places=2)
-    recipient_name = models.CharField(max_length=100)
-    recipient_email = models.EmailField()
-    message = models.TextField(blank=True, null=True)
-    submitted_at = models.DateTimeField(auto_now_add=True)
-    is_processed = models.BooleanField(default=False)
-
-    class Meta:
-        ordering = ['-submitted_at']
-        verbose_name = "Gift Card Request"
-        verbose_name_plural = "Gift Card Requests"
-
-    def __str__(self):
-        return f"Gift Card for {self.recipient_name} ({self.amount})"
-
-class Table(models.Model):
-    """Model representing restaurant tables"""
-    TABLE_STATUS_CHOICES = [
-        ('available', 'Available'),
-        ('occupied', 'Occupied'),
-        ('reserved', 'Reserved'),
-        ('cleaning', 'Being Cleaned'),
-    ]
-    
-    number = models.CharField(max_length=10, unique=True)
-    capacity = models.PositiveIntegerField(default=4)
-    status = models.CharField(max_length=20, choices=TABLE_STATUS_CHOICES, default='available')
-    location = models.CharField(max_length=50, blank=True, null=True, help_text="Table location (e.g. 'Window', 'Patio')")
-    
-    class Meta:
-        ordering = ['number']
-        verbose_name = "Table"
-        verbose_name_plural = "Tables"
-    
-    def __str__(self):
-        return f"Table {self.number} ({self.get_status_display()})"
-
-class WaiterProfile(models.Model):
-    """Model representing waiter-specific information"""
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='waiter_profile')
-    employee_id = models.CharField(max_length=20, unique=True)
-    phone = models.CharField(max_length=20)
-    assigned_tables = models.ManyToManyField(Table, blank=True, related_name='assigned_waiters')
-    
-    class Meta:
-        verbose_name = "Waiter Profile"
-        verbose_name_plural = "Waiter Profiles"
-    
-    def __str__(self):
-        return f"Waiter: {self.user.get_full_name() or self.user.username}"
-
-class TableAssignment(models.Model):
-    """Model representing table assignments for orders"""
-    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='assignments')
-    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='table_assignment')
-    waiter = models.ForeignKey(WaiterProfile, on_delete=models.SET_NULL, null=True, related_name='table_assignments')
-    assigned_at = models.DateTimeField(auto_now_add=True)
-    
-    class Meta:
-        ordering = ['-assigned_at']
-        verbose_name = "Table Assignment"
-        verbose_name_plural = "Table Assignments"
-    
-    def __str__(self):
-        return f"Table {self.table.number} assigned to {self.waiter} for Order #{self.order.id}"
-        
-    def save(self, *args, **kwargs):
-        """Update table status when assigned"""
-        self.table.status = 'occupied'
-        self.table.save()
-        super().save(*args, **kwargs)
-
-class UserProfile(models.Model):
-    USER_TYPES = [
-        ('customer', 'Customer'),
-        ('waiter', 'Waiter'),
-        ('admin', 'Admin'),
-    ]
-    
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
-    user_type = models.CharField(max_length=20, choices=USER_TYPES, default='customer')
-    phone = models.CharField(max_length=20, blank=True, null=True)
-    employee_id = models.CharField(max_length=20, blank=True, null=True)
-    
-    def __str__(self):
->>>>>>> 95b9c2699302927ffeecbb06c6f802d4a237db87
-        return f"{self.user.username} - {self.get_user_type_display()}"
\ No newline at end of file
+        return f"{self.user.username} - {self.get_user_type_display()}"
+
+class Task(models.Model):
+    """Side effect (email, notification) waiting to be run by the task queue"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('dead', 'Dead'),
+    ]
+
+    name = models.CharField(max_length=200)  # dotted path of the function to call
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Next attempt for queued tasks; for running ones, when a crashed worker's claim expires
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [models.Index(fields=['status', 'run_at'])]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()}, attempt {self.attempts}/{self.max_attempts})"
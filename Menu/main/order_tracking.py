@@ -0,0 +1,155 @@
+"""
+Order Tracking
+A cached read model per order for the tracking page and API: status, progress,
+display text and line items, with an ETag built from the order's updated_at.
+Every save of an order rewrites its entry (see signals), so at steady state
+tracking reads, including 304s, cost no database queries. Clients poll every
+TRACKING_POLL_INTERVAL seconds with If-None-Match rather than holding a request
+open: the site is served by sync gunicorn workers, where a held request would tie
+up a worker for its whole wait.
+"""
+from django.core.cache import cache
+from .models import Order
+from .realtime_order_utils import get_order_customer_name, get_order_progress_percentage, get_order_status_display
+
+TRACKING_TIMEOUT = 60 * 60 * 24
+TRACKING_POLL_INTERVAL = 10    # seconds between a tracking page's polls
+
+# Default status messages
+ORDER_STATUS_MESSAGES = {
+    'pending': 'Your order has been received and is pending confirmation.',
+    'confirmed': 'Your order has been confirmed and will be prepared soon.',
+    'preparing': 'Your order is being prepared by our kitchen staff.',
+    'ready': 'Your order is ready for pickup/delivery!',
+    'completed': 'Your order has been completed. Thank you!',
+    'cancelled': 'Your order has been cancelled.',
+}
+
+
+def order_etag(order_id, updated_at):
+    """
+    Build an order's ETag
+
+    Args:
+        order_id (int): Order id
+        updated_at (datetime): Order.updated_at
+
+    Returns:
+        str: Quoted ETag such as '"42-1760808605123456"'
+    """
+    return f'"{order_id}-{int(updated_at.timestamp() * 1_000_000)}"'
+
+
+class OrderTrackingCache:
+    """Manages the cached tracking read model of each order"""
+
+    def build(self, order):
+        """
+        Build an order's tracking entry
+
+        Args:
+            order (Order): Order, with its customer selected if it has one
+
+        Returns:
+            dict: {'etag': str, 'order': payload served by the tracking API}
+        """
+        return {
+            'etag': order_etag(order.id, order.updated_at),
+            'order': {
+                'id': order.id,
+                'status': order.status,
+                'status_display': get_order_status_display(order.status),
+                'status_message': ORDER_STATUS_MESSAGES.get(order.status, f'Order status: {order.status}'),
+                'progress_percentage': get_order_progress_percentage(order.status),
+                'customer_name': get_order_customer_name(order),
+                'customer_phone': order.customer_phone,
+                'order_type': order.get_order_type_display(),
+                'delivery_address': order.delivery_address,
+                'table_number': order.table_number,
+                'total': float(order.total),
+                'created_at': order.created_at,
+                'updated_at': order.updated_at,
+                'notes': order.notes,
+                # Order items, from the snapshot written at checkout
+                'items': [
+                    {'name': line['name'], 'quantity': line['quantity'], 'price': float(line['total']), 'type': line['kind']}
+                    for line in order.line_items
+                ],
+            },
+        }
+
+    def get(self, order_id):
+        """
+        Get an order's tracking entry, reading through to the database on a cache miss
+
+        Args:
+            order_id (int): Order id
+
+        Returns:
+            dict: Tracking entry, or None if the order does not exist
+        """
+        entry = cache.get(self._key(order_id))
+        if entry is None:
+            order = Order.objects.select_related('customer').filter(id=order_id).first()
+            if order is None:
+                return None
+            entry = self.order_saved(order)
+        return entry
+
+    def order_saved(self, order):
+        """
+        Rewrite a saved order's tracking entry (see signals)
+
+        Args:
+            order (Order): Saved order
+
+        Returns:
+            dict: The new tracking entry
+        """
+        entry = self.build(order)
+        cache.set(self._key(order.id), entry, TRACKING_TIMEOUT)
+        return entry
+
+    def refresh(self, *order_ids):
+        """
+        Rebuild orders' tracking entries, e.g. after a bulk update() that sends no signals
+
+        Args:
+            *order_ids (int): Order ids
+        """
+        orders = Order.objects.select_related('customer').filter(id__in=order_ids)
+        cache.set_many({self._key(order.id): self.build(order) for order in orders}, TRACKING_TIMEOUT)
+
+    def invalidate(self, *order_ids):
+        """
+        Forget orders' tracking entries, e.g. for deleted orders
+
+        Args:
+            *order_ids (int): Order ids
+        """
+        cache.delete_many([self._key(order_id) for order_id in order_ids])
+
+    def _key(self, order_id):
+        return f'order_tracking:{order_id}'
+
+# Global instance
+order_tracking_cache = OrderTrackingCache()
+
+# Helper functions for easy use
+def get_order_tracking(order_id):
+    """
+    Helper function to get an order's tracking entry
+
+    Args:
+        order_id (int): Order id
+
+    Returns:
+        dict: {'etag': str, 'order': dict}, or None if the order does not exist
+    """
+    return order_tracking_cache.get(order_id)
+
+def refresh_order_tracking(*order_ids):
+    """
+    Helper function to rebuild orders' tracking entries after a bulk update
+    """
+    order_tracking_cache.refresh(*order_ids)
@@ -8,6 +8,7 @@ from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from django.utils import timezone
 from .models import Order
+from .task_queue import enqueue_task
 
 class OrderNotificationManager:
     """Manages real-time order notifications via WebSocket channels"""
@@ -53,7 +54,7 @@ class OrderNotificationManager:
                     'status': status,
                     'message': notification_message,
                     'timestamp': timestamp,
-                    'customer_name': order.customer_name or (order.customer.name if order.customer else 'Guest'),
+                    'customer_name': get_order_customer_name(order),
                     'total': str(order.total)
                 }
             )
@@ -67,7 +68,7 @@ class OrderNotificationManager:
                     'status': status,
                     'message': notification_message,
                     'timestamp': timestamp,
-                    'customer_name': order.customer_name or (order.customer.name if order.customer else 'Guest'),
+                    'customer_name': get_order_customer_name(order),
                     'total': str(order.total)
                 }
             )
@@ -78,7 +79,7 @@ class OrderNotificationManager:
                 {
                     'type': 'new_order',
                     'order_id': str(order_id),
-                    'customer_name': order.customer_name or (order.customer.name if order.customer else 'Guest'),
+                    'customer_name': get_order_customer_name(order),
                     'total': str(order.total),
                     'message': f'Order #{order_id} status changed to {status}'
                 }
@@ -124,7 +125,7 @@ class OrderNotificationManager:
                 {
                     'type': 'new_order',
                     'order_id': str(order_id),
-                    'customer_name': order.customer_name or (order.customer.name if order.customer else 'Guest'),
+                    'customer_name': get_order_customer_name(order),
                     'total': str(order.total),
                     'message': f'New order #{order_id} received from {order.customer_name or "Guest"}'
                 }
@@ -147,21 +148,65 @@ def notify_order_status_change(order_id, new_status, message=None):
     """
     Helper function to notify order status change
     
+    Queued on the task queue, so the broadcast happens after the caller's
+    transaction commits and outside the request.
+    
     Args:
         order_id (int): Order ID
         new_status (str): New order status
         message (str): Optional custom message
     """
-    return order_notification_manager.broadcast_order_update(order_id, new_status, message)
+    enqueue_task(broadcast_order_status_change, order_id, new_status, message)
 
 def notify_new_order(order_id):
     """
-    Helper function to notify about new order
+    Helper function to notify about new order (queued, see notify_order_status_change)
     
     Args:
         order_id (int): Order ID
     """
-    return order_notification_manager.broadcast_new_order(order_id)
+    enqueue_task(broadcast_new_order, order_id)
+
+def broadcast_order_status_change(order_id, new_status, message=None):
+    """
+    Task that broadcasts an order status change
+    
+    Raises:
+        RuntimeError: If the channel layer failed, so the task queue retries it
+    """
+    if not order_notification_manager.broadcast_order_update(order_id, new_status, message):
+        _raise_if_retryable(order_id)
+
+def broadcast_new_order(order_id):
+    """
+    Task that broadcasts a new order to the staff dashboards
+    
+    Raises:
+        RuntimeError: If the channel layer failed, so the task queue retries it
+    """
+    if not order_notification_manager.broadcast_new_order(order_id):
+        _raise_if_retryable(order_id)
+
+def _raise_if_retryable(order_id):
+    # Without a channel layer or an order there is nothing a retry could fix
+    if order_notification_manager.channel_layer and Order.objects.filter(id=order_id).exists():
+        raise RuntimeError(f'Broadcast for order {order_id} failed')
+
+def get_order_customer_name(order):
+    """
+    Get the name to show for an order's customer
+    
+    Args:
+        order (Order): Order instance
+    
+    Returns:
+        str: Guest name, the linked customer's full name, or 'Guest'
+    """
+    if order.customer_name:
+        return order.customer_name
+    if order.customer:
+        return f"{order.customer.customer_firstname} {order.customer.customer_lastname}".strip()
+    return 'Guest'
 
 def get_order_status_display(status):
     """
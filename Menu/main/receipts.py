@@ -0,0 +1,206 @@
+"""
+Order Receipts
+Receipts are rendered once per order version and kept in storage as HTML, next to
+an optional PDF that a task queue worker builds from the same HTML. Any change to an
+order bumps its updated_at and so its receipt version; stale versions are pruned
+when a new one is written. Bulk exports render many receipts in parallel into a
+single zip archive.
+"""
+import importlib.util
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from uuid import uuid4
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.loader import render_to_string
+from .task_queue import enqueue_task
+
+RECEIPT_DIR = 'receipts'
+RECEIPT_LAYOUT_VERSION = 1     # bump when partials/receipt.html changes, so stored receipts are re-rendered
+RECEIPT_TEMPLATE = 'main/partials/receipt.html'
+RECEIPT_DOCUMENT_TEMPLATE = 'main/receipt_document.html'
+PDF_REQUEST_TIMEOUT = 5 * 60   # seconds before a PDF that never appeared may be requested again
+EXPORT_WORKERS = 4
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+TEMPORARY_SUFFIX = '.tmp'
+
+
+def receipt_version(order):
+    """
+    Version of an order's receipt
+
+    Args:
+        order (Order): Order
+
+    Returns:
+        str: e.g. '1-1760808605123456' (layout version, then updated_at in microseconds)
+    """
+    return f'{RECEIPT_LAYOUT_VERSION}-{int(order.updated_at.timestamp() * 1_000_000)}'
+
+def receipt_name(order, extension):
+    """
+    Storage name of an order's current receipt
+
+    Args:
+        order (Order): Order
+        extension (str): 'html' or 'pdf'
+
+    Returns:
+        str: e.g. 'receipts/42/1-1760808605123456.html'
+    """
+    return f'{RECEIPT_DIR}/{order.id}/{receipt_version(order)}.{extension}'
+
+def get_receipt_html(order):
+    """
+    Get an order's receipt body, rendering and storing it on first use
+
+    Args:
+        order (Order): Order, with its customer selected if it has one
+
+    Returns:
+        str: Receipt HTML (see partials/receipt.html)
+    """
+    name = receipt_name(order, 'html')
+    try:
+        with default_storage.open(name, 'rb') as stored:
+            return stored.read().decode('utf-8')
+    except FileNotFoundError:
+        pass
+    html = render_to_string(RECEIPT_TEMPLATE, {'order': order})
+    _write(name, html.encode('utf-8'))
+    _prune(order.id, receipt_version(order))
+    return html
+
+def render_receipt_document(order):
+    """
+    Render an order's receipt as a standalone HTML document
+
+    Args:
+        order (Order): Order
+
+    Returns:
+        str: Full HTML page, as used for PDFs and exports
+    """
+    return render_to_string(RECEIPT_DOCUMENT_TEMPLATE, {'order': order, 'receipt_html': get_receipt_html(order)})
+
+def receipt_pdf_supported():
+    """Check whether PDF receipts can be built (they need the optional xhtml2pdf package)"""
+    return importlib.util.find_spec('xhtml2pdf') is not None
+
+def get_receipt_pdf(order):
+    """
+    Get the storage name of an order's PDF receipt, queuing it to be built if it is missing
+
+    Args:
+        order (Order): Order
+
+    Returns:
+        str: Storage name of the PDF, or None while a worker builds it
+    """
+    name = receipt_name(order, 'pdf')
+    if default_storage.exists(name):
+        return name
+    # One build per version, however often the customer asks
+    if cache.add(f'receipt_pdf:{name}', True, PDF_REQUEST_TIMEOUT):
+        enqueue_task(build_receipt_pdf, order.id)
+    return None
+
+def build_receipt_pdf(order_id):
+    """
+    Task that builds an order's PDF receipt from its stored HTML
+
+    Args:
+        order_id (int): Order id
+    """
+    from xhtml2pdf import pisa
+    from .models import Order
+
+    order = Order.objects.select_related('customer').filter(id=order_id).first()
+    if order is None:
+        return
+    name = receipt_name(order, 'pdf')
+    if default_storage.exists(name):
+        return
+    buffer = BytesIO()
+    result = pisa.CreatePDF(render_receipt_document(order), dest=buffer, encoding='utf-8')
+    if result.err:
+        raise RuntimeError(f'Could not build the PDF receipt for order {order_id}')
+    _write(name, buffer.getvalue())
+
+def export_receipts(orders, workers=EXPORT_WORKERS):
+    """
+    Bundle many orders' receipts into one zip archive
+
+    Receipts are rendered (or read back from storage) in parallel threads; orders
+    should be fetched with their customers up front so no thread touches the
+    database. PDFs that already exist are added next to the HTML.
+
+    Args:
+        orders (iterable): Orders, with their customers selected
+        workers (int): Threads rendering receipts
+
+    Returns:
+        file: Zip archive, positioned at the start
+    """
+    orders = list(orders)
+
+    def export(order):
+        pdf_name = receipt_name(order, 'pdf')
+        pdf = None
+        if default_storage.exists(pdf_name):
+            with default_storage.open(pdf_name, 'rb') as stored:
+                pdf = stored.read()
+        return order, render_receipt_document(order), pdf
+
+    archive = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor, \
+            zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        # The zip is written from this thread only; results arrive in order
+        for order, document, pdf in executor.map(export, orders):
+            bundle.writestr(f'receipt-{order.id}.html', document)
+            if pdf is not None:
+                bundle.writestr(f'receipt-{order.id}.pdf', pdf)
+    archive.seek(0)
+    return archive
+
+def delete_receipts(order_id):
+    """
+    Delete every stored receipt of an order (see signals)
+
+    Args:
+        order_id (int): Order id
+    """
+    _prune(order_id, keep=None)
+
+def _write(name, content):
+    # A receipt never changes within a version, so a stored one is kept as is. Concurrent
+    # first renders (web requests, export threads, the PDF task) each write a temporary file
+    # and move it over the same name, so readers never see a partial receipt and storage
+    # never falls back to a suffixed alternate name.
+    if default_storage.exists(name):
+        return
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        # Storage without local files has no atomic move; objects are at least written whole
+        default_storage.save(name, ContentFile(content))
+        return
+    temporary = default_storage.save(f'{name}.{uuid4().hex}{TEMPORARY_SUFFIX}', ContentFile(content))
+    os.replace(default_storage.path(temporary), path)
+
+def _prune(order_id, keep):
+    directory = f'{RECEIPT_DIR}/{order_id}'
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        # Leave other writers' files in flight alone, unless every receipt is going
+        if keep is not None and filename.endswith(TEMPORARY_SUFFIX):
+            continue
+        if os.path.splitext(filename)[0] != keep:
+            default_storage.delete(f'{directory}/{filename}')
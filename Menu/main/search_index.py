@@ -0,0 +1,362 @@
+"""
+Menu Search Index
+Full-text search over Foods, Special and Category with prefix matching, typo
+tolerance and relevance ranking. Uses a SQLite FTS5 table when the database
+provides one and an in-process inverted index otherwise.
+"""
+import bisect
+import difflib
+import math
+import re
+import threading
+import unicodedata
+from django.db import connection, transaction
+from .models import Foods, Special, Category
+from .menu_snapshot import menu_snapshot_manager
+
+SEARCH_TABLE = 'main_menu_search'
+SEARCH_VOCAB_TABLE = 'main_menu_search_vocab'
+
+# Relative importance of each indexed field
+FIELD_WEIGHTS = {'title': 10.0, 'category': 3.0, 'body': 1.0}
+
+# Score multipliers for how a query term matched an indexed term
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.8
+FUZZY_MATCH = 0.6
+
+FUZZY_MIN_LENGTH = 4
+FUZZY_CUTOFF = 0.75
+MAX_EXPANSIONS = 8
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fold_diacritics(text):
+    """
+    Strip accents the way the FTS5 table's 'unicode61 remove_diacritics 2' tokenizer does
+
+    Args:
+        text (str): Text to fold
+
+    Returns:
+        str: Text without combining marks, e.g. 'creme brulee' for 'crème brûlée'
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    return unicodedata.normalize('NFC', ''.join(char for char in decomposed if not unicodedata.combining(char)))
+
+def tokenize(text):
+    """
+    Split text into lowercase, accent-folded search terms
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        list: Search terms
+    """
+    return TOKEN_RE.findall(fold_diacritics((text or '').lower()))
+
+def expand_term(term, vocabulary):
+    """
+    Expand a query term into the indexed terms it should match
+
+    Args:
+        term (str): Query term
+        vocabulary (list): Sorted list of indexed terms
+
+    Returns:
+        list: (indexed_term, multiplier) pairs, best match first
+    """
+    expansions = []
+    position = bisect.bisect_left(vocabulary, term)
+    while position < len(vocabulary) and vocabulary[position].startswith(term):
+        candidate = vocabulary[position]
+        expansions.append((candidate, EXACT_MATCH if candidate == term else PREFIX_MATCH))
+        position += 1
+        if len(expansions) >= MAX_EXPANSIONS:
+            break
+
+    if not expansions and len(term) >= FUZZY_MIN_LENGTH:
+        for candidate in difflib.get_close_matches(term, vocabulary, n=3, cutoff=FUZZY_CUTOFF):
+            expansions.append((candidate, FUZZY_MATCH))
+
+    expansions.sort(key=lambda pair: -pair[1])
+    return expansions
+
+def food_document(food):
+    """Build the indexed fields for a food item"""
+    return {
+        'kind': 'food',
+        'id': food.id,
+        'title': food.title,
+        'category': food.category.name if food.category_id else '',
+        'body': food.description or '',
+    }
+
+def special_document(special):
+    """Build the indexed fields for a special"""
+    return {
+        'kind': 'special',
+        'id': special.id,
+        'title': special.name,
+        'category': special.category.name if special.category_id else '',
+        'body': special.description or '',
+    }
+
+
+class SQLiteFTSBackend:
+    """Search backend storing documents in a SQLite FTS5 virtual table"""
+
+    name = 'fts5'
+
+    def __init__(self):
+        self._vocabulary = None
+        self._vocabulary_version = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls):
+        if connection.vendor != 'sqlite':
+            return False
+        return SEARCH_TABLE in connection.introspection.table_names()
+
+    @transaction.atomic
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        count = 0
+        for food in Foods.objects.select_related('category').iterator():
+            self._insert(food_document(food))
+            count += 1
+        for special in Special.objects.select_related('category').iterator():
+            self._insert(special_document(special))
+            count += 1
+        self._vocabulary = None
+        return count
+
+    def index_food(self, food, version=None):
+        self.remove('food', food.id)
+        self._insert(food_document(food))
+
+    def index_special(self, special, version=None):
+        self.remove('special', special.id)
+        self._insert(special_document(special))
+
+    def remove(self, kind, item_id, version=None):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE kind = %s AND item_id = %s',
+                [kind, item_id],
+            )
+        self._vocabulary = None
+
+    def search(self, query, limit=50):
+        vocabulary = self._get_vocabulary()
+        groups = []
+        for term in tokenize(query):
+            expansions = expand_term(term, vocabulary)
+            if expansions:
+                groups.append(' OR '.join(f'"{candidate}"' for candidate, _ in expansions))
+        if not groups:
+            return []
+
+        # Every term must match; fall back to any term so long queries still find something
+        results = self._match(' AND '.join(f'({group})' for group in groups), limit)
+        if not results and len(groups) > 1:
+            results = self._match(' OR '.join(f'({group})' for group in groups), limit)
+        return results
+
+    def _match(self, expression, limit):
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in ('title', 'category', 'body'))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT kind, item_id, bm25({SEARCH_TABLE}, 0, 0, {weights}) AS score '
+                f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY score LIMIT %s',
+                [expression, -1 if limit is None else limit],
+            )
+            # bm25() is negative, lower is better
+            return [
+                {'kind': kind, 'id': int(item_id), 'score': round(-score, 4)}
+                for kind, item_id, score in cursor.fetchall()
+            ]
+
+    def _insert(self, document):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (kind, item_id, title, category, body) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                [document['kind'], document['id'], document['title'], document['category'], document['body']],
+            )
+        self._vocabulary = None
+
+    def _get_vocabulary(self):
+        # Term list for prefix/typo expansion, reloaded whenever the catalog version moves
+        version = menu_snapshot_manager.get_version()
+        with self._lock:
+            if self._vocabulary is None or self._vocabulary_version != version:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'SELECT term FROM {SEARCH_VOCAB_TABLE} ORDER BY term')
+                    self._vocabulary = [row[0] for row in cursor.fetchall()]
+                self._vocabulary_version = version
+            return self._vocabulary
+
+
+class InvertedIndexBackend:
+    """
+    Search backend keeping a weighted inverted index in process memory
+
+    The index is stamped with the menu snapshot version it was built at, so a
+    catalog change made by another worker triggers a rebuild on the next search.
+    """
+
+    name = 'inverted-index'
+
+    def __init__(self):
+        self._postings = {}    # term -> {(kind, id): weighted term frequency}
+        self._documents = {}   # (kind, id) -> set of terms
+        self._vocabulary = []
+        self._built_version = None
+        self._lock = threading.RLock()
+
+    def rebuild(self):
+        with self._lock:
+            self._built_version = menu_snapshot_manager.get_version()
+            self._postings = {}
+            self._documents = {}
+            for food in Foods.objects.select_related('category').iterator():
+                self._add(food_document(food))
+            for special in Special.objects.select_related('category').iterator():
+                self._add(special_document(special))
+            self._vocabulary = sorted(self._postings)
+            return len(self._documents)
+
+    def index_food(self, food, version=None):
+        self._replace(food_document(food), version)
+
+    def index_special(self, special, version=None):
+        self._replace(special_document(special), version)
+
+    def remove(self, kind, item_id, version=None):
+        with self._lock:
+            if self._accepts_update(version):
+                self._discard((kind, item_id))
+                self._vocabulary = sorted(self._postings)
+
+    def search(self, query, limit=50):
+        with self._lock:
+            if self._built_version != menu_snapshot_manager.get_version():
+                self.rebuild()
+            term_scores = []
+            for term in tokenize(query):
+                scores = {}
+                for candidate, multiplier in expand_term(term, self._vocabulary):
+                    postings = self._postings.get(candidate, {})
+                    idf = math.log(1 + len(self._documents) / len(postings)) if postings else 0
+                    for key, weight in postings.items():
+                        scores[key] = max(scores.get(key, 0), weight * idf * multiplier)
+                if scores:
+                    term_scores.append(scores)
+            if not term_scores:
+                return []
+
+            # Every term must match; fall back to any term so long queries still find something
+            matched = set.intersection(*(set(scores) for scores in term_scores))
+            if not matched:
+                matched = set.union(*(set(scores) for scores in term_scores))
+            ranked = sorted(
+                ((sum(scores.get(key, 0) for scores in term_scores), key) for key in matched),
+                key=lambda pair: (-pair[0], pair[1]),
+            )
+            return [
+                {'kind': kind, 'id': item_id, 'score': round(score, 4)}
+                for score, (kind, item_id) in ranked[:limit]
+            ]
+
+    def _accepts_update(self, version):
+        # Only patch in place when no other change landed since the last build;
+        # otherwise leave the index stale and rebuild on the next search.
+        if self._built_version is None or version is None or self._built_version < version - 1:
+            return False
+        self._built_version = max(self._built_version, version)
+        return True
+
+    def _replace(self, document, version):
+        with self._lock:
+            if not self._accepts_update(version):
+                return
+            self._discard((document['kind'], document['id']))
+            self._add(document)
+            self._vocabulary = sorted(self._postings)
+
+    def _add(self, document):
+        key = (document['kind'], document['id'])
+        terms = set()
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(document[field]):
+                postings = self._postings.setdefault(term, {})
+                postings[key] = postings.get(key, 0) + weight
+                terms.add(term)
+        self._documents[key] = terms
+
+    def _discard(self, key):
+        for term in self._documents.pop(key, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[term]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_search_backend():
+    """
+    Get the search backend for the configured database
+
+    Returns:
+        SQLiteFTSBackend or InvertedIndexBackend
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = SQLiteFTSBackend() if SQLiteFTSBackend.is_available() else InvertedIndexBackend()
+        return _backend
+
+# Helper functions for easy use
+def search_menu(query, limit=50):
+    """
+    Helper function to search the menu
+
+    Args:
+        query (str): Search text
+        limit (int): Maximum number of results (None for all)
+
+    Returns:
+        list: Ranked results as {'kind', 'id', 'score'} dicts, best first
+    """
+    return get_search_backend().search(query, limit)
+
+def rebuild_search_index():
+    """
+    Helper function to rebuild the whole search index
+
+    Returns:
+        int: Number of indexed documents
+    """
+    return get_search_backend().rebuild()
+
+def index_category(category, version=None):
+    """
+    Helper function to re-index everything filed under a category after it changes
+
+    Args:
+        category (Category): Changed category
+        version (int): Catalog version recorded for the change
+    """
+    backend = get_search_backend()
+    for food in Foods.objects.select_related('category').filter(category=category):
+        backend.index_food(food, version)
+    for special in Special.objects.select_related('category').filter(category=category):
+        backend.index_special(special, version)
@@ -0,0 +1,102 @@
+"""
+Signal handlers that keep cached read models in sync with the database
+"""
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Foods, Special, Category, Favorite, UserProfile, WaiterProfile, Order
+from .menu_snapshot import invalidate_menu_snapshot
+from .search_index import get_search_backend, index_category
+from .image_pipeline import process_image
+from .context_processors import invalidate_user_badges
+from .cart_store import merge_session_cart
+from .order_history import invalidate_order_counts
+from .order_tracking import order_tracking_cache
+from .receipts import delete_receipts
+
+
+def process_uploaded_image(instance):
+    """Normalize a newly uploaded image and write its thumbnails before the snapshot is rebuilt"""
+    if not instance.image or not getattr(instance, '_image_changed', False):
+        return
+    try:
+        # A new file may reuse a deleted file's name, so existing derivatives prove nothing
+        process_image(instance.image.name, force=True)
+    except (OSError, ValueError) as e:
+        # A broken upload still gets served as-is; the backfill command can retry it
+        print(f"Image processing failed for {instance.image.name}: {e}")
+
+@receiver(pre_save, sender=Foods)
+@receiver(pre_save, sender=Special)
+def image_changing(sender, instance, **kwargs):
+    """Note whether a save brings a new image, so only new images are processed"""
+    image = instance.image
+    if not image:
+        instance._image_changed = False
+    elif instance._state.adding or not image._committed:
+        # New row, or a fresh upload that is about to be written to storage
+        instance._image_changed = True
+    else:
+        stored = sender.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+        instance._image_changed = stored != image.name
+
+@receiver(post_save, sender=Foods)
+def food_saved(sender, instance, **kwargs):
+    """Refresh the menu snapshot and search index for a saved food item"""
+    process_uploaded_image(instance)
+    version = invalidate_menu_snapshot('food', instance.id)
+    get_search_backend().index_food(instance, version)
+
+@receiver(post_delete, sender=Foods)
+def food_deleted(sender, instance, **kwargs):
+    version = invalidate_menu_snapshot('food', instance.id, 'deleted')
+    get_search_backend().remove('food', instance.id, version)
+
+@receiver(post_save, sender=Special)
+def special_saved(sender, instance, **kwargs):
+    """Refresh the menu snapshot and search index for a saved special"""
+    process_uploaded_image(instance)
+    version = invalidate_menu_snapshot('special', instance.id)
+    get_search_backend().index_special(instance, version)
+
+@receiver(post_delete, sender=Special)
+def special_deleted(sender, instance, **kwargs):
+    version = invalidate_menu_snapshot('special', instance.id, 'deleted')
+    get_search_backend().remove('special', instance.id, version)
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    """Category names are indexed on every food and special filed under them"""
+    version = invalidate_menu_snapshot('category', instance.id)
+    if not created:
+        index_category(instance, version)
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    # Foods and specials cascade and fire their own post_delete
+    invalidate_menu_snapshot('category', instance.id, 'deleted')
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=UserProfile)
+@receiver([post_save, post_delete], sender=WaiterProfile)
+def user_badges_changed(sender, instance, **kwargs):
+    """Favorites count and waiter flag are cached per user for the navbar badges"""
+    invalidate_user_badges(instance.user_id)
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    """Order history tabs show cached per-status counts; tracking reads a cached read model"""
+    invalidate_order_counts(instance.user_id)
+    order_tracking_cache.order_saved(instance)
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    invalidate_order_counts(instance.user_id)
+    order_tracking_cache.invalidate(instance.id)
+    delete_receipts(instance.id)
+
+@receiver(user_logged_in)
+def user_logged_in_merge_cart(sender, request, user, **kwargs):
+    """Fold the cart built before logging in into the user's cart, once"""
+    if request is not None and hasattr(request, 'session'):
+        merge_session_cart(request, user)
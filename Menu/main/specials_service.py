@@ -0,0 +1,148 @@
+"""
+Specials Service
+Works out the current business day and serves its active specials from the cache
+until the next rollover. Exactly one request rebuilds an expired day while the others
+wait for its result, and the next day's specials are built shortly before rollover
+so midnight does not send every worker to the database at once.
+"""
+import time
+from datetime import datetime, time as datetime_time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import Special
+
+LOCK_TIMEOUT = 30          # seconds a rebuild may hold the lock
+LOCK_WAIT = 2.0            # seconds other requests wait for the rebuild before building themselves
+LOCK_POLL_INTERVAL = 0.05
+PREWARM_WINDOW = 5 * 60    # seconds before rollover when tomorrow's specials get built
+PAST_DAY_TIMEOUT = 60 * 60
+
+
+class SpecialsService:
+    """Manages the per-day specials cache"""
+
+    @property
+    def rollover_hour(self):
+        # Late-night service can count towards the previous day, e.g. BUSINESS_DAY_ROLLOVER_HOUR = 4
+        return getattr(settings, 'BUSINESS_DAY_ROLLOVER_HOUR', 0)
+
+    def business_day(self, now=None):
+        """
+        Get the business day a moment belongs to
+
+        Args:
+            now (datetime): Moment to look at (defaults to now)
+
+        Returns:
+            date: Local business day
+        """
+        now = timezone.localtime(now)
+        return (now - timedelta(hours=self.rollover_hour)).date()
+
+    def next_rollover(self, day):
+        """
+        Get the moment a business day ends
+
+        Args:
+            day (date): Business day
+
+        Returns:
+            datetime: Aware datetime of the following rollover
+        """
+        boundary = datetime.combine(day + timedelta(days=1), datetime_time(hour=self.rollover_hour))
+        return timezone.make_aware(boundary)
+
+    def get_specials(self, version, day=None):
+        """
+        Get the active specials for a business day
+
+        Args:
+            version (int): Catalog version (special edits move it, so stale entries are never read)
+            day (date): Business day to show, e.g. a future day for a preview (defaults to today)
+
+        Returns:
+            list: Special snapshot entries
+        """
+        today = self.business_day()
+        day = day or today
+        key = self._key(version, day)
+
+        specials = cache.get(key)
+        if specials is None:
+            specials = self._rebuild(key, day)
+        if day == today:
+            self._prewarm_next_day(version, day)
+        return specials
+
+    def build(self, day):
+        """
+        Build a day's specials straight from the database
+
+        Args:
+            day (date): Business day
+
+        Returns:
+            list: Special snapshot entries
+        """
+        # Imported here because the menu snapshot composes its specials from this service
+        from .menu_snapshot import serialize_special
+        return [
+            serialize_special(special)
+            for special in Special.objects.select_related('category').filter(date=day, active=True).order_by('id')
+        ]
+
+    def _rebuild(self, key, day):
+        lock_key = f'{key}:lock'
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                specials = self.build(day)
+                cache.set(key, specials, self._timeout(day))
+                return specials
+            finally:
+                cache.delete(lock_key)
+
+        # Another request is rebuilding this day; wait for its result instead of piling on
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            specials = cache.get(key)
+            if specials is not None:
+                return specials
+        return self.build(day)
+
+    def _prewarm_next_day(self, version, day):
+        if (self.next_rollover(day) - timezone.now()).total_seconds() > PREWARM_WINDOW:
+            return
+        next_day = day + timedelta(days=1)
+        key = self._key(version, next_day)
+        # One request per window does the work; everyone else just checks a flag
+        if cache.add(f'{key}:prewarm', 1, PREWARM_WINDOW) and cache.get(key) is None:
+            cache.set(key, self.build(next_day), self._timeout(next_day))
+
+    def _timeout(self, day):
+        remaining = (self.next_rollover(day) - timezone.now()).total_seconds()
+        return int(remaining) + 1 if remaining > 0 else PAST_DAY_TIMEOUT
+
+    def _key(self, version, day):
+        return f'specials:{version}:{day.isoformat()}'
+
+# Global instance
+specials_service = SpecialsService()
+
+# Helper functions for easy use
+def get_business_day():
+    """
+    Helper function to get the current business day
+    """
+    return specials_service.business_day()
+
+def get_specials(version, day=None):
+    """
+    Helper function to get the cached specials for a business day
+
+    Args:
+        version (int): Catalog version
+        day (date): Optional business day (defaults to today)
+    """
+    return specials_service.get_specials(version, day)
@@ -7,6 +7,11 @@ Table of Contents:
 5. Today's Special Section
 6. Helper Functions
 7. Cart System
+8. Menu Sync
+9. Food Prefetch
+10. Lazy Menu Loading
+11. User Overlay
+12. Cart Sync
 */
 
 // Main DOM Ready Handler
@@ -20,25 +25,44 @@ document.addEventListener("DOMContentLoaded", function() {
     initQuickView();
     updateCartBadge();
     updateFavoritesBadge();
+    initMenuSync();
+    initFoodPrefetch();
+    initLazyMenu();
+    initUserOverlay();
+    initCartSync();
 });
 
 /* ---------------------------------------- Category Filtering ---------------------------------------- */
 function initCategoryFiltering() {
     const categoryBtns = document.querySelectorAll(".category-btn");
-    const menuItems = document.querySelectorAll(".menu-item-card");
 
     categoryBtns.forEach((btn) => {
         btn.addEventListener("click", function() {
+            const category = this.dataset.category;
+
+            // Only part of the menu is loaded, so let the server filter it
+            if (document.querySelector(".menu-load-more")) {
+                const params = new URLSearchParams(window.location.search);
+                params.delete("after");
+                if (category === "all") {
+                    params.delete("category");
+                } else {
+                    params.set("category", category);
+                }
+                window.location.href = `${window.location.pathname}?${params}#menu-section`;
+                return;
+            }
+
             // Update active state
             categoryBtns.forEach((b) => b.classList.remove("active"));
             this.classList.add("active");
 
             // Filter items
-            const category = this.dataset.category;
-            menuItems.forEach((item) => {
+            document.querySelectorAll(".menu-item-card").forEach((item) => {
                 const shouldShow = category === "all" || item.dataset.category === category;
                 item.style.display = shouldShow ? "block" : "none";
             });
+            prefetchVisibleFoods();
         });
     });
 }
@@ -48,7 +72,6 @@ function initSearchFunctionality() {
     const searchInput = document.getElementById("menu-search");
     const searchBtn = document.querySelector(".search-btn");
     const searchFeedback = document.getElementById("search-feedback");
-    const menuItems = document.querySelectorAll(".menu-item-card");
 
     if (!searchInput) return;
 
@@ -56,7 +79,7 @@ function initSearchFunctionality() {
         const term = searchTerm.toLowerCase().trim();
         let visibleItems = 0;
 
-        menuItems.forEach(item => {
+        document.querySelectorAll(".menu-item-card").forEach(item => {
             const title = item.querySelector("h3").textContent.toLowerCase();
             const description = item.querySelector(".item-description")?.textContent.toLowerCase() || "";
             const isMatch = title.includes(term) || description.includes(term);
@@ -111,31 +134,18 @@ function initAddToCart() {
 }
 
 function addToCartAjax(itemType, itemId, quantity, button = null) {
-    const csrfToken = getCookie('csrftoken');
-    
-    makeAjaxCall('/api/add-to-cart/', {
-        method: 'POST',
-        data: {
-            type: itemType,
-            id: itemId,
-            quantity: quantity
-        },
-        button: button,
-        loadingMessage: 'Adding item to cart...',
-        onSuccess: (data) => {
-            if (data.success) {
-                showNotification(data.message, 'success');
-                updateCartBadge(data.cart_count);
-                shakeCartIcon();
-            } else {
-                showNotification('Error adding to cart: ' + data.message, 'error');
-            }
-        },
-        onError: (error) => {
-            console.error('Error:', error);
-            showNotification('Error adding to cart', 'error');
-        }
-    });
+    quantity = parseInt(quantity) || 1;
+    queueCartOperation({op: 'add', type: itemType, id: itemId, quantity: quantity});
+
+    // Answer the tap straight away; the server's view of the cart arrives with the batch
+    const card = button && button.closest('[data-food-id], [data-special-id]');
+    const title = card && card.querySelector('h3');
+    const itemName = title ? title.textContent.trim() : 'item';
+    showNotification(`Added ${quantity} x ${itemName} to cart!`, 'success');
+    const badge = document.getElementById('cart-count');
+    if (badge) updateCartBadge((parseInt(badge.textContent) || 0) + quantity);
+    shakeCartIcon();
+    addToCartOverlay(itemType, itemId, quantity);
 }
 
 function updateCartBadge(count) {
@@ -245,8 +255,8 @@ if (backToTopBtn) {
 }
 
 /* ---------------------------------------- Quick View Functionality ---------------------------------------- */
-function initQuickView() {
-    document.querySelectorAll('.quick-view-btn').forEach(btn => {
+function initQuickView(root = document) {
+    root.querySelectorAll('.quick-view-btn').forEach(btn => {
         btn.addEventListener('click', (e) => {
             e.preventDefault();
             const itemId = btn.dataset.id;
@@ -318,6 +328,23 @@ function initQuickActions() {
 
 /* ---------------------------------------- Helper Functions ---------------------------------------- */
 function showQuickViewModal(itemId) {
+    // Use the synced catalog when we have it, saving a round trip
+    const catalog = loadMenuCatalog();
+    const food = catalog && catalog.foods[itemId];
+    if (food) {
+        populateQuickViewModal(catalogFoodToItem(food));
+        const modal = new bootstrap.Modal(document.getElementById('quickViewModal'));
+        modal.show();
+        return;
+    }
+
+    if (foodDetailCache[itemId]) {
+        populateQuickViewModal(foodDetailCache[itemId]);
+        const modal = new bootstrap.Modal(document.getElementById('quickViewModal'));
+        modal.show();
+        return;
+    }
+
     // Fetch item details from server
     fetch(`/api/foods/${itemId}/`)
         .then(response => response.json())
@@ -641,9 +668,19 @@ function setupCartItemHandlers() {
     updateCartBadge();
 }
 
+// Favorite food ids, kept so cards loaded later can show the right state
+let favoriteFoodIds = [];
+
 function initFavorites() {
-    const favoriteBtns = document.querySelectorAll('.favorite-btn');
-    const csrftoken = getCookie('csrftoken');
+    // The page already carries the visitor's favorites; no need to ask again
+    const overlay = loadUserOverlay();
+    if (overlay) {
+        favoriteFoodIds = overlay.favorites;
+        updateFavoritesBadge(favoriteFoodIds.length);
+        applyFavoriteState(document);
+        bindFavoriteButtons(document);
+        return;
+    }
 
     // Fetch user's favorites and update icons
     fetch('/api/favorites/', {
@@ -654,28 +691,38 @@ function initFavorites() {
         return response.json();
     })
     .then(data => {
-        const favoriteIds = data.map(fav => fav.food);
+        favoriteFoodIds = data.map(fav => fav.food);
         updateFavoritesBadge(data.length); // Update badge count
-        favoriteBtns.forEach(btn => {
-            const icon = btn.querySelector('i');
-            if (favoriteIds.includes(parseInt(btn.dataset.id))) {
-                icon.classList.remove('fa-regular');
-                icon.classList.add('fa-solid');
-                btn.classList.add('favorited');
-            } else {
-                icon.classList.remove('fa-solid');
-                icon.classList.add('fa-regular');
-                btn.classList.remove('favorited');
-            }
-        });
+        applyFavoriteState(document);
     })
     .catch(() => {
         // Not logged in or error, just leave as is
         updateFavoritesBadge(0);
     });
 
+    bindFavoriteButtons(document);
+}
+
+function applyFavoriteState(root) {
+    root.querySelectorAll('.favorite-btn').forEach(btn => {
+        const icon = btn.querySelector('i');
+        if (favoriteFoodIds.includes(parseInt(btn.dataset.id))) {
+            icon.classList.remove('fa-regular');
+            icon.classList.add('fa-solid');
+            btn.classList.add('favorited');
+        } else {
+            icon.classList.remove('fa-solid');
+            icon.classList.add('fa-regular');
+            btn.classList.remove('favorited');
+        }
+    });
+}
+
+function bindFavoriteButtons(root) {
+    const csrftoken = getCookie('csrftoken');
+
     // Click handler
-    favoriteBtns.forEach(btn => {
+    root.querySelectorAll('.favorite-btn').forEach(btn => {
         btn.addEventListener('click', function(e) {
             e.preventDefault();
             const itemId = btn.dataset.id;
@@ -1041,4 +1088,434 @@ function showLoadingNotification(message, duration = 2000) {
 // Export for use in other files
 window.loadingManager = loadingManager;
 window.makeAjaxCall = makeAjaxCall;
-window.showLoadingNotification = showLoadingNotification;
\ No newline at end of file
+window.showLoadingNotification = showLoadingNotification;
+
+/* ---------------------------------------- Menu Sync ---------------------------------------- */
+
+// The catalog is kept in localStorage and brought up to date with /api/menu/?since=<version>.
+// Unchanged polls cost a 304 with no body.
+const MENU_CATALOG_KEY = 'menuCatalog';
+const MENU_SYNC_INTERVAL = 60000;
+
+function initMenuSync() {
+    if (!document.querySelector('.menu-item-card, .special-item-card')) return;
+
+    syncMenuCatalog();
+    // Table tablets stay on the menu all day
+    if (window.HAS_TABLE) {
+        setInterval(syncMenuCatalog, MENU_SYNC_INTERVAL);
+    }
+}
+
+function loadMenuCatalog() {
+    try {
+        return JSON.parse(localStorage.getItem(MENU_CATALOG_KEY));
+    } catch (error) {
+        return null;
+    }
+}
+
+function saveMenuCatalog(catalog) {
+    try {
+        localStorage.setItem(MENU_CATALOG_KEY, JSON.stringify(catalog));
+    } catch (error) {
+        console.warn('Could not store menu catalog:', error);
+    }
+}
+
+function syncMenuCatalog(forceFull = false) {
+    const catalog = forceFull ? null : loadMenuCatalog();
+    const url = catalog ? `/api/menu/?since=${catalog.version}` : '/api/menu/';
+    const headers = { 'X-Requested-With': 'XMLHttpRequest' };
+    if (catalog && catalog.etag) {
+        headers['If-None-Match'] = catalog.etag;
+    }
+
+    return fetch(url, { headers: headers, cache: 'no-store' })
+        .then(response => {
+            if (response.status === 304) return null;
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            const etag = response.headers.get('ETag');
+            return response.json().then(data => ({ data: data, etag: etag }));
+        })
+        .then(result => {
+            if (!result) return;
+            const { data, etag } = result;
+
+            // Today's specials roll over at midnight; start again from a full copy
+            if (!data.full && catalog && catalog.day !== data.day) {
+                return syncMenuCatalog(true);
+            }
+
+            const updated = applyMenuDelta(data.full ? null : catalog, data);
+            updated.etag = etag;
+            saveMenuCatalog(updated);
+            if (!data.full) {
+                refreshMenuCards(data);
+            }
+        })
+        .catch(error => console.error('Error syncing menu:', error));
+}
+
+function applyMenuDelta(catalog, data) {
+    const updated = catalog || { foods: {}, specials: {} };
+    updated.version = data.version;
+    updated.day = data.day;
+    updated.categories = data.categories;
+
+    data.foods.forEach(food => { updated.foods[food.id] = food; });
+    data.specials.forEach(special => { updated.specials[special.id] = special; });
+    data.removed.foods.forEach(id => { delete updated.foods[id]; });
+    data.removed.specials.forEach(id => { delete updated.specials[id]; });
+    return updated;
+}
+
+function refreshMenuCards(data) {
+    data.foods.forEach(food => {
+        document.querySelectorAll(`[data-food-id="${food.id}"]`).forEach(card => {
+            const title = card.querySelector('h3');
+            const price = card.querySelector('.item-price');
+            if (title) title.textContent = food.title;
+            if (price) price.textContent = `Rs ${food.price.toFixed(2)}`;
+        });
+    });
+    data.removed.foods.forEach(id => {
+        document.querySelectorAll(`[data-food-id="${id}"]`).forEach(card => card.remove());
+    });
+    data.removed.specials.forEach(id => {
+        document.querySelectorAll(`[data-special-id="${id}"]`).forEach(card => card.remove());
+    });
+}
+
+function catalogFoodToItem(food) {
+    return {
+        id: food.id,
+        title: food.title,
+        price: food.price,
+        image: food.image_url || null,
+        category: food.category ? food.category.name : null,
+        description: food.description,
+        is_spicy: food.is_spicy,
+        is_vegetarian: food.is_vegetarian,
+        rating: food.rating,
+    };
+}
+
+/* ---------------------------------------- Food Prefetch ---------------------------------------- */
+
+// Quick-view details for the cards on screen, fetched in one /api/foods/?ids= request
+const FOOD_BATCH_LIMIT = 100;
+const foodDetailCache = {};
+
+function initFoodPrefetch() {
+    if (!document.querySelector('.menu-item-card[data-food-id]')) return;
+
+    const whenIdle = window.requestIdleCallback || (callback => setTimeout(callback, 200));
+    whenIdle(() => prefetchVisibleFoods());
+}
+
+function prefetchVisibleFoods() {
+    const catalog = loadMenuCatalog();
+    const ids = [];
+    document.querySelectorAll('.menu-item-card[data-food-id]').forEach(card => {
+        const id = card.dataset.foodId;
+        if (card.style.display === 'none' || ids.includes(id)) return;
+        // Skip anything the synced catalog or an earlier batch already covers
+        if (foodDetailCache[id] || (catalog && catalog.foods[id])) return;
+        ids.push(id);
+    });
+    if (!ids.length) return Promise.resolve();
+
+    return fetch(`/api/foods/?ids=${ids.slice(0, FOOD_BATCH_LIMIT).join(',')}`, {
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+    })
+        .then(response => {
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            return response.json();
+        })
+        .then(data => {
+            Object.assign(foodDetailCache, data.foods);
+        })
+        .catch(error => {
+            // Quick view falls back to fetching the single item
+            console.warn('Could not prefetch food details:', error);
+        });
+}
+
+/* ---------------------------------------- Lazy Menu Loading ---------------------------------------- */
+
+// The menu page renders the first chunk of cards; the rest is fetched from /menu/items/
+// as the visitor nears the end of the list. Without IntersectionObserver the
+// "Load more dishes" link still pages through the menu.
+function initLazyMenu() {
+    if (!('IntersectionObserver' in window)) return;
+
+    const container = document.getElementById('menu-items-container');
+    if (!container) return;
+
+    const observer = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                loadNextMenuChunk(entry.target, observer);
+            }
+        });
+    }, { rootMargin: '600px 0px' });
+
+    const loader = container.querySelector('.menu-load-more');
+    if (loader) observer.observe(loader);
+}
+
+function loadNextMenuChunk(loader, observer) {
+    loader.classList.add('loading');
+
+    fetch(loader.dataset.nextUrl, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then(response => {
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            return response.text();
+        })
+        .then(html => {
+            const chunk = document.createElement('div');
+            chunk.innerHTML = html;
+
+            // Wire up the new cards before they go into the page
+            initQuickView(chunk);
+            bindFavoriteButtons(chunk);
+            applyFavoriteState(chunk);
+            applyCartOverlay(chunk);
+
+            const nextLoader = chunk.querySelector('.menu-load-more');
+            loader.replaceWith(...chunk.children);
+            if (nextLoader) observer.observe(nextLoader);
+            prefetchVisibleFoods();
+        })
+        .catch(error => {
+            // Leave the link in place so the visitor can still page manually
+            console.error('Error loading more menu items:', error);
+            loader.classList.remove('loading');
+        });
+}
+
+/* ---------------------------------------- User Overlay ---------------------------------------- */
+
+// Menu cards are cached and shared by every visitor. The visitor's own favorites and
+// cart quantities arrive in the #menu-user-state JSON island and are drawn on top.
+let userOverlay;
+
+function loadUserOverlay() {
+    if (userOverlay === undefined) {
+        const island = document.getElementById('menu-user-state');
+        userOverlay = island ? JSON.parse(island.textContent) : null;
+    }
+    return userOverlay;
+}
+
+function initUserOverlay() {
+    if (loadUserOverlay()) applyCartOverlay(document);
+}
+
+function applyCartOverlay(root) {
+    const overlay = loadUserOverlay();
+    if (!overlay) return;
+
+    const mark = (card, quantity) => {
+        let badge = card.querySelector('.in-cart-badge');
+        if (!quantity) {
+            if (badge) badge.remove();
+            return;
+        }
+        if (!badge) {
+            badge = document.createElement('span');
+            badge.className = 'in-cart-badge';
+            (card.querySelector('.menu-item-img, .special-item-img') || card).appendChild(badge);
+        }
+        badge.textContent = `${quantity} in cart`;
+    };
+    root.querySelectorAll('[data-food-id]').forEach(card => mark(card, overlay.cart.foods[card.dataset.foodId]));
+    root.querySelectorAll('[data-special-id]').forEach(card => mark(card, overlay.cart.specials[card.dataset.specialId]));
+}
+
+function addToCartOverlay(itemType, itemId, quantity) {
+    const overlay = loadUserOverlay();
+    if (!overlay) return;
+
+    const items = itemType === 'special' ? overlay.cart.specials : overlay.cart.foods;
+    items[itemId] = (items[itemId] || 0) + parseInt(quantity);
+    applyCartOverlay(document);
+}
+
+/* ---------------------------------------- Cart Sync ---------------------------------------- */
+
+// The server cart is the only cart. Taps are collected for a moment and sent to
+// /api/cart/sync/ together with the version of the cart they were made on; the server
+// merges them and answers with the canonical cart, which is mirrored in localStorage
+// (key 'cart') for pages that only need to show it. Taps not yet confirmed are kept in
+// 'cartPending' so a reload or a dropped connection doesn't lose them, and a batch is
+// always resent under the same id so the server never applies it twice.
+const CART_BATCH_DELAY = 400;
+const CART_BUSY_RETRY_DELAY = 1000;
+const CART_MIRROR_KEY = 'cart';
+const CART_PENDING_KEY = 'cartPending';
+const CART_SENDING_KEY = 'cartSending';
+let cartQueue = [];
+let cartQueueTimer = null;
+let cartQueueInFlight = false;
+
+function initCartSync() {
+    cartQueue = JSON.parse(localStorage.getItem(CART_PENDING_KEY) || '[]');
+    // Table tablets stay on one page for a whole meal, so pick up changes made elsewhere
+    if (cartQueue.length || window.HAS_TABLE) flushCartQueue();
+
+    // Don't lose taps made just before leaving the page
+    window.addEventListener('pagehide', () => {
+        if (!cartQueue.length || cartQueueInFlight) return;
+        // Left pending: if the beacon got through, resending on the next visit is a no-op
+        const body = new Blob([JSON.stringify(cartSyncPayload(nextCartBatch()))], {type: 'text/plain'});
+        navigator.sendBeacon('/api/cart/sync/', body);
+    });
+}
+
+function loadCartMirror() {
+    try {
+        return JSON.parse(localStorage.getItem(CART_MIRROR_KEY) || 'null');
+    } catch (e) {
+        return null;
+    }
+}
+
+function saveCartPending(operations) {
+    cartQueue = operations;
+    localStorage.setItem(CART_PENDING_KEY, JSON.stringify(operations));
+}
+
+function nextCartBatch() {
+    // The batch already sent (and maybe applied) keeps its id and its operations
+    let batch = JSON.parse(localStorage.getItem(CART_SENDING_KEY) || 'null');
+    if (!batch || batch.count > cartQueue.length) {
+        batch = {id: Date.now().toString(36) + Math.random().toString(36).slice(2), count: cartQueue.length};
+        localStorage.setItem(CART_SENDING_KEY, JSON.stringify(batch));
+    }
+    return batch;
+}
+
+function cartSyncPayload(batch) {
+    const mirror = loadCartMirror();
+    return {
+        version: mirror && mirror.version ? mirror.version : null,
+        batch: batch.id,
+        changes: cartQueue.slice(0, batch.count)
+    };
+}
+
+function queueCartOperation(operation) {
+    saveCartPending(cartQueue.concat([operation]));
+    clearTimeout(cartQueueTimer);
+    cartQueueTimer = setTimeout(flushCartQueue, CART_BATCH_DELAY);
+}
+
+function flushCartQueue() {
+    // One sync in flight at a time, so changes reach the server in tap order
+    if (cartQueueInFlight) return;
+    const batch = nextCartBatch();
+    let answered = false;
+    cartQueueInFlight = true;
+
+    fetch('/api/cart/sync/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCookie('csrftoken')
+        },
+        body: JSON.stringify(cartSyncPayload(batch))
+    })
+        .then(response => {
+            if (response.status === 503) {
+                // Cart busy: nothing was applied, so send the same batch again shortly
+                clearTimeout(cartQueueTimer);
+                cartQueueTimer = setTimeout(flushCartQueue, CART_BUSY_RETRY_DELAY);
+                return null;
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data === null) return;
+            // Applied or rejected, this batch is done with; newer taps stay queued
+            answered = true;
+            localStorage.removeItem(CART_SENDING_KEY);
+            saveCartPending(cartQueue.slice(batch.count));
+            if (data.success) {
+                applyCartSnapshot(data.cart);
+            } else {
+                showNotification('Error updating cart: ' + data.message, 'error');
+            }
+        })
+        .catch(error => {
+            // Still pending; the next tap or page load sends them again
+            console.error('Error updating cart:', error);
+            showNotification('Error updating cart', 'error');
+        })
+        .finally(() => {
+            cartQueueInFlight = false;
+            if (answered && cartQueue.length) flushCartQueue();
+        });
+}
+
+function applyCartSnapshot(cart) {
+    localStorage.setItem(CART_MIRROR_KEY, JSON.stringify(cart));
+    // Taps still queued are already drawn; the next snapshot will include them
+    if (cartQueue.length) return;
+    updateCartBadge(cart.count);
+    document.dispatchEvent(new CustomEvent('cart:updated', {detail: cart}));
+
+    const overlay = loadUserOverlay();
+    if (!overlay) return;
+    overlay.cart = {foods: {}, specials: {}};
+    cart.lines.forEach(line => {
+        const items = line.type === 'special' ? overlay.cart.specials : overlay.cart.foods;
+        items[line.id] = line.quantity;
+    });
+    applyCartOverlay(document);
+}
+
+function setCartQuantity(itemType, itemId, quantity) {
+    queueCartOperation({op: 'set', type: itemType, id: itemId, quantity: quantity});
+}
+
+function removeCartItem(itemType, itemId) {
+    queueCartOperation({op: 'remove', type: itemType, id: itemId});
+}
+
+function checkoutCart(notes = '') {
+    // The server already holds the cart; naming its version is enough to order it
+    const mirror = loadCartMirror();
+    if (cartQueue.length || !mirror) {
+        return Promise.reject(new Error('Cart is still syncing, please try again'));
+    }
+    // Retrying the same cart reuses its key, so a lost response never places a second order
+    let attempt = JSON.parse(sessionStorage.getItem('checkoutAttempt') || 'null');
+    if (!attempt || attempt.version !== mirror.version) {
+        attempt = {version: mirror.version, key: Date.now().toString(36) + Math.random().toString(36).slice(2)};
+        sessionStorage.setItem('checkoutAttempt', JSON.stringify(attempt));
+    }
+    return fetch('/checkout/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCookie('csrftoken'),
+            'Idempotency-Key': attempt.key
+        },
+        body: JSON.stringify({cart_version: mirror.version, notes: notes})
+    })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) sessionStorage.removeItem('checkoutAttempt');
+            if (data.cart) applyCartSnapshot(data.cart);
+            else if (data.success) applyCartSnapshot({version: null, lines: [], count: 0, total: 0});
+            return data;
+        });
+}
+
+window.queueCartOperation = queueCartOperation;
+window.setCartQuantity = setCartQuantity;
+window.removeCartItem = removeCartItem;
+window.checkoutCart = checkoutCart;
@@ -0,0 +1,244 @@
+"""
+Task Queue
+Runs side effects (order emails, realtime notifications) outside the request that
+caused them. Tasks are rows in the Task table, written once the surrounding
+transaction commits, and picked up by `manage.py run_tasks` (or, in development, by
+a small in-process worker pool). A failing task is retried with exponential backoff and
+dead-lettered after its last attempt, where it waits in the admin to be requeued.
+"""
+import random
+import threading
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Task
+
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 10         # seconds before the first retry, doubling with every attempt
+MAX_RETRY_DELAY = 60 * 60
+TASK_TIMEOUT = 5 * 60      # seconds before a running task whose worker died is run again
+CLAIM_BATCH_SIZE = 10
+POLL_INTERVAL = 5.0        # seconds an idle worker sleeps when nothing wakes it sooner
+
+
+class TaskQueue:
+    """Manages enqueuing, claiming and running tasks"""
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._threads_lock = threading.Lock()
+
+    def enqueue(self, func, *args, max_attempts=MAX_ATTEMPTS, countdown=0, **kwargs):
+        """
+        Queue a call to run in the background once the current transaction commits
+
+        Arguments must be JSON serialisable, so pass ids rather than model instances.
+
+        Args:
+            func (callable or str): Module-level function, or its dotted path
+            *args: Positional arguments for the call
+            max_attempts (int): Attempts before the task is dead-lettered
+            countdown (int): Seconds to wait before the first attempt
+            **kwargs: Keyword arguments for the call
+        """
+        name = func if isinstance(func, str) else f'{func.__module__}.{func.__qualname__}'
+
+        def create():
+            Task.objects.create(
+                name=name,
+                args=list(args),
+                kwargs=kwargs,
+                max_attempts=max_attempts,
+                run_at=timezone.now() + timedelta(seconds=countdown),
+            )
+            self._wakeup.set()
+
+        # Nothing is queued for a transaction that rolls back, and a worker never
+        # runs a task before the rows it refers to are visible
+        transaction.on_commit(create)
+
+    def claim(self, limit=CLAIM_BATCH_SIZE):
+        """
+        Claim due tasks for this worker
+
+        A task is claimed with a conditional UPDATE, so workers in other threads or
+        processes never run the same task twice.
+
+        Args:
+            limit (int): Most tasks to claim
+
+        Returns:
+            list: Claimed Task instances
+        """
+        now = timezone.now()
+        due = Q(status='queued') | Q(status='running')
+        candidates = list(
+            Task.objects.filter(due, run_at__lte=now).order_by('run_at').values_list('id', 'status', 'run_at')[:limit]
+        )
+        claimed = []
+        for task_id, status, run_at in candidates:
+            locked = Task.objects.filter(id=task_id, status=status, run_at=run_at).update(
+                status='running',
+                run_at=now + timedelta(seconds=TASK_TIMEOUT),
+                attempts=F('attempts') + 1,
+                updated_at=now,
+            )
+            if locked:
+                claimed.append(task_id)
+        return list(Task.objects.filter(id__in=claimed).order_by('run_at'))
+
+    def run(self, task):
+        """
+        Run a claimed task, then delete it, schedule a retry or dead-letter it
+
+        Args:
+            task (Task): Claimed task
+
+        Returns:
+            bool: True if the task succeeded
+        """
+        try:
+            import_string(task.name)(*task.args, **task.kwargs)
+        except Exception:
+            self._fail(task, traceback.format_exc())
+            return False
+        Task.objects.filter(id=task.id).delete()
+        return True
+
+    def work(self, limit=CLAIM_BATCH_SIZE):
+        """
+        Claim and run one batch of due tasks
+
+        Args:
+            limit (int): Most tasks to run
+
+        Returns:
+            int: Number of tasks run
+        """
+        tasks = self.claim(limit)
+        for task in tasks:
+            self.run(task)
+        return len(tasks)
+
+    def stats(self):
+        """
+        Get the queue depth
+
+        Returns:
+            dict: Queued, due, running and dead counts, and the oldest due task's age in seconds
+        """
+        now = timezone.now()
+        counts = Task.objects.aggregate(
+            queued=Count('id', filter=Q(status='queued')),
+            due=Count('id', filter=Q(status='queued', run_at__lte=now)),
+            running=Count('id', filter=Q(status='running')),
+            dead=Count('id', filter=Q(status='dead')),
+            oldest_due=Min('run_at', filter=Q(status='queued', run_at__lte=now)),
+        )
+        oldest = counts.pop('oldest_due')
+        counts['oldest_due_seconds'] = round((now - oldest).total_seconds(), 1) if oldest else 0
+        return counts
+
+    def requeue(self, queryset):
+        """
+        Give dead-lettered tasks a fresh set of attempts
+
+        Args:
+            queryset (QuerySet): Tasks to requeue
+
+        Returns:
+            int: Number of tasks requeued
+        """
+        requeued = queryset.filter(status='dead').update(
+            status='queued', attempts=0, run_at=timezone.now(), updated_at=timezone.now()
+        )
+        if requeued:
+            self._wakeup.set()
+        return requeued
+
+    def start(self, workers):
+        """
+        Run `workers` daemon threads that work the queue (idempotent)
+
+        Args:
+            workers (int): Number of worker threads
+        """
+        with self._threads_lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for number in range(len(self._threads), workers):
+                thread = threading.Thread(target=self.serve, name=f'task-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def serve(self, stop=None):
+        """
+        Work the queue until `stop` is set, sleeping while it is empty
+
+        Args:
+            stop (threading.Event): Set to shut the worker down (runs forever if None)
+        """
+        while stop is None or not stop.is_set():
+            try:
+                ran = self.work()
+            except Exception as e:
+                print(f"Error working task queue: {e}")
+                ran = 0
+            finally:
+                close_old_connections()
+            if not ran:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+
+    def _fail(self, task, error):
+        if task.attempts >= task.max_attempts:
+            print(f"Task {task.name} dead-lettered after {task.attempts} attempts")
+            Task.objects.filter(id=task.id).update(status='dead', last_error=error, updated_at=timezone.now())
+            return
+        delay = min(RETRY_BACKOFF * 2 ** (task.attempts - 1), MAX_RETRY_DELAY)
+        delay *= random.uniform(0.8, 1.2)   # so a burst of failures doesn't retry in lockstep
+        Task.objects.filter(id=task.id).update(
+            status='queued',
+            run_at=timezone.now() + timedelta(seconds=delay),
+            last_error=error,
+            updated_at=timezone.now(),
+        )
+
+
+# Global instance
+task_queue = TaskQueue()
+
+# Helper functions for easy use
+def enqueue_task(func, *args, **kwargs):
+    """
+    Helper function to run a function in the background after the current transaction commits
+
+    Args:
+        func (callable or str): Module-level function, or its dotted path
+        *args: JSON serialisable positional arguments
+        **kwargs: JSON serialisable keyword arguments (max_attempts and countdown are options)
+    """
+    task_queue.enqueue(func, *args, **kwargs)
+
+def get_task_queue_stats():
+    """
+    Helper function to get the task queue depth
+    """
+    return task_queue.stats()
+
+def start_task_workers(**kwargs):
+    """
+    Helper function to start the in-process worker pool with settings.TASK_QUEUE_WORKERS threads
+
+    Connected to request_started (see apps), so migrations and other management
+    commands never start it.
+    """
+    request_started.disconnect(start_task_workers)
+    workers = getattr(settings, 'TASK_QUEUE_WORKERS', 0)
+    if workers > 0:
+        task_queue.start(workers)
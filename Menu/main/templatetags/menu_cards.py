@@ -0,0 +1,26 @@
+from django import template
+from django.utils.html import json_script
+
+from main.menu_fragments import get_menu_user_overlay, render_menu_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def menu_cards(context, entries, template_name, context_name='food'):
+    """
+    Render menu cards through the per-item fragment cache
+
+    Usage: {% menu_cards foods 'main/partials/menu_item_card.html' %}
+    """
+    return render_menu_cards(context['request'], entries, template_name, context_name)
+
+
+@register.simple_tag(takes_context=True)
+def menu_user_overlay(context):
+    """
+    Emit the visitor's favorites and cart quantities as a JSON island for menu.js
+
+    Usage: {% menu_user_overlay %}
+    """
+    return json_script(get_menu_user_overlay(context['request']), 'menu-user-state')
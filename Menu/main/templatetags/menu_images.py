@@ -0,0 +1,28 @@
+from django import template
+from django.utils.html import format_html
+
+from main.image_pipeline import DEFAULT_SIZES, DERIVATIVE_FORMATS
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(entry, alt='', sizes=DEFAULT_SIZES, style=''):
+    """
+    Render a snapshot entry's image as a <picture> with WebP and JPEG srcsets
+
+    Usage: {% responsive_image food alt=food.title %}
+    Falls back to a plain <img> of the original until the derivatives exist.
+    """
+    srcset = entry.get('image_srcset') or {}
+    if not srcset:
+        return format_html('<img src="{}" alt="{}" style="{}" loading="lazy">', entry.get('image_url', ''), alt, style)
+
+    sources = format_html(
+        ''.join('<source type="{}" srcset="{}" sizes="{}">' for _ in DERIVATIVE_FORMATS),
+        *[value for extension, spec in DERIVATIVE_FORMATS.items() for value in (spec['mime'], srcset[extension], sizes)]
+    )
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" style="{}" loading="lazy"></picture>',
+        sources, srcset['src'], alt, style,
+    )
@@ -1,3 +1,711 @@
-from django.test import TestCase
-
-# Create your tests here.
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+import tempfile
+import threading
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+import json
+
+from unittest import mock
+
+from django.template.loader import render_to_string
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from .cart_store import (
+    CART_DIRTY_INDEX_KEY, CachedCartStore, CartBusyError, CartOwner, DatabaseCartStore, apply_cart_operations,
+    fold_cart_operations, write_cart_lines,
+)
+from .cart_reaper import CartReaper
+from .checkout_service import place_order
+from .image_pipeline import MAX_ORIGINAL_DIMENSION, build_srcset, derivative_name
+from .menu_snapshot import get_menu_snapshot
+from .models import Cart, CartItem, CatalogChange, Category, Foods, Order, Special, Task
+from .order_history import decode_order_cursor, encode_order_cursor, get_order_counts, paginate_orders
+from .order_tracking import get_order_tracking
+from .receipts import RECEIPT_DIR, TEMPORARY_SUFFIX, get_receipt_html, receipt_version
+from .search_index import InvertedIndexBackend, SQLiteFTSBackend
+from .task_queue import TaskQueue
+
+# Create your tests here.
+
+TASK_CALLS = []
+
+def record_task(*args, **kwargs):
+    TASK_CALLS.append((args, kwargs))
+
+def failing_task():
+    raise RuntimeError('mail server down')
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    """Hundreds of concurrent adds must all land, whichever cart store is in use"""
+
+    WORKERS = 8
+    ADDS_PER_LINE = 200
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Momo')
+        self.food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+        self.special = Special.objects.create(
+            name='Chef Special', description='Special', price=Decimal('300'), image='specials/a.jpg', category=category
+        )
+        self.owner = CartOwner('user_id', User.objects.create_user('guest').id)
+
+    def hammer(self, store):
+        """Add one of each item ADDS_PER_LINE times from WORKERS threads at once"""
+        def add(kind, item_id):
+            try:
+                store.add(self.owner, kind, item_id, 1)
+            finally:
+                connection.close()
+
+        calls = [('food', self.food.id), ('special', self.special.id)] * self.ADDS_PER_LINE
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            list(pool.map(lambda call: add(*call), calls))
+
+    def assert_quantities(self):
+        self.assertEqual(Cart.objects.filter(user_id=self.owner.value).count(), 1)
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart__user_id=self.owner.value).values_list('food_id', 'quantity').filter(food__isnull=False)),
+            {self.food.id: self.ADDS_PER_LINE},
+        )
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart__user_id=self.owner.value).values_list('special_id', 'quantity').filter(special__isnull=False)),
+            {self.special.id: self.ADDS_PER_LINE},
+        )
+
+    def test_database_store_concurrent_adds(self):
+        self.hammer(DatabaseCartStore())
+        self.assert_quantities()
+
+    def test_cached_store_concurrent_adds(self):
+        store = CachedCartStore(flush_interval=0)
+        self.hammer(store)
+        self.assertEqual(
+            store.get_lines(self.owner),
+            {('food', self.food.id): self.ADDS_PER_LINE, ('special', self.special.id): self.ADDS_PER_LINE},
+        )
+        store.flush_all()
+        self.assert_quantities()
+
+
+class CartUpsertTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Momo')
+        self.food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+        self.special = Special.objects.create(
+            name='Chef Special', description='Special', price=Decimal('300'), image='specials/a.jpg', category=category
+        )
+        self.store = DatabaseCartStore()
+        self.owner = CartOwner('session_key', 'session')
+
+    def test_add_set_and_merge_keep_one_row_per_line(self):
+        self.store.add(self.owner, 'food', self.food.id, 2)
+        self.store.add(self.owner, 'food', self.food.id, 3)
+        self.store.set_quantity(self.owner, 'special', self.special.id, 4)
+        self.store.set_quantity(self.owner, 'special', self.special.id, 1)
+        self.assertEqual(self.store.get_lines(self.owner), {('food', self.food.id): 5, ('special', self.special.id): 1})
+
+        target = CartOwner('user_id', User.objects.create_user('guest').id)
+        self.store.add(target, 'food', self.food.id, 1)
+        self.store.merge(self.owner, target)
+        self.assertEqual(self.store.get_lines(target), {('food', self.food.id): 6, ('special', self.special.id): 1})
+        self.assertFalse(Cart.objects.filter(session_key='session').exists())
+        self.assertEqual(CartItem.objects.count(), 2)
+
+
+class CachedCartStoreTests(TestCase):
+    """Pending cart writes are tracked in the shared cache, so any process can flush them"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Momo')
+        self.food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+        self.owner = CartOwner('session_key', 'session')
+        # Two instances stand in for two processes sharing one cache
+        self.web = CachedCartStore(flush_interval=0)
+        self.other = CachedCartStore(flush_interval=0)
+
+    def rows(self):
+        return DatabaseCartStore().get_lines(self.owner)
+
+    def test_another_process_flushes_one_cart(self):
+        self.web.add(self.owner, 'food', self.food.id, 2)
+        self.assertEqual(self.rows(), {})
+        self.assertEqual(self.other.flush(self.owner), 1)
+        self.assertEqual(self.rows(), {('food', self.food.id): 2})
+        self.assertEqual(self.other.flush(self.owner), 0)
+
+    def test_a_restarted_process_flushes_everything(self):
+        self.web.add(self.owner, 'food', self.food.id, 2)
+        self.assertEqual(CachedCartStore(flush_interval=0).flush_all(), 1)
+        self.assertEqual(self.rows(), {('food', self.food.id): 2})
+        self.assertEqual(cache.get(CART_DIRTY_INDEX_KEY), set())
+
+    def test_busy_cart_waits_for_the_next_flush(self):
+        self.web.add(self.owner, 'food', self.food.id, 2)
+        with self.web._locked(self.web._lock_key(self.owner)):
+            self.assertEqual(self.other.flush_all(), 0)
+        self.assertEqual(cache.get(CART_DIRTY_INDEX_KEY), {self.owner})
+        self.assertEqual(self.other.flush_all(), 1)
+        self.assertEqual(self.rows(), {('food', self.food.id): 2})
+
+    def test_change_during_a_flush_stays_dirty(self):
+        self.web.add(self.owner, 'food', self.food.id, 2)
+
+        def write_outliving_the_lock(owner, lines):
+            write_cart_lines(owner, lines)
+            # A slow write whose cart lock expired lets this change in
+            cache.set(self.web._key(owner), {('food', self.food.id): 5})
+            self.web._mark_dirty(owner)
+
+        with mock.patch('main.cart_store.write_cart_lines', write_outliving_the_lock):
+            self.other.flush_all()
+        self.assertEqual(cache.get(CART_DIRTY_INDEX_KEY), {self.owner})
+        self.assertEqual(self.other.flush_all(), 1)
+        self.assertEqual(self.rows(), {('food', self.food.id): 5})
+
+    def test_reaper_flushes_before_judging_staleness(self):
+        DatabaseCartStore().add(self.owner, 'food', self.food.id, 1)
+        Cart.objects.update(updated_at=timezone.now() - timedelta(days=365))
+        self.web.add(self.owner, 'food', self.food.id, 1)
+        with mock.patch('main.cart_reaper.get_cart_store', return_value=self.other):
+            self.assertEqual(CartReaper(pause=0).reap()['carts'], 0)
+        self.assertEqual(self.rows(), {('food', self.food.id): 2})
+
+
+class CartBatchTests(TestCase):
+    """A batch folded to one change per line ends in the same cart as its operations applied in order"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Momo')
+        self.food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+        self.other = Foods.objects.create(title='Veg Momo', category=category, price=Decimal('150'), image='Foods/b.jpg')
+        self.third = Foods.objects.create(title='Buff Momo', category=category, price=Decimal('180'), image='Foods/c.jpg')
+        self.special = Special.objects.create(
+            name='Chef Special', description='Special', price=Decimal('300'), image='specials/a.jpg', category=category
+        )
+        self.operations = [
+            ('add', 'food', self.food.id, 2),
+            ('set', 'food', self.food.id, 5),
+            ('add', 'food', self.food.id, 1),        # after a set, adds stay absolute
+            ('add', 'food', self.other.id, 3),       # never set or removed: an increment
+            ('set', 'food', self.third.id, 4),
+            ('remove', 'food', self.third.id, 0),
+            ('remove', 'special', self.special.id, 0),
+            ('add', 'special', self.special.id, 2),  # re-added after a remove: from zero
+        ]
+        self.start = {
+            ('food', self.food.id): 1,
+            ('food', self.other.id): 1,
+            ('food', self.third.id): 2,
+            ('special', self.special.id): 7,
+        }
+
+    def test_fold(self):
+        increments, quantities, removals = fold_cart_operations(self.operations)
+        self.assertEqual(increments, {('food', self.other.id): 3})
+        self.assertEqual(quantities, {('food', self.food.id): 6, ('special', self.special.id): 2})
+        self.assertEqual(removals, [('food', self.third.id)])
+
+    def test_stores_match_applying_in_order(self):
+        for store in (DatabaseCartStore(), CachedCartStore(flush_interval=0)):
+            for start in ({}, self.start):
+                with self.subTest(store=type(store).__name__, start=bool(start)):
+                    owner = CartOwner('session_key', f'{type(store).__name__}-{len(start)}')
+                    store.replace(owner, start)
+                    expected = dict(start)
+                    apply_cart_operations(expected, self.operations)
+                    self.assertEqual(store.apply(owner, self.operations), expected)
+                    self.assertEqual(store.get_lines(owner), expected)
+
+    def test_batch_api(self):
+        operations = [
+            {'op': 'add', 'type': 'food', 'id': self.food.id, 'quantity': 2},
+            {'op': 'set', 'type': 'food', 'id': self.food.id, 'quantity': 5},
+            {'op': 'add', 'type': 'food', 'id': self.other.id},
+            {'op': 'remove', 'type': 'food', 'id': self.other.id},
+        ]
+        response = self.client.post('/api/cart/batch/', json.dumps({'operations': operations}), content_type='application/json')
+        cart = response.json()['cart']
+        self.assertEqual([(line['id'], line['quantity']) for line in cart['lines']], [(self.food.id, 5)])
+        self.assertEqual(cart['count'], 5)
+
+        # A malformed operation rejects the whole batch
+        operations.append({'op': 'add', 'type': 'food', 'id': self.other.id, 'quantity': 0})
+        response = self.client.post('/api/cart/batch/', json.dumps({'operations': operations}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/cart/sync/', '{}', content_type='application/json').json()['cart']['count'], 5)
+
+
+class IdempotentCheckoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Momo')
+        self.food = Foods.objects.create(title='Chicken Momo', category=self.category, price=Decimal('200'), image='Foods/a.jpg')
+
+    def checkout(self, cart, key='attempt-1'):
+        body = json.dumps({'cart': cart})
+        return self.client.post('/checkout/', body, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_order(self):
+        first = self.checkout([{'id': self.food.id, 'quantity': 2}])
+        retry = self.checkout([{'id': self.food.id, 'quantity': 2}])
+        self.assertTrue(first.json()['success'])
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_same_key_with_another_body_is_rejected(self):
+        self.checkout([{'id': self.food.id, 'quantity': 2}])
+        response = self.checkout([{'id': self.food.id, 'quantity': 3}])
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failures_are_not_replayed(self):
+        cart = [{'id': self.food.id + 1, 'quantity': 1}]
+        failed = self.checkout(cart)
+        self.assertFalse(failed.json()['success'])
+
+        # The missing item appears; the retry with the same key must place the order
+        Foods.objects.create(id=self.food.id + 1, title='Veg Momo', category=self.category, price=Decimal('150'), image='Foods/b.jpg')
+        retry = self.checkout(cart)
+        self.assertTrue(retry.json()['success'])
+        self.assertFalse(retry.has_header('Idempotent-Replayed'))
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class CheckoutCartTests(TestCase):
+    """Checkout accepts the line keys the menus send, with either prefix, and bare food ids"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Momo')
+        self.food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+        self.special = Special.objects.create(
+            name='Chef Special', description='Special', price=Decimal('300'), image='specials/a.jpg', category=category
+        )
+
+    def checkout(self, cart):
+        return self.client.post('/checkout/', json.dumps({'cart': cart}), content_type='application/json')
+
+    def test_food_and_special_prefixes(self):
+        for cart, expected in (
+            ([{'id': f'food-{self.food.id}', 'quantity': 2}], [('Chicken Momo', 2)]),
+            ([{'id': f'special-{self.special.id}', 'quantity': 1}], [('Chef Special', 1)]),
+            (
+                [{'id': f'food-{self.food.id}'}, {'id': self.food.id}, {'id': f'special-{self.special.id}', 'quantity': 3}],
+                [('Chicken Momo', 2), ('Chef Special', 3)],
+            ),
+        ):
+            with self.subTest(cart=cart):
+                response = self.checkout(cart)
+                self.assertTrue(response.json()['success'])
+                order = Order.objects.latest('id')
+                self.assertEqual(sorted((line['name'], line['quantity']) for line in order.line_items), sorted(expected))
+
+    def test_unknown_prefix_is_skipped(self):
+        response = self.checkout([{'id': f'drink-{self.food.id}', 'quantity': 1}])
+        self.assertFalse(response.json()['success'])
+        self.assertFalse(Order.objects.exists())
+
+
+class MenuSnapshotVersionTests(TestCase):
+    """The catalog version only moves once a change commits, so nothing caches uncommitted rows under it"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Momo')
+        self.food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+        self.version = get_menu_snapshot()['version']
+
+    def test_version_moves_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.price = Decimal('250')
+            self.food.save()
+            self.assertEqual(get_menu_snapshot()['version'], self.version)
+
+        snapshot = get_menu_snapshot()
+        self.assertEqual(snapshot['version'], CatalogChange.objects.latest('id').id)
+        self.assertGreater(snapshot['version'], self.version)
+        self.assertEqual([food['price'] for food in snapshot['foods']], [Decimal('250')])
+
+    def test_rolled_back_change_is_never_published(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.food.price = Decimal('250')
+                self.food.save()
+                raise RuntimeError('rolled back')
+
+        self.assertEqual(callbacks, [])
+        snapshot = get_menu_snapshot()
+        self.assertEqual(snapshot['version'], self.version)
+        self.assertEqual([food['price'] for food in snapshot['foods']], [Decimal('200')])
+
+
+class SpecialAdminActionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Momo')
+        self.special = Special.objects.create(
+            name='Chef Special', description='Special', price=Decimal('300'), image='specials/a.jpg', category=category
+        )
+        self.day = self.special.date
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+
+    def run_action(self, action, url='/admin/main/special/'):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'action': action, '_selected_action': [self.special.id]})
+
+    def test_deactivate_from_a_filtered_changelist_drops_the_special(self):
+        self.assertEqual([s['id'] for s in get_menu_snapshot(self.day)['specials']], [self.special.id])
+        changes = CatalogChange.objects.count()
+
+        self.run_action('deactivate_specials', '/admin/main/special/?active__exact=1')
+
+        self.assertFalse(Special.objects.get(id=self.special.id).active)
+        self.assertEqual(CatalogChange.objects.count(), changes + 1)
+        self.assertEqual(get_menu_snapshot(self.day)['specials'], [])
+
+    def test_activate_from_a_filtered_changelist_restores_the_special(self):
+        Special.objects.filter(id=self.special.id).update(active=False)
+        self.assertEqual(get_menu_snapshot(self.day)['specials'], [])
+
+        self.run_action('activate_specials', '/admin/main/special/?active__exact=0')
+
+        self.assertEqual([s['id'] for s in get_menu_snapshot(self.day)['specials']], [self.special.id])
+
+
+class OrderAdminActionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Momo')
+        food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+        self.customer = User.objects.create_user('customer')
+        self.order = place_order({('food', food.id): 1}, user=self.customer)
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+
+    def run_action(self, action):
+        # Warm the caches the action has to refresh
+        self.assertEqual(get_order_counts(self.customer.id)['pending'], 1)
+        self.assertEqual(get_order_tracking(self.order.id)['order']['status'], 'pending')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/main/order/?status__exact=pending', {'action': action, '_selected_action': [self.order.id]})
+
+    def test_mark_completed_from_a_filtered_changelist(self):
+        self.run_action('mark_completed')
+        counts = get_order_counts(self.customer.id)
+        self.assertEqual((counts['pending'], counts['completed']), (0, 1))
+        self.assertEqual(get_order_tracking(self.order.id)['order']['status'], 'completed')
+        self.assertTrue(Task.objects.filter(name='main.views.deliver_order_status_email', args=[self.order.id, 'completed']).exists())
+
+    def test_mark_cancelled_from_a_filtered_changelist(self):
+        self.run_action('mark_cancelled')
+        counts = get_order_counts(self.customer.id)
+        self.assertEqual((counts['pending'], counts['cancelled']), (0, 1))
+        self.assertEqual(get_order_tracking(self.order.id)['order']['status'], 'cancelled')
+
+
+class OrderHistoryPaginationTests(TestCase):
+    """Keyset pages visit every order once, newest first, even when orders share a timestamp"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Momo')
+        food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+        self.customer = User.objects.create_user('customer', password='pw')
+        self.order_ids = [place_order({('food', food.id): 1}, user=self.customer).id for _ in range(7)]
+        # Orders 1-2 and 3-6 each share a created_at, so the page boundaries fall inside ties
+        moment = timezone.now().replace(microsecond=123456)
+        Order.objects.filter(id__in=self.order_ids[:2]).update(created_at=moment - timedelta(minutes=5))
+        Order.objects.filter(id__in=self.order_ids[2:6]).update(created_at=moment)
+        Order.objects.filter(id=self.order_ids[6]).update(created_at=moment + timedelta(minutes=5))
+        self.orders = Order.objects.filter(user=self.customer)
+
+    def walk(self, limit):
+        pages, after = [], None
+        while True:
+            page, cursor = paginate_orders(self.orders, after, limit)
+            pages.append([order.id for order in page])
+            if cursor is None:
+                return pages
+            after = decode_order_cursor(cursor)
+
+    def test_pages_split_ties(self):
+        expected = [self.order_ids[6], *reversed(self.order_ids[2:6]), *reversed(self.order_ids[:2])]
+        pages = self.walk(limit=3)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_exact_multiple_has_no_empty_last_page(self):
+        self.assertEqual([len(page) for page in self.walk(limit=7)], [7])
+        Order.objects.filter(id=self.order_ids[0]).delete()
+        self.assertEqual([len(page) for page in self.walk(limit=3)], [3, 3])
+
+    def test_cursor_round_trip(self):
+        order = Order.objects.get(id=self.order_ids[3])
+        self.assertEqual(decode_order_cursor(encode_order_cursor(order)), (order.created_at, order.id))
+
+    def test_garbage_cursor(self):
+        for value in ('garbage', '1-2-3', 'x-1', '20261399000000000000-5', '20260118193005123456-x'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                decode_order_cursor(value)
+
+        # The history page falls back to the first page
+        self.client.login(username='customer', password='pw')
+        response = self.client.get('/orders/', {'after': 'garbage'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['is_first_page'])
+        self.assertEqual(response.context['orders'][0].id, self.order_ids[6])
+
+
+class TrackOrderApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Momo')
+        food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+        self.order = place_order({('food', food.id): 2})
+        self.url = f'/api/track-order/{self.order.id}/'
+
+    def test_unchanged_order_is_answered_with_304_from_the_cache(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_status_change_moves_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.order.status = 'preparing'
+        self.order.save()
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['order']['status'], 'preparing')
+
+
+class CartBusyTests(TestCase):
+    """A cart locked by another writer gets a JSON 503 the client can retry, never a 500"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Momo')
+        self.food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+
+    def post(self, url, data):
+        return self.client.post(url, json.dumps(data), content_type='application/json')
+
+    @contextmanager
+    def busy(self):
+        error = CartBusyError('Cart is busy, please try again')
+        with mock.patch.object(DatabaseCartStore, 'apply', side_effect=error), \
+                mock.patch.object(CachedCartStore, 'apply', side_effect=error):
+            yield
+
+    def test_batch_answers_503_when_the_cart_is_busy(self):
+        with self.busy():
+            response = self.post('/api/cart/batch/', {'operations': [{'op': 'add', 'type': 'food', 'id': self.food.id}]})
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['success'])
+
+    def test_sync_resend_applies_after_a_busy_attempt(self):
+        payload = {'batch': 'b1', 'changes': [{'op': 'add', 'type': 'food', 'id': self.food.id, 'quantity': 2}]}
+        with self.busy():
+            response = self.post('/api/cart/sync/', payload)
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['success'])
+
+        response = self.post('/api/cart/sync/', payload)
+        self.assertEqual(response.json()['cart']['count'], 2)
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        self.queue = TaskQueue()
+        TASK_CALLS.clear()
+
+    def enqueue(self, func, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.queue.enqueue(func, *args, **kwargs)
+        return Task.objects.latest('id')
+
+    def test_task_is_only_written_once_the_transaction_commits(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.queue.enqueue(record_task, 1)
+            self.assertFalse(Task.objects.exists())
+        self.assertEqual(len(callbacks), 1)
+
+    def test_claimed_task_is_not_claimed_again(self):
+        task = self.enqueue(record_task, 1)
+        claimed = self.queue.claim()
+        self.assertEqual([t.id for t in claimed], [task.id])
+        self.assertEqual((claimed[0].status, claimed[0].attempts), ('running', 1))
+        self.assertEqual(self.queue.claim(), [])
+
+    def test_successful_task_runs_once_and_is_deleted(self):
+        self.enqueue(record_task, 1, note='hi')
+        self.assertEqual(self.queue.work(), 1)
+        self.assertEqual(TASK_CALLS, [((1,), {'note': 'hi'})])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failing_task_is_retried_with_backoff_then_dead_lettered(self):
+        task = self.enqueue(failing_task, max_attempts=2)
+        self.queue.work()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('queued', 1))
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIn('mail server down', task.last_error)
+        # Not due yet
+        self.assertEqual(self.queue.work(), 0)
+
+        Task.objects.filter(id=task.id).update(run_at=timezone.now())
+        self.queue.work()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('dead', 2))
+        self.assertEqual(self.queue.claim(), [])
+
+
+class SearchDiacriticsTests(TestCase):
+    """Accented and unaccented queries find the same items on both search backends"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Desserts')
+        self.food = Foods.objects.create(title='Crème Brûlée', category=category, price=Decimal('350'), image='Foods/a.jpg')
+        Foods.objects.create(title='Chocolate Cake', category=category, price=Decimal('300'), image='Foods/b.jpg')
+
+    def assert_finds_food(self, backend):
+        backend.rebuild()
+        for query in ('crème brûlée', 'creme brulee', 'CRÈME', 'brul', 'brû'):
+            with self.subTest(backend=backend.name, query=query):
+                self.assertEqual([(hit['kind'], hit['id']) for hit in backend.search(query)], [('food', self.food.id)])
+        # An exact match either way, not a typo-tolerant fallback
+        self.assertEqual(backend.search('crème brûlée'), backend.search('creme brulee'))
+
+    def test_fts5_backend(self):
+        if not SQLiteFTSBackend.is_available():
+            self.skipTest('SQLite was built without FTS5')
+        self.assert_finds_food(SQLiteFTSBackend())
+
+    def test_inverted_index_backend(self):
+        self.assert_finds_food(InvertedIndexBackend())
+
+
+class ReceiptStorageTests(TestCase):
+    """Concurrent first renders of a receipt leave exactly one stored file under the exact name"""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        category = Category.objects.create(name='Momo')
+        food = Foods.objects.create(title='Chicken Momo', category=category, price=Decimal('200'), image='Foods/a.jpg')
+        self.order = Order.objects.select_related('customer').get(id=place_order({('food', food.id): 2}).id)
+
+    def stored_receipts(self):
+        return default_storage.listdir(f'{RECEIPT_DIR}/{self.order.id}')[1]
+
+    def test_concurrent_first_renders(self):
+        # Hold every render until all of them have missed the stored receipt
+        barrier = threading.Barrier(8)
+
+        def render_after_barrier(*args, **kwargs):
+            barrier.wait(timeout=5)
+            return render_to_string(*args, **kwargs)
+
+        saved = []
+        save = default_storage.save
+
+        def record_save(*args, **kwargs):
+            saved.append(save(*args, **kwargs))
+            return saved[-1]
+
+        name = f'{RECEIPT_DIR}/{self.order.id}/{receipt_version(self.order)}.html'
+        with mock.patch('main.receipts.render_to_string', render_after_barrier), \
+                mock.patch.object(default_storage, 'save', record_save), \
+                mock.patch.object(default_storage, 'delete', wraps=default_storage.delete) as delete, \
+                ThreadPoolExecutor(max_workers=8) as executor:
+            receipts = list(executor.map(lambda _: get_receipt_html(self.order), range(8)))
+        self.assertEqual(len(set(receipts)), 1)
+        self.assertEqual(self.stored_receipts(), [f'{receipt_version(self.order)}.html'])
+        with default_storage.open(name) as stored:
+            self.assertEqual(stored.read().decode('utf-8'), receipts[0])
+        # Written through temporary files only, and never deleted from under a reader
+        self.assertTrue(saved and all(saved_name.endswith(TEMPORARY_SUFFIX) for saved_name in saved))
+        self.assertNotIn(mock.call(name), delete.call_args_list)
+
+    def test_new_version_replaces_the_old_one(self):
+        get_receipt_html(self.order)
+        self.order.status = 'completed'
+        self.order.save()
+        self.assertIn('Completed', get_receipt_html(self.order))
+        self.assertEqual(self.stored_receipts(), [f'{receipt_version(self.order)}.html'])
+
+
+class ImageUploadTests(TestCase):
+    """Every new image gets its own thumbnails, whatever derivatives already sit in storage"""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.category = Category.objects.create(name='Momo')
+
+    def upload(self, name, color, size=(800, 800)):
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, format='JPEG' if name.endswith('.jpg') else 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def thumbnail_color(self, image_name):
+        with default_storage.open(derivative_name(image_name, 320, 'jpeg'), 'rb') as stored:
+            return Image.open(stored).convert('RGB').getpixel((10, 10))
+
+    def create_food(self, image):
+        return Foods.objects.create(title='Chicken Momo', category=self.category, price=Decimal('200'), image=image)
+
+    def test_same_name_with_another_extension(self):
+        red = self.create_food(self.upload('momo.jpg', 'red'))
+        blue = self.create_food(self.upload('momo.png', 'blue', size=(3000, 3000)))
+
+        self.assertNotEqual(build_srcset(red.image.name)['src'], build_srcset(blue.image.name)['src'])
+        self.assertGreater(self.thumbnail_color(red.image.name)[0], 200)
+        self.assertGreater(self.thumbnail_color(blue.image.name)[2], 200)
+        with default_storage.open(blue.image.name, 'rb') as stored:
+            self.assertLessEqual(max(Image.open(stored).size), MAX_ORIGINAL_DIMENSION)
+
+    def test_replacement_reusing_a_deleted_name(self):
+        food = self.create_food(self.upload('momo.jpg', 'red'))
+        name = food.image.name
+        default_storage.delete(name)
+        food.image = self.upload('momo.jpg', 'blue')
+        food.save()
+
+        self.assertEqual(food.image.name, name)
+        self.assertGreater(self.thumbnail_color(name)[2], 200)
+
+    def test_unchanged_image_is_not_reprocessed(self):
+        food = self.create_food(self.upload('momo.jpg', 'red'))
+        with mock.patch('main.signals.process_image') as process_image:
+            food.price = Decimal('250')
+            food.save()
+            Foods.objects.get(id=food.id).save()
+        process_image.assert_not_called()
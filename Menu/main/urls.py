@@ -8,6 +8,7 @@ urlpatterns = [
     path('about/',about,name="about"),
     path('contact/',contact,name="contact"),
     path('menu/',menu,name="menu"),
+    path('menu/items/', menu_items_chunk, name='menu_items_chunk'),
     path('favorites/',favorites_view,name="favorites"),
     path('services/',services,name="services"),
     path('loading-demo/', lambda request: render(request, 'main/loading_demo.html'), name='loading_demo'),
@@ -29,12 +30,15 @@ urlpatterns = [
     path('api/add-to-cart/', add_to_cart, name='add_to_cart'),
     path('api/update-cart-item/', update_cart_item, name='update_cart_item'),
     path('api/remove-from-cart/', remove_from_cart, name='remove_from_cart'),
+    path('api/cart/batch/', cart_batch_api, name='cart_batch_api'),
+    path('api/cart/sync/', cart_sync_api, name='cart_sync_api'),
     path('api/checkout/', checkout_api, name='checkout_api'),
     path('checkout/', checkout, name='checkout'),
     path('orders/', order_history, name='order_history'),
     path('api/cancel-order/<int:order_id>/', cancel_order, name='cancel_order'),
     path('api/reorder/<int:order_id>/', reorder, name='reorder'),
     path('order-receipt/<int:order_id>/', order_receipt, name='order_receipt'),
+    path('order-receipt/<int:order_id>/pdf/', order_receipt_pdf, name='order_receipt_pdf'),
     path('track-order/<int:order_id>/', order_tracking, name='order_tracking'),
     path('api/track-order/<int:order_id>/', track_order_api, name='track_order_api'),
     path('thank-you/', thank_you, name='thank_you'),
@@ -81,7 +85,12 @@ urlpatterns = [
     path('api/favorites/', list_favorites, name='list_favorites'),
     path('api/favorites/add/', toggle_favorite, name='add_favorite'),
     path('api/favorites/remove/', toggle_favorite, name='remove_favorite_toggle'),
+    path('api/foods/', food_batch_api, name='food_batch_api'),
     path('api/foods/<int:pk>/', food_detail, name='food_detail'),
+    path('api/menu/', menu_api, name='menu_api'),
+    path('api/menu/snapshot/', menu_snapshot_stats, name='menu_snapshot_stats'),
+    path('api/specials/preview/', specials_preview_api, name='specials_preview_api'),
+    path('api/tasks/stats/', task_queue_stats, name='task_queue_stats'),
 
     # Admin email functionality
     path('send-status-email/<int:order_id>/', send_status_email, name='send_status_email'),
@@ -9,6 +9,7 @@ import base64
 
 # --------------------Django Core - Generic
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.db import IntegrityError
 from django.db import models
 from django.utils import timezone
@@ -33,7 +34,11 @@ from rest_framework.permissions import IsAuthenticated
 
 # ------------------------Django Core - AJAX/JSON
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET
+from django.views.decorators.cache import cache_control
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.http import JsonResponse, FileResponse
+from django.core.files.storage import default_storage
 from django.contrib.auth.decorators import login_required
 import json
 
@@ -44,17 +49,39 @@ from .models import Order, OrderItem, Foods, Special, Customer, Favorite, Cart,
 from .models import Special
 from .realtime_utils import send_new_order_notification, send_order_update, send_user_notification, send_order_status_notification
 from .realtime_order_utils import notify_order_status_change, notify_new_order, get_order_status_display, get_order_progress_percentage
+from .menu_snapshot import get_menu_snapshot, get_menu_snapshot_stats, menu_snapshot_manager, entry_to_json
+from .search_index import search_menu
+from .menu_facets import parse_facet_filters, filter_foods, filter_menu, describe_facets
+from .menu_pagination import decode_cursor, paginate_foods
+from .order_history import decode_order_cursor, paginate_orders, get_order_counts
+from .receipts import get_receipt_html, get_receipt_pdf, receipt_pdf_supported
+from .order_tracking import TRACKING_POLL_INTERVAL, get_order_tracking
+from .menu_fragments import menu_fragment_cache
+from .specials_service import get_business_day, get_specials
+from .checkout_service import CheckoutError, parse_client_cart, place_order
+from .idempotency import idempotent
+from .task_queue import enqueue_task, get_task_queue_stats
+from .cart_store import (
+    get_cart_store, get_cart_owner, get_cart_owner_for, get_cart_items, get_cart_totals, get_cart_count,
+    get_cart_snapshot, find_cart_line, line_key, clear_cart, flush_cart, parse_cart_operations, cart_version,
+    claim_cart_batch, release_cart_batch, CartBusyError,
+)
 
 # Create your views here.
 
-# ......................................................Main Views...............................
+def cursor_url(request, url_name, cursor):
+    """URL of the next keyset page (menu chunks, order history), keeping the current filters."""
+    params = request.GET.copy()
+    params.pop('csrfmiddlewaretoken', None)
+    params['after'] = cursor
+    return f"{reverse(url_name)}?{params.urlencode()}"
 
-date = datetime.now()
+# ......................................................Main Views...............................
 
 def index(request):
     """Renders the index page with today's specials."""
-    todays_specials = Special.objects.filter(date=date.today(), active=True)
-    return render(request, 'main/index.html', {'data': date, 'todays_specials': todays_specials})
+    todays_specials = get_menu_snapshot()['specials']
+    return render(request, 'main/index.html', {'data': get_business_day(), 'todays_specials': todays_specials})
 
 def about(request):
     """Renders the about page."""
@@ -97,25 +124,40 @@ def menu(request):
     except Exception:
         pass
     
-    todays_specials = Special.objects.filter(date=date.today(), active=True)
-    categories = Category.objects.all()
+    snapshot = get_menu_snapshot()
+    todays_specials = snapshot['specials']
     selected_category_name = request.GET.get('category')
     search_query = request.GET.get('q')
 
-    try:
-        if selected_category_name:
-            selected_category = Category.objects.get(name=selected_category_name)
-            foods = Foods.objects.filter(category=selected_category)
-        else:
-            foods = Foods.objects.all()
-            selected_category = None
-    except Category.DoesNotExist:
-        messages.warning(request, f"Category '{selected_category_name}' not found.")
-        foods = Foods.objects.all()
-        selected_category = None
+    # Veg/spicy/price/rating/category facets are answered from the snapshot's facet index
+    filters = parse_facet_filters(request.GET, snapshot['categories'])
+    foods, facet_counts = filter_menu(snapshot, filters)
+    categories = [
+        {**category, 'count': facet_counts['category'].get(category['id'], 0)}
+        for category in snapshot['categories']
+    ]
+
+    selected_category = None
+    if selected_category_name:
+        selected_category = next((c for c in categories if c['name'] == selected_category_name), None)
+        if not selected_category:
+            messages.warning(request, f"Category '{selected_category_name}' not found.")
 
     if search_query:
-        foods = foods.filter(title__icontains=search_query)
+        # Ranked full-text search over titles, descriptions and category names
+        hits = search_menu(search_query, limit=None)
+        food_rank = {hit['id']: rank for rank, hit in enumerate(hits) if hit['kind'] == 'food'}
+        special_ids = {hit['id'] for hit in hits if hit['kind'] == 'special'}
+        foods = sorted((food for food in foods if food['id'] in food_rank), key=lambda food: food_rank[food['id']])
+        todays_specials = [special for special in todays_specials if special['id'] in special_ids]
+        next_cursor = None
+    else:
+        # Only the first chunk is rendered; menu.js pulls the rest from menu_items_chunk
+        try:
+            after = decode_cursor(request.GET['after']) if request.GET.get('after') else None
+        except ValueError:
+            after = None
+        foods, next_cursor = paginate_foods(foods, after)
 
     context = {
         'todays_specials': todays_specials,
@@ -123,9 +165,30 @@ def menu(request):
         'categories': categories,
         'selected_category': selected_category,
         'search_query': search_query,
+        'facets': describe_facets(facet_counts, filters),
+        'next_chunk_url': cursor_url(request, 'menu_items_chunk', next_cursor) if next_cursor else None,
+        'next_page_url': cursor_url(request, 'menu', next_cursor) if next_cursor else None,
     }
     return render(request, 'main/menu.html', context)
 
+@require_GET
+def menu_items_chunk(request):
+    """Next chunk of menu cards as an HTML fragment: ?after=<category_id>-<food_id> plus the menu filters."""
+    try:
+        after = decode_cursor(request.GET['after']) if request.GET.get('after') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'}, status=400)
+
+    snapshot = get_menu_snapshot()
+    foods = filter_foods(snapshot, parse_facet_filters(request.GET, snapshot['categories']))
+    foods, next_cursor = paginate_foods(foods, after)
+    context = {
+        'foods': foods,
+        'next_chunk_url': cursor_url(request, 'menu_items_chunk', next_cursor) if next_cursor else None,
+        'next_page_url': cursor_url(request, 'menu', next_cursor) if next_cursor else None,
+    }
+    return render(request, 'main/partials/menu_items_chunk.html', context)
+
 def services(request):
     """Renders the services page."""
     return render(request, 'main/services.html')
@@ -285,80 +348,36 @@ def remove_favorite(request):
 # ......................................................Cart & Order Views.......................
 
 def get_or_create_cart(request):
-    """Get or create cart for user or session, with cart merging for login"""
-    if request.user.is_authenticated:
-        # Get user's cart
-        user_cart, created = Cart.objects.get_or_create(user=request.user)
-        
-        # If user just logged in and has a session cart, merge it
-        if request.session.session_key:
-            try:
-                session_cart = Cart.objects.get(session_key=request.session.session_key)
-                # Merge session cart items into user cart
-                for session_item in session_cart.items.all():
-                    user_item, item_created = CartItem.objects.get_or_create(
-                        cart=user_cart,
-                        food=session_item.food,
-                        special=session_item.special,
-                        defaults={'quantity': session_item.quantity}
-                    )
-                    if not item_created:
-                        user_item.quantity += session_item.quantity
-                        user_item.save()
-                # Delete session cart after merging
-                session_cart.delete()
-            except Cart.DoesNotExist:
-                pass
-        
-        return user_cart
-    else:
-        if not request.session.session_key:
-            request.session.create()
-        cart, created = Cart.objects.get_or_create(session_key=request.session.session_key)
-        return cart
+    """Get or create the database cart for user or session, with the cart store's latest changes written to it"""
+    # A pre-login session cart is merged once, at login (see signals)
+    owner = get_cart_owner(request, create=True)
+    flush_cart(owner)
+    cart, created = Cart.objects.get_or_create(**owner.lookup)
+    return cart
 
 def cart_view(request):
     """Renders the cart page with items and handles cart operations."""
     try:
-        cart = get_or_create_cart(request)
-        if not cart:
-            # If cart creation fails, create empty context
-            context = {
-                'cart': None,
-                'cart_items': [],
-                'total_price': 0,
-                'total_items': 0,
-                'checkout_form': CheckoutForm(),
-            }
-            return render(request, 'main/cart.html', context)
-        
-        cart_items = cart.items.all()
+        owner = get_cart_owner(request, create=True)
         
         # Handle form submissions
         if request.method == 'POST':
             if 'update_quantity' in request.POST:
-                return handle_update_quantity(request, cart)
+                return handle_update_quantity(request, owner)
             elif 'remove_item' in request.POST:
-                return handle_remove_item(request, cart)
+                return handle_remove_item(request, owner)
             elif 'checkout' in request.POST:
-                return handle_checkout(request, cart)
+                return handle_checkout(request, get_or_create_cart(request))
+        
+        cart_items = get_cart_items(owner)
         
         # Create checkout form
         checkout_form = CheckoutForm()
         
-        # Safely get cart properties
-        try:
-            total_price = cart.total_price
-        except (AttributeError, TypeError):
-            total_price = 0
-            
-        try:
-            total_items = cart.total_items
-        except (AttributeError, TypeError):
-            total_items = 0
+        total_items, total_price = get_cart_totals(cart_items)
         
         context = {
-            'cart': cart,
+            'cart': owner,
             'cart_items': cart_items,
             'total_price': total_price,
             'total_items': total_items,
@@ -391,38 +410,20 @@ def add_to_cart(request):
         item_id = data.get('id')
         quantity = int(data.get('quantity', 1))
         
-        cart = get_or_create_cart(request)
-        
         if item_type == 'food':
-            food = Foods.objects.get(id=item_id)
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                food=food,
-                defaults={'quantity': quantity}
-            )
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
-            item_name = food.title
-                
+            item_name = Foods.objects.values_list('title', flat=True).get(id=item_id)
         elif item_type == 'special':
-            special = Special.objects.get(id=item_id)
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                special=special,
-                defaults={'quantity': quantity}
-            )
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
-            item_name = special.name
+            item_name = Special.objects.values_list('name', flat=True).get(id=item_id)
         else:
             return JsonResponse({'success': False, 'message': 'Invalid item type'}, status=400)
         
+        owner = get_cart_owner(request, create=True)
+        get_cart_store().add(owner, item_type, int(item_id), quantity)
+        
         return JsonResponse({
             'success': True,
             'message': f'Added {quantity} x {item_name} to cart!',
-            'cart_count': cart.total_items
+            'cart_count': get_cart_count(owner)
         })
         
     except Foods.DoesNotExist:
@@ -443,35 +444,36 @@ def update_cart_item(request):
         cart_item_id = data.get('cart_item_id')
         quantity = int(data.get('quantity'))
         
-        cart = get_or_create_cart(request)
-        cart_item = CartItem.objects.get(id=cart_item_id, cart=cart)
+        owner = get_cart_owner(request, create=True)
+        line = find_cart_line(owner, cart_item_id)
+        if line is None:
+            return JsonResponse({'success': False, 'message': 'Cart item not found'}, status=404)
+        
+        get_cart_store().set_quantity(owner, *line, quantity)
+        cart_items = get_cart_items(owner)
+        cart_count, cart_total = get_cart_totals(cart_items)
         
         if quantity <= 0:
-            cart_item.delete()
             return JsonResponse({
                 'success': True,
                 'message': 'Item removed from cart',
-                'cart_count': cart.total_items,
-                'cart_total': float(cart.total_price)
+                'cart_count': cart_count,
+                'cart_total': float(cart_total)
             })
-        else:
-            cart_item.quantity = quantity
-            cart_item.save()
-            
-            # Calculate item total
-            item_price = cart_item.food.price if cart_item.food else cart_item.special.price
-            item_total = float(item_price) * quantity
+        
+        # Calculate item total
+        item_total = next(
+            (float(item.total_price) for item in cart_items if item.line_key == line_key(*line)), 0
+        )
         
         return JsonResponse({
             'success': True,
             'message': 'Cart updated successfully',
-            'cart_count': cart.total_items,
-            'cart_total': float(cart.total_price),
+            'cart_count': cart_count,
+            'cart_total': float(cart_total),
             'item_total': item_total
         })
         
-    except CartItem.DoesNotExist:
-        return JsonResponse({'success': False, 'message': 'Cart item not found'}, status=404)
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)}, status=400)
 
@@ -485,23 +487,86 @@ def remove_from_cart(request):
         data = json.loads(request.body)
         cart_item_id = data.get('cart_item_id')
         
-        cart = get_or_create_cart(request)
-        cart_item = CartItem.objects.get(id=cart_item_id, cart=cart)
-        cart_item.delete()
+        owner = get_cart_owner(request, create=True)
+        line = find_cart_line(owner, cart_item_id)
+        if line is None:
+            return JsonResponse({'success': False, 'message': 'Cart item not found'}, status=404)
+        
+        get_cart_store().remove(owner, *line)
+        cart_count, cart_total = get_cart_totals(get_cart_items(owner))
         
         return JsonResponse({
             'success': True,
             'message': 'Item removed from cart',
-            'cart_count': cart.total_items,
-            'cart_total': float(cart.total_price)
+            'cart_count': cart_count,
+            'cart_total': float(cart_total)
         })
         
-    except CartItem.DoesNotExist:
-        return JsonResponse({'success': False, 'message': 'Cart item not found'}, status=404)
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)}, status=400)
 
 @csrf_exempt
+def cart_batch_api(request):
+    """Apply an ordered list of add/set/remove operations and return the resulting cart"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        operations = parse_cart_operations(data.get('operations'))
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    # The whole batch lands at once: one cart lock or one transaction, never half applied
+    owner = get_cart_owner(request, create=True)
+    try:
+        get_cart_store().apply(owner, operations)
+    except CartBusyError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=503)
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Cart updated successfully',
+        'cart': get_cart_snapshot(owner),
+    })
+
+@csrf_exempt
+def cart_sync_api(request):
+    """Merge the changes a client made since its last known cart version and return the canonical cart"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        changes = data.get('changes') or []
+        operations = parse_cart_operations(changes) if changes else []
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    owner = get_cart_owner(request, create=True)
+    store = get_cart_store()
+    base_version = data.get('version')
+    # Changes are deltas, so they merge cleanly even when another device moved the cart on
+    stale = base_version is not None and base_version != cart_version(store.get_lines(owner))
+    # A resent batch (lost response, page unload) was applied the first time round
+    batch_id = str(data.get('batch') or '')[:64]
+    if operations and (not batch_id or claim_cart_batch(owner, batch_id)):
+        try:
+            store.apply(owner, operations)
+        except CartBusyError as e:
+            # Nothing was applied; let the client's resend of this batch through
+            if batch_id:
+                release_cart_batch(owner, batch_id)
+            return JsonResponse({'success': False, 'message': str(e)}, status=503)
+    
+    return JsonResponse({
+        'success': True,
+        'stale': stale,
+        'cart': get_cart_snapshot(owner),
+    })
+
+@csrf_exempt
+@idempotent
 @api_view(['POST'])
 def checkout(request):
     """Handle checkout process and create order."""
@@ -510,107 +575,41 @@ def checkout(request):
         cart_items = data.get('cart', [])
         notes = data.get('notes', '')
         
-        # Validate cart_items is a list and not None
-        if not cart_items or not isinstance(cart_items, list):
-            return JsonResponse({'success': False, 'message': 'Cart is empty or invalid'})
+        # Synced clients send the version of their server cart instead of its items
+        owner = None
+        if data.get('cart_version'):
+            owner = get_cart_owner(request, create=True)
+            lines = get_cart_store().get_lines(owner)
+            if cart_version(lines) != data['cart_version']:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Your cart changed, please review it and try again',
+                    'cart': get_cart_snapshot(owner),
+                }, status=409)
+        else:
+            # Only ids and quantities are taken from the client; prices come from the menu
+            lines = parse_client_cart(cart_items)
         
-        # Create order
-        order = Order.objects.create(
-            user=request.user if request.user.is_authenticated else None,
-            notes=notes,
-            status='pending'
-        )
+        if not lines:
+            return JsonResponse({'success': False, 'message': 'Cart is empty or invalid'})
         
-        total = 0
-        valid_items_count = 0
+        try:
+            order = place_order(
+                lines,
+                user=request.user if request.user.is_authenticated else None,
+                notes=notes,
+            )
+        except CheckoutError as e:
+            return JsonResponse({'success': False, 'message': str(e)})
         
-        # Create order items with improved error handling
-        for item in cart_items:
-            try:
-                # Validate item is a dictionary
-                if not isinstance(item, dict):
-                    continue
-                
-                # Get item ID and validate it's not None/empty
-                item_id = item.get('id')
-                if not item_id or str(item_id).strip() == '':
-                    continue
-                
-                # Get quantity and price with defaults
-                quantity = item.get('quantity', 1)
-                price = item.get('price', 0)
-                
-                # Validate quantity is positive integer
-                try:
-                    quantity = int(quantity) if quantity is not None else 1
-                    if quantity <= 0:
-                        quantity = 1
-                except (ValueError, TypeError):
-                    quantity = 1
-                
-                # Validate price is numeric
-                try:
-                    price = float(price) if price is not None else 0
-                    if price < 0:
-                        price = 0
-                except (ValueError, TypeError):
-                    price = 0
-                
-                # Check if it's a special or regular food item
-                item_id_str = str(item_id).lower()
-                if 'special' in item_id_str:
-                    # It's a special item
-                    special_id = item_id_str.replace('special-', '')
-                    try:
-                        special = Special.objects.get(id=special_id)
-                        order_price = special.discounted_price if special.discounted_price else special.price
-                        
-                        OrderItem.objects.create(
-                            order=order,
-                            special=special,
-                            quantity=quantity,
-                            price=order_price or price
-                        )
-                        valid_items_count += 1
-                    except (Special.DoesNotExist, ValueError):
-                        continue
-                else:
-                    # It's a regular food item
-                    try:
-                        food = Foods.objects.get(id=item_id)
-                        
-                        OrderItem.objects.create(
-                            order=order,
-                            food=food,
-                            quantity=quantity,
-                            price=food.price or price
-                        )
-                        valid_items_count += 1
-                    except (Foods.DoesNotExist, ValueError):
-                        continue
-                
-                # Calculate total with validated values
-                total += float(price) * int(quantity)
-                
-            except Exception as item_error:
-                # Log individual item errors but continue processing
-                print(f"Error processing cart item: {item_error}")
-                continue
-        
-        # Check if at least one item was processed successfully
-        if valid_items_count == 0:
-            order.delete()  # Clean up empty order
-            return JsonResponse({'success': False, 'message': 'No valid items found in cart'})
-        
-        # Update order total
-        order.total = total
-        order.save()
+        if owner is not None:
+            clear_cart(owner)
         
         # Send real-time notifications
         try:
             # Notify staff about new order
             notify_new_order(order.id)
-            print(f"Real-time notification sent for new order {order.id}")
+            print(f"Real-time notification queued for new order {order.id}")
             
             # Send confirmation notification to customer if logged in
             if order.user:
@@ -626,17 +625,18 @@ def checkout(request):
         return JsonResponse({
             'success': True, 
             'order_id': order.id,
-            'total': float(total),
-            'items_count': valid_items_count,
+            'total': float(order.total),
+            'items_count': len(order.line_items),
             'message': 'Order placed successfully!'
         })
         
     except json.JSONDecodeError:
-        return JsonResponse({'success': False, 'message': 'Invalid JSON data'})
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'}, status=400)
     except Exception as e:
-        return JsonResponse({'success': False, 'message': f'Order processing error: {str(e)}'})
+        return JsonResponse({'success': False, 'message': f'Order processing error: {str(e)}'}, status=500)
 
 @csrf_exempt
+@idempotent
 def checkout_api(request):
     """Handle checkout process and create order from cart"""
     if request.method != 'POST':
@@ -659,9 +659,10 @@ def checkout_api(request):
         if not cart:
             return JsonResponse({'success': False, 'message': 'Unable to access cart'}, status=500)
         
-        cart_items = cart.items.all()
+        owner = get_cart_owner_for(cart)
+        lines = get_cart_store().get_lines(owner)
         
-        if not cart_items:
+        if not lines:
             return JsonResponse({'success': False, 'message': 'Cart is empty'}, status=400)
         
         # Create or get customer
@@ -676,64 +677,19 @@ def checkout_api(request):
             }
         )
         
-        # Create order
+        # Create order and its items in one go, priced from the menu
         try:
-            cart_total = cart.total_price or 0
-        except (AttributeError, TypeError):
-            cart_total = 0
-            
-        order = Order.objects.create(
-            customer=customer,
-            user=request.user if request.user.is_authenticated else None,
-            notes=f"Payment Method: {payment_method.title()}\nDelivery Address: {customer_address}\n{order_notes}".strip(),
-            status='pending',
-            total=cart_total
-        )
-        
-        # Create order items from cart with improved null safety
-        valid_items_count = 0
-        for cart_item in cart_items:
-            try:
-                # Validate cart_item exists and has required attributes
-                if not cart_item:
-                    continue
-                    
-                # Ensure quantity is valid (CartItem.quantity cannot be None due to DB constraint)
-                quantity = getattr(cart_item, 'quantity', 1)
-                if quantity is None or quantity <= 0:
-                    quantity = 1
-                
-                if cart_item.food:
-                    # Validate food item exists and has valid price
-                    if hasattr(cart_item.food, 'price') and cart_item.food.price is not None:
-                        OrderItem.objects.create(
-                            order=order,
-                            food=cart_item.food,
-                            quantity=quantity,
-                            price=cart_item.food.price
-                        )
-                        valid_items_count += 1
-                elif cart_item.special:
-                    # Validate special item exists and has valid price
-                    if hasattr(cart_item.special, 'price') and cart_item.special.price is not None:
-                        price = cart_item.special.discounted_price if cart_item.special.discounted_price else cart_item.special.price
-                        OrderItem.objects.create(
-                            order=order,
-                            special=cart_item.special,
-                            quantity=quantity,
-                            price=price
-                        )
-                        valid_items_count += 1
-            except (AttributeError, TypeError, ValueError) as item_error:
-                print(f"Error processing cart item in API: {item_error}")
-                continue
-        
-        # Verify at least one item was processed successfully
-        if valid_items_count == 0:
-            return JsonResponse({'success': False, 'message': 'No valid items found in cart'}, status=400)
+            order = place_order(
+                lines,
+                customer=customer,
+                user=request.user if request.user.is_authenticated else None,
+                notes=f"Payment Method: {payment_method.title()}\nDelivery Address: {customer_address}\n{order_notes}".strip(),
+            )
+        except CheckoutError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
         
         # Clear the cart
-        cart_items.delete()
+        clear_cart(owner)
         
         return JsonResponse({
             'success': True,
@@ -747,25 +703,31 @@ def checkout_api(request):
 
 @login_required(login_url='login')
 def order_history(request):
-    """Display user's order history with pagination and filters."""
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    """Display user's order history, newest first: ?status=<status>&after=<cursor>."""
+    orders = Order.objects.filter(user=request.user)
     
     # Filter by status if provided
     status_filter = request.GET.get('status')
     if status_filter and status_filter in ['pending', 'completed', 'cancelled']:
         orders = orders.filter(status=status_filter)
+    else:
+        status_filter = None
     
-    # Add pagination
-    from django.core.paginator import Paginator
-    paginator = Paginator(orders, 10)  # Show 10 orders per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: no COUNT, and every page is one indexed query
+    try:
+        after = decode_order_cursor(request.GET['after']) if request.GET.get('after') else None
+    except ValueError:
+        after = None
+    orders, next_cursor = paginate_orders(orders, after)
     
+    order_counts = get_order_counts(request.user.id)
     context = {
-        'page_obj': page_obj,
-        'orders': page_obj,
+        'orders': orders,
         'status_filter': status_filter,
-        'total_orders': orders.count()
+        'order_counts': order_counts,
+        'total_orders': order_counts['all'],
+        'is_first_page': after is None,
+        'next_page_url': cursor_url(request, 'order_history', next_cursor) if next_cursor else None,
     }
     return render(request, 'main/order_history.html', context)
 
@@ -811,7 +773,7 @@ def update_order_status(request, order_id):
             # Send real-time notifications using new utilities
             try:
                 notify_order_status_change(order.id, new_status)
-                print(f"Real-time notification sent for order {order.id}: {old_status} -> {new_status}")
+                print(f"Real-time notification queued for order {order.id}: {old_status} -> {new_status}")
             except Exception as e:
                 print(f"Failed to send real-time notification: {e}")
             
@@ -889,10 +851,7 @@ def sales_report(request):
     }
     return render(request, 'main/sales_report.html', context)
 
-@login_required
-=======
 @login_required(login_url='login')
->>>>>>> 95b9c2699302927ffeecbb06c6f802d4a237db87
 def admin_dashboard(request):
     """Admin dashboard for managing restaurant."""
     if not request.user.is_staff:
@@ -989,9 +948,10 @@ def table_menu(request):
     table_number = request.GET.get('table')
     
     # Get menu data
-    todays_specials = Special.objects.filter(date=date.today(), active=True)
-    categories = Category.objects.all()
-    foods = Foods.objects.all()
+    snapshot = get_menu_snapshot()
+    todays_specials = snapshot['specials']
+    categories = snapshot['categories']
+    foods = snapshot['foods']
     
     context = {
         'todays_specials': todays_specials,
@@ -1128,27 +1088,156 @@ def list_favorites(request):
     
     return JsonResponse(favorites_data, safe=False)
 
+FOOD_DETAIL_FIELDS = ('title', 'price', 'image', 'category', 'description', 'is_spicy', 'is_vegetarian', 'rating')
+FOOD_BATCH_LIMIT = 100
+
+def food_to_dict(food, fields=FOOD_DETAIL_FIELDS):
+    """Serialize a food item (with its category selected) for the food detail APIs"""
+    data = {
+        'title': food.title,
+        'price': float(food.price),
+        'image': food.image.url if food.image else None,
+        'category': food.category.name if food.category else None,
+        'description': food.description or '',
+        'is_spicy': food.is_spicy,
+        'is_vegetarian': food.is_vegetarian,
+        'rating': float(food.rating) if food.rating else 0,
+    }
+    return {'id': food.id, **{field: data[field] for field in fields}}
+
 @csrf_exempt  
 def food_detail(request, pk):
     """Get food item details via AJAX"""
     try:
-        food = Foods.objects.get(pk=pk)
-        food_data = {
-            'id': food.id,
-            'title': food.title,
-            'price': float(food.price),
-            'image': food.image.url if food.image else None,
-            'category': food.category.name if food.category else None,
-            'description': food.description or '',
-            'is_spicy': food.is_spicy,
-            'is_vegetarian': food.is_vegetarian,
-            'rating': float(food.rating) if food.rating else 0,
-        }
-        return JsonResponse(food_data)
+        food = Foods.objects.select_related('category').get(pk=pk)
+        return JsonResponse(food_to_dict(food))
     except Foods.DoesNotExist:
         return JsonResponse({'error': 'Food not found'}, status=404)
 
-def handle_update_quantity(request, cart):
+def food_batch_etag(request):
+    """Any catalog change may alter a batch, so the catalog version names its state."""
+    return f"foods-{menu_snapshot_manager.get_version()}"
+
+@require_GET
+@cache_control(public=True, max_age=60)
+@condition(etag_func=food_batch_etag)
+def food_batch_api(request):
+    """Get many food items in one query: /api/foods/?ids=1,2,3&fields=title,price"""
+    try:
+        ids = [int(value) for value in request.GET.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'ids must be a comma-separated list of integers'}, status=400)
+    if not ids:
+        return JsonResponse({'success': False, 'message': 'No ids given'}, status=400)
+    if len(ids) > FOOD_BATCH_LIMIT:
+        return JsonResponse({'success': False, 'message': f'At most {FOOD_BATCH_LIMIT} ids per request'}, status=400)
+
+    fields = FOOD_DETAIL_FIELDS
+    if request.GET.get('fields'):
+        fields = [field.strip() for field in request.GET['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in FOOD_DETAIL_FIELDS]
+        if unknown:
+            return JsonResponse({'success': False, 'message': f"Unknown fields: {', '.join(unknown)}"}, status=400)
+
+    foods = Foods.objects.select_related('category').filter(id__in=set(ids))
+    found = {food.id: food_to_dict(food, fields) for food in foods}
+    return JsonResponse({
+        'success': True,
+        'version': menu_snapshot_manager.get_version(),
+        'foods': found,
+        'missing': [food_id for food_id in dict.fromkeys(ids) if food_id not in found],
+    })
+
+def menu_etag(request):
+    """ETag naming the catalog state: its version plus the business day for today's specials."""
+    return f"menu-{menu_snapshot_manager.get_version()}-{get_business_day().isoformat()}"
+
+@require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=menu_etag)
+def menu_api(request):
+    """Full menu catalog as JSON, or only what changed after ?since=<version>."""
+    snapshot = get_menu_snapshot()
+    version = snapshot['version']
+
+    since = request.GET.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'Invalid since version'}, status=400)
+
+    data = {
+        'success': True,
+        'version': version,
+        'day': snapshot['day'],
+        'categories': snapshot['categories'],
+    }
+
+    # Unknown or future versions (e.g. after a cache flush) get the full catalog
+    if since is None or since <= 0 or since > version:
+        data.update({
+            'full': True,
+            'foods': [entry_to_json(food) for food in snapshot['foods']],
+            'specials': [entry_to_json(special) for special in snapshot['specials']],
+            'removed': {'foods': [], 'specials': []},
+        })
+        return JsonResponse(data)
+
+    changes = menu_snapshot_manager.get_changes_since(since)
+    changed_foods = set(changes['food'])
+    changed_specials = set(changes['special'])
+    if changes['category']:
+        # A renamed category changes every entry filed under it
+        changed_foods.update(food['id'] for food in snapshot['foods'] if food['category']['id'] in changes['category'])
+        changed_specials.update(special['id'] for special in snapshot['specials'] if special['category']['id'] in changes['category'])
+
+    foods = [entry_to_json(food) for food in snapshot['foods'] if food['id'] in changed_foods]
+    specials = [entry_to_json(special) for special in snapshot['specials'] if special['id'] in changed_specials]
+    data.update({
+        'full': False,
+        'since': since,
+        'foods': foods,
+        'specials': specials,
+        # Deleted, or no longer on today's menu
+        'removed': {
+            'foods': sorted(changed_foods - {food['id'] for food in foods}),
+            'specials': sorted(changed_specials - {special['id'] for special in specials}),
+        },
+    })
+    return JsonResponse(data)
+
+@login_required(login_url='login')
+def menu_snapshot_stats(request):
+    """Current menu snapshot version and snapshot/card cache hit rates (staff only)."""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+    return JsonResponse({'success': True, 'snapshot': get_menu_snapshot_stats(), 'cards': menu_fragment_cache.get_stats()})
+
+@login_required(login_url='login')
+def task_queue_stats(request):
+    """Background task queue depth: queued, due, running and dead-lettered tasks (staff only)."""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+    return JsonResponse({'success': True, 'tasks': get_task_queue_stats()})
+
+@login_required(login_url='login')
+def specials_preview_api(request):
+    """Specials that will be on the menu for a given day: ?date=YYYY-MM-DD (staff only)."""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'message': 'Permission denied'}, status=403)
+    try:
+        day = date.fromisoformat(request.GET['date']) if request.GET.get('date') else get_business_day()
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid date, expected YYYY-MM-DD'}, status=400)
+    specials = get_specials(menu_snapshot_manager.get_version(), day)
+    return JsonResponse({
+        'success': True,
+        'date': day.isoformat(),
+        'specials': [entry_to_json(special) for special in specials],
+    })
+
+def handle_update_quantity(request, owner):
     """Handle quantity update form submission"""
     try:
         cart_item_id = request.POST.get('cart_item_id')
@@ -1158,32 +1247,37 @@ def handle_update_quantity(request, cart):
             messages.error(request, 'Quantity must be at least 1.')
             return redirect('cart')
         
-        cart_item = CartItem.objects.get(id=cart_item_id, cart=cart)
-        cart_item.quantity = quantity
-        cart_item.save()
+        line = find_cart_line(owner, cart_item_id)
+        if line is None:
+            messages.error(request, 'Cart item not found.')
+            return redirect('cart')
+        
+        get_cart_store().set_quantity(owner, *line, quantity)
         messages.success(request, 'Cart updated successfully!')
         
     except (ValueError, TypeError):
         messages.error(request, 'Invalid quantity.')
-    except CartItem.DoesNotExist:
-        messages.error(request, 'Cart item not found.')
     except Exception as e:
         messages.error(request, 'Error updating cart.')
     
     return redirect('cart')
 
-def handle_remove_item(request, cart):
+def handle_remove_item(request, owner):
     """Handle item removal form submission"""
     try:
         cart_item_id = request.POST.get('cart_item_id')
         
-        cart_item = CartItem.objects.get(id=cart_item_id, cart=cart)
-        item_name = cart_item.food.title if cart_item.food else cart_item.special.name
-        cart_item.delete()
+        line = find_cart_line(owner, cart_item_id)
+        if line is None:
+            messages.error(request, 'Cart item not found.')
+            return redirect('cart')
+        
+        item_name = next(
+            (item.item_name for item in get_cart_items(owner) if item.line_key == line_key(*line)), 'item'
+        )
+        get_cart_store().remove(owner, *line)
         messages.success(request, f'Removed {item_name} from cart.')
         
-    except CartItem.DoesNotExist:
-        messages.error(request, 'Cart item not found.')
     except Exception as e:
         messages.error(request, 'Error removing item from cart.')
     
@@ -1198,14 +1292,10 @@ def handle_checkout(request, cart):
             messages.error(request, 'Cart not found.')
             return redirect('cart')
             
-        try:
-            cart_items = cart.items.all()
-            # Filter out any None items and validate cart_items is iterable
-            cart_items = [item for item in cart_items if item is not None] if cart_items else []
-        except (AttributeError, TypeError):
-            cart_items = []
+        owner = get_cart_owner_for(cart)
+        lines = get_cart_store().get_lines(owner)
             
-        if not cart_items:
+        if not lines:
             messages.error(request, 'Your cart is empty.')
             return redirect('cart')
         
@@ -1238,70 +1328,25 @@ def handle_checkout(request, cart):
         if order_notes:
             notes_parts.append(order_notes)
         
-        # Calculate cart total with null checks
+        # Create order, items and total in one transaction, priced from the menu
         try:
-            cart_total = cart.total_price if cart else 0
-        except (AttributeError, TypeError):
-            cart_total = 0
-        
-        order = Order.objects.create(
-            customer=customer,
-            user=request.user if request.user.is_authenticated else None,
-            order_type=order_type,
-            delivery_address=form.cleaned_data['customer_address'] if order_type == 'delivery' else '',
-            table_number=table_number if order_type == 'dine_in' else '',
-            customer_name=f"{customer_data['customer_firstname']} {customer_data['customer_lastname']}",
-            customer_phone=customer_data['customer_mobileno'],
-            notes="\n".join(notes_parts),
-            status='pending',
-            total=cart_total
-        )
-        
-        # Create order items from cart with improved error handling
-        valid_items_count = 0
-        for cart_item in cart_items:
-            try:
-                # Validate cart_item exists and has required attributes
-                if not cart_item:
-                    continue
-                    
-                # Ensure quantity is valid
-                quantity = getattr(cart_item, 'quantity', None)
-                if quantity is None or quantity <= 0:
-                    quantity = 1
-                
-                if cart_item.food:
-                    # Validate food item exists and has price
-                    if hasattr(cart_item.food, 'price') and cart_item.food.price is not None:
-                        OrderItem.objects.create(
-                            order=order,
-                            food=cart_item.food,
-                            quantity=quantity,
-                            price=cart_item.food.price
-                        )
-                        valid_items_count += 1
-                elif cart_item.special:
-                    # Validate special item exists and has price
-                    if hasattr(cart_item.special, 'price') and cart_item.special.price is not None:
-                        price = cart_item.special.discounted_price if cart_item.special.discounted_price else cart_item.special.price
-                        OrderItem.objects.create(
-                            order=order,
-                            special=cart_item.special,
-                            quantity=quantity,
-                            price=price
-                        )
-                        valid_items_count += 1
-            except (AttributeError, TypeError, ValueError) as item_error:
-                print(f"Error processing cart item: {item_error}")
-                continue
-        
-        # Verify at least one item was processed
-        if valid_items_count == 0:
+            order = place_order(
+                lines,
+                customer=customer,
+                user=request.user if request.user.is_authenticated else None,
+                order_type=order_type,
+                delivery_address=form.cleaned_data['customer_address'] if order_type == 'delivery' else '',
+                table_number=table_number if order_type == 'dine_in' else '',
+                customer_name=f"{customer_data['customer_firstname']} {customer_data['customer_lastname']}",
+                customer_phone=customer_data['customer_mobileno'],
+                notes="\n".join(notes_parts),
+            )
+        except CheckoutError:
             messages.error(request, 'No valid items found in cart.')
             return redirect('cart')
         
         # Clear the cart
-        cart_items.delete()
+        clear_cart(owner)
         
         # Send order confirmation email
         send_order_confirmation_email(order)
@@ -1334,34 +1379,16 @@ def add_to_cart_form(request):
             item_id = form.cleaned_data['item_id']
             quantity = form.cleaned_data['quantity']
             
-            cart = get_or_create_cart(request)
-            
             try:
                 if item_type == 'food':
-                    food = Foods.objects.get(id=item_id)
-                    cart_item, created = CartItem.objects.get_or_create(
-                        cart=cart,
-                        food=food,
-                        defaults={'quantity': quantity}
-                    )
-                    if not created:
-                        cart_item.quantity += quantity
-                        cart_item.save()
-                    item_name = food.title
-                        
+                    item_name = Foods.objects.values_list('title', flat=True).get(id=item_id)
                 elif item_type == 'special':
-                    special = Special.objects.get(id=item_id)
-                    cart_item, created = CartItem.objects.get_or_create(
-                        cart=cart,
-                        special=special,
-                        defaults={'quantity': quantity}
-                    )
-                    if not created:
-                        cart_item.quantity += quantity
-                        cart_item.save()
-                    item_name = special.name
+                    item_name = Special.objects.values_list('name', flat=True).get(id=item_id)
                 
-                messages.success(request, f'🛒 Added {quantity} x {item_name} to cart! Total items: {cart.total_items}')
+                owner = get_cart_owner(request, create=True)
+                get_cart_store().add(owner, item_type, int(item_id), quantity)
+                
+                messages.success(request, f'🛒 Added {quantity} x {item_name} to cart! Total items: {get_cart_count(owner)}')
                 
             except (Foods.DoesNotExist, Special.DoesNotExist):
                 messages.error(request, 'Item not found.')
@@ -1424,29 +1451,16 @@ def reorder(request, order_id):
     
     try:
         order = Order.objects.get(id=order_id, user=request.user)
-        cart = get_or_create_cart(request)
+        owner = get_cart_owner(request, create=True)
+        store = get_cart_store()
         
         items_added = 0
-        for order_item in order.orderitem_set.all():
-            if order_item.food:
-                cart_item, created = CartItem.objects.get_or_create(
-                    cart=cart,
-                    food=order_item.food,
-                    defaults={'quantity': order_item.quantity}
-                )
-                if not created:
-                    cart_item.quantity += order_item.quantity
-                    cart_item.save()
+        for food_id, special_id, quantity in order.items.values_list('food_id', 'special_id', 'quantity'):
+            if food_id:
+                store.add(owner, 'food', food_id, quantity)
                 items_added += 1
-            elif order_item.special:
-                cart_item, created = CartItem.objects.get_or_create(
-                    cart=cart,
-                    special=order_item.special,
-                    defaults={'quantity': order_item.quantity}
-                )
-                if not created:
-                    cart_item.quantity += order_item.quantity
-                    cart_item.save()
+            elif special_id:
+                store.add(owner, 'special', special_id, quantity)
                 items_added += 1
         
         return JsonResponse({
@@ -1463,93 +1477,113 @@ def reorder(request, order_id):
 
 @login_required(login_url='login')
 def order_receipt(request, order_id):
-    """Generate and display order receipt"""
+    """Display an order receipt, rendered once per order version (see receipts)"""
     try:
-        order = Order.objects.get(id=order_id, user=request.user)
-        return render(request, 'main/order_receipt.html', {'order': order})
+        order = Order.objects.select_related('customer').get(id=order_id, user=request.user)
+        return render(request, 'main/order_receipt.html', {'order': order, 'receipt_html': get_receipt_html(order)})
     except Order.DoesNotExist:
         messages.error(request, 'Order not found')
         return redirect('order_history')
 
+@login_required(login_url='login')
+def order_receipt_pdf(request, order_id):
+    """Download an order receipt as a PDF; answers 202 while a worker builds it"""
+    try:
+        order = Order.objects.select_related('customer').get(id=order_id, user=request.user)
+    except Order.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Order not found'}, status=404)
+    if not receipt_pdf_supported():
+        return JsonResponse({'success': False, 'message': 'PDF receipts are not available. Run: pip install xhtml2pdf'}, status=503)
+    name = get_receipt_pdf(order)
+    if name is None:
+        return JsonResponse({'success': True, 'status': 'pending', 'message': 'Your PDF receipt is being prepared'}, status=202)
+    return FileResponse(default_storage.open(name, 'rb'), as_attachment=True, filename=f'receipt-{order.id}.pdf')
+
 # Email notification functions
+# The send_* helpers only queue the email (see task_queue); the deliver_* tasks send it
+# from a worker and raise on failure, so a slow or unreachable mail server is retried
+# instead of holding up the request.
 def send_order_confirmation_email(order):
-    """Send order confirmation email to customer"""
-    try:
-        from django.core.mail import send_mail
-        from django.template.loader import render_to_string
-        from django.conf import settings
-        
-        if order.customer and order.customer.customer_email:
-            subject = f'Order Confirmation - Order #{order.id}'
-            html_message = render_to_string('emails/order_confirmation.html', {'order': order})
-            plain_message = f'''
-            Dear {order.customer.customer_firstname},
-            
-            Thank you for your order! Your order #{order.id} has been confirmed.
-            
-            Order Total: Rs {order.total}
-            
-            We'll notify you when your order is ready.
-            
-            Best regards,
-            Restaurant Team
-            '''
-            
-            send_mail(
-                subject,
-                plain_message,
-                settings.DEFAULT_FROM_EMAIL,
-                [order.customer.customer_email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-    except Exception as e:
-        print(f"Error sending email: {e}")
+    """Queue an order confirmation email to the customer"""
+    enqueue_task(deliver_order_confirmation_email, order.id)
 
 def send_order_status_email(order, status):
-    """Send order status update email"""
-    try:
-        from django.core.mail import send_mail
-        from django.template.loader import render_to_string
-        from django.conf import settings
-        
-        if order.customer and order.customer.customer_email:
-            status_messages = {
-                'pending': 'Your order is being prepared',
-                'completed': 'Your order is ready for pickup/delivery!',
-                'cancelled': 'Your order has been cancelled'
-            }
-            
-            subject = f'Order Update - Order #{order.id}'
-            html_message = render_to_string('emails/order_status.html', {
-                'order': order,
-                'status': status,
-                'status_message': status_messages.get(status, 'Order status updated')
-            })
-            plain_message = f'''
-            Dear {order.customer.customer_firstname},
-            
-            Your order #{order.id} status has been updated to: {status.upper()}
-            
-            {status_messages.get(status, 'Order status updated')}
-            
-            Order Total: Rs {order.total}
-            
-            Best regards,
-            Restaurant Team
-            '''
-            
-            send_mail(
-                subject,
-                plain_message,
-                settings.DEFAULT_FROM_EMAIL,
-                [order.customer.customer_email],
-                html_message=html_message,
-                fail_silently=False,
-            )
-    except Exception as e:
-        print(f"Error sending status email: {e}")
+    """Queue an order status update email"""
+    enqueue_task(deliver_order_status_email, order.id, status)
+
+def deliver_order_confirmation_email(order_id):
+    """Task that sends the order confirmation email"""
+    from django.core.mail import send_mail
+    from django.template.loader import render_to_string
+    from django.conf import settings
+    
+    order = Order.objects.select_related('customer').filter(id=order_id).first()
+    if order and order.customer and order.customer.customer_email:
+        subject = f'Order Confirmation - Order #{order.id}'
+        html_message = render_to_string('emails/order_confirmation.html', {'order': order})
+        plain_message = f'''
+        Dear {order.customer.customer_firstname},
+        
+        Thank you for your order! Your order #{order.id} has been confirmed.
+        
+        Order Total: Rs {order.total}
+        
+        We'll notify you when your order is ready.
+        
+        Best regards,
+        Restaurant Team
+        '''
+        
+        send_mail(
+            subject,
+            plain_message,
+            settings.DEFAULT_FROM_EMAIL,
+            [order.customer.customer_email],
+            html_message=html_message,
+            fail_silently=False,
+        )
 
+def deliver_order_status_email(order_id, status):
+    """Task that sends an order status update email"""
+    from django.core.mail import send_mail
+    from django.template.loader import render_to_string
+    from django.conf import settings
+    
+    order = Order.objects.select_related('customer').filter(id=order_id).first()
+    if order and order.customer and order.customer.customer_email:
+        status_messages = {
+            'pending': 'Your order is being prepared',
+            'completed': 'Your order is ready for pickup/delivery!',
+            'cancelled': 'Your order has been cancelled'
+        }
+        
+        subject = f'Order Update - Order #{order.id}'
+        html_message = render_to_string('emails/order_status.html', {
+            'order': order,
+            'status': status,
+            'status_message': status_messages.get(status, 'Order status updated')
+        })
+        plain_message = f'''
+        Dear {order.customer.customer_firstname},
+        
+        Your order #{order.id} status has been updated to: {status.upper()}
+        
+        {status_messages.get(status, 'Order status updated')}
+        
+        Order Total: Rs {order.total}
+        
+        Best regards,
+        Restaurant Team
+        '''
+        
+        send_mail(
+            subject,
+            plain_message,
+            settings.DEFAULT_FROM_EMAIL,
+            [order.customer.customer_email],
+            html_message=html_message,
+            fail_silently=False,
+        )
 
 from django.core.mail import send_mail
 from django.conf import settings
@@ -1566,7 +1600,7 @@ def send_status_email(request, order_id):
     try:
         order = Order.objects.get(id=order_id)
         send_order_status_email(order, order.status)
-        messages.success(request, f'Status email sent for Order #{order_id}.')
+        messages.success(request, f'Status email queued for Order #{order_id}.')
     except Order.DoesNotExist:
         messages.error(request, f'Order #{order_id} not found.')
     except Exception as e:
@@ -1722,66 +1756,41 @@ def order_details_ajax(request, order_id):
 
 # ------------------------Order Tracking Views
 def order_tracking(request, order_id):
-    """Display real-time order tracking page"""
-    try:
-        order = Order.objects.get(id=order_id)
-        # Calculate progress percentage
-        progress_percentage = get_order_progress_percentage(order.status)
-        # Get user-friendly status display
-        status_display = get_order_status_display(order.status)
-        # Default status messages
-        status_messages = {
-            'pending': 'Your order has been received and is pending confirmation.',
-            'confirmed': 'Your order has been confirmed and will be prepared soon.',
-            'preparing': 'Your order is being prepared by our kitchen staff.',
-            'ready': 'Your order is ready for pickup/delivery!',
-            'completed': 'Your order has been completed. Thank you!',
-            'cancelled': 'Your order has been cancelled.',
-        }
-        status_message = status_messages.get(order.status, f'Order status: {order.status}')
-        context = {
-            'order': order,
-            'progress_percentage': progress_percentage,
-            'status_display': status_display,
-            'status_message': status_message,
-        }
-        return render(request, 'main/order_tracking.html', context)
-    except Order.DoesNotExist:
+    """Display real-time order tracking page, from the cached tracking read model"""
+    tracking = get_order_tracking(order_id)
+    if tracking is None:
         messages.error(request, 'Order not found.')
         return redirect('menu')
+    order = tracking['order']
+    context = {
+        'order': order,
+        'progress_percentage': order['progress_percentage'],
+        'status_display': order['status_display'],
+        'status_message': order['status_message'],
+        'etag': tracking['etag'],
+        'poll_interval': TRACKING_POLL_INTERVAL,
+    }
+    return render(request, 'main/order_tracking.html', context)
 
 def track_order_api(request, order_id):
-    """API endpoint for order tracking data"""
-    try:
-        order = Order.objects.get(id=order_id)
-        # Get order items
-        order_items = []
-        for item in order.orderitem_set.all():
-            order_items.append({
-                'name': item.food.name if item.food else item.special.name,
-                'quantity': item.quantity,
-                'price': float(item.total_price()),
-                'type': 'food' if item.food else 'special'
-            })
-        data = {
-            'id': order.id,
-            'status': order.status,
-            'status_display': get_order_status_display(order.status),
-            'progress_percentage': get_order_progress_percentage(order.status),
-            'customer_name': order.customer_name or (order.customer.name if order.customer else 'Guest'),
-            'customer_phone': order.customer_phone,
-            'order_type': order.get_order_type_display(),
-            'delivery_address': order.delivery_address,
-            'table_number': order.table_number,
-            'total': float(order.total),
-            'created_at': order.created_at.isoformat(),
-            'notes': order.notes,
-            'items': order_items,
-        }
-        return JsonResponse({'success': True, 'order': data})
-    except Order.DoesNotExist:
+    """
+    API endpoint for order tracking data
+
+    Conditional: a poll whose If-None-Match holds the order's current ETag gets a
+    304, answered from the cached read model without touching the database.
+    """
+    tracking = get_order_tracking(order_id)
+    if tracking is None:
         return JsonResponse({'success': False, 'message': 'Order not found'})
 
+    response = get_conditional_response(request, etag=tracking['etag'])
+    if response is None:
+        response = JsonResponse({'success': True, 'order': tracking['order']})
+    response['ETag'] = tracking['etag']
+    # Browsers must revalidate each poll rather than reuse a stale status
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 
 
 